@@ -0,0 +1,305 @@
+import os
+import re
+import codecs
+import signal
+import asyncio
+import logging
+import threading
+from pysteamcmdwrapper.SteamCMD import SteamCMD, output_logger
+from pysteamcmdwrapper.SteamCMD_command import SteamCMD_command
+from pysteamcmdwrapper.progress import ProgressParser
+from pysteamcmdwrapper.retry import AttemptOutcome, classify, ACCOUNT_FAILURES, ABORTED
+from pysteamcmdwrapper.credentials import CredentialPool
+from pysteamcmdwrapper.metrics import RunStats, RETRIES
+from pysteamcmdwrapper.exceptions import SteamCMDException, SteamCMDDownloadException
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 65536
+_NEWLINES = re.compile(r"\r\n|\r|\n")
+
+
+class AsyncSteamCMD(SteamCMD):
+    """
+    asyncio counterpart of SteamCMD.
+    login, app_update, workshop_update and execute are awaitable and run steamcmd through
+    asyncio subprocesses, so a single event loop can drive many updates at once.
+    Every steamcmd process runs in its own process group, cancelling a call kills the group it started,
+    so the steamcmd child of steamcmd.sh goes along with it. install() is inherited and blocking.
+    """
+
+    async def login(self, uname: str = None, passw: str = None):
+        """
+        Login function in order to do a persistent login on the steam servers.
+        Prompts for missing credentials in a thread, so the event loop keeps running.
+
+        :param uname: Steam Username
+        :param passw: Steam Password
+        :return: status code of child process
+        """
+        from getpass import getpass
+
+        loop = asyncio.get_event_loop()
+        self._uname = uname if uname else await loop.run_in_executor(None, input, "Please enter steam username: ")
+        self._passw = passw if passw else await loop.run_in_executor(None, getpass, "Please enter steam password: ")
+        return await self.execute(SteamCMD_command())
+
+    async def app_update(self, app_id: int, install_dir: str = None, validate: bool = None, beta: str = None,
+                         betapassword: str = None, timeout: float = None, line_callback=None,
+                         progress_callback=None, stall_timeout: float = None):
+        """
+        Installer function for apps.
+
+        :param app_id: The Steam ID for the app you want to install
+        :param install_dir: Optional custom installation directory.
+        :param validate: Optional parameter for validation. Turn this on when updating something.
+        :param beta: Optional parameter for running a beta branch.
+        :param betapassword: Optional parameter for entering beta password.
+        :param timeout: Optional number of seconds after which steamcmd is killed.
+        :param line_callback: Optional callable receiving every line of output.
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param stall_timeout: Optional number of seconds without progress after which steamcmd is killed.
+        :return: Status code of child process.
+        """
+        sc = SteamCMD_command()
+        if install_dir:
+            sc.force_install_dir(install_dir)
+        sc.app_update(app_id, validate, beta, betapassword)
+        logger.info("Downloading item %s into %s with validate set to %s", app_id, install_dir, validate)
+        return await self.execute(sc, timeout=timeout, line_callback=line_callback,
+                                  progress_callback=progress_callback, stall_timeout=stall_timeout)
+
+    async def workshop_update(self, app_id: int, workshop_id: int, install_dir: str = None, validate: bool = None,
+                              n_tries: int = 5, timeout: float = None, line_callback=None,
+                              progress_callback=None, stall_timeout: float = None):
+        """
+        Installer function for workshop content. Retries multiple times on timeout due to valves'
+        stupid timeout on large downloads.
+
+        :param app_id: The parent application ID
+        :param workshop_id: The ID for workshop content. Can be found in the url.
+        :param install_dir: Optional custom installation directory.
+        :param validate: Optional parameter for validation. Turn this on when updating something.
+        :param n_tries: Counter for how many redownloads it can make before officially timing out.
+        :param timeout: Optional number of seconds after which a try is killed and retried.
+        :param line_callback: Optional callable receiving every line of output.
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param stall_timeout: Optional number of seconds without progress after which a try is killed and retried.
+        :return: Status code of child process.
+        """
+        sc = SteamCMD_command()
+        if install_dir:
+            sc.force_install_dir(install_dir)
+        sc.workshop_download_item(app_id, workshop_id, validate)
+        return await self.execute(sc, n_tries, timeout=timeout, line_callback=line_callback,
+                                  progress_callback=progress_callback, stall_timeout=stall_timeout)
+
+    async def execute(self, cmd: SteamCMD_command, n_tries: int = 1, timeout: float = None, line_callback=None,
+                      progress_callback=None, credentials=None, stall_timeout: float = None, abort=None):
+        """
+        Executes a SteamCMD_command, with added actions occurring sequentially.
+        Retries retryable failures like SteamCMD.execute does, without blocking the event loop while waiting.
+        Tries running into timeout or stall_timeout are killed by a Watchdog and retried as well.
+
+        :param cmd: Sequence of commands to execute
+        :param n_tries: Number of times the command will be tried.
+        :param timeout: Optional number of seconds after which a try is killed.
+        :param line_callback: Optional callable receiving every line of output.
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param credentials: Optional (username, password) tuple to use instead of the ones given to login(),
+            or a CredentialPool to take an account from for every try.
+        :param stall_timeout: Optional number of seconds without output or downloaded bytes after which a try is killed.
+        :param abort: Optional threading.Event. Once it is set the running try is killed and no other try is started.
+        :return: Status code of child process.
+        """
+        pool = credentials if isinstance(credentials, CredentialPool) else None
+        remaining = cmd
+        for attempt in range(n_tries):
+            if abort is not None and abort.is_set():
+                raise SteamCMDException(message=f"Steamcmd was unable to run ({ABORTED.reason})")
+            outcome = AttemptOutcome(remaining)
+            stats = RunStats()
+            account = await self._acquire(pool) if pool else credentials
+            failure = None
+            try:
+                returncode = await self._run_async(remaining, account, line_callback, progress_callback, stats,
+                                                   self._watchdog(remaining, timeout, stall_timeout, abort), outcome)
+                if returncode != 0:
+                    failure = classify(returncode, outcome.failures)
+            finally:
+                if pool:
+                    pool.release(account, failure)
+            if self.metrics:
+                stats.report(self.metrics, returncode)
+
+            if returncode == 0:
+                return 0
+
+            if not failure.retryable and not (pool and failure in ACCOUNT_FAILURES):
+                raise SteamCMDException(message=
+                    f"Steamcmd was unable to run ({failure.reason}). exit code was {returncode}")
+
+            remaining = remaining.without(outcome.completed)
+            tries_left = n_tries - attempt - 1
+            if tries_left:
+                delay = self.retry_policy.delay(attempt, failure)
+                logger.warning("SteamCMD failed with %s! Tries remaining: %d. Retrying in %.1f seconds...",
+                               failure.reason, tries_left, delay)
+                if self.metrics:
+                    self.metrics(RETRIES, 1, {"reason": failure.reason})
+                await asyncio.sleep(delay)
+
+        raise SteamCMDDownloadException(message=
+            """Error executing command, max number of timeout tries exceeded!
+            Consider increasing the n_tries parameter if the download is
+            particularly large"""
+        )
+
+    async def _run_async(self, cmd: SteamCMD_command, credentials: tuple, line_callback, progress_callback,
+                         stats: RunStats, watchdog, outcome: AttemptOutcome):
+        """
+        Runs steamcmd once, the asyncio counterpart of SteamCMD._run.
+
+        :param cmd: Sequence of commands to execute
+        :param credentials: Optional (username, password) tuple
+        :param line_callback: Optional callable receiving every line of output.
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param stats: RunStats to record timings in
+        :param watchdog: Optional Watchdog killing the process when it hangs
+        :param outcome: AttemptOutcome to collect the completed items and failures in
+        :return: Exit code of steamcmd
+        """
+        parser = ProgressParser()
+        process = await self._spawn(cmd, credentials)
+        stats.spawned()
+        if watchdog is not None:
+            watchdog.start(process.pid)
+        worker = self.governor.register(process.pid, watchdog) if self.governor else None
+        try:
+            async for line in self._read_lines(process):
+                if watchdog is not None:
+                    watchdog.activity()
+                output_logger.info(line)
+                if self.passthrough:
+                    print(line, flush=True)
+                if line_callback:
+                    line_callback(line)
+                event = parser.feed(line)
+                outcome.observe(line, event)
+                stats.observe(line, event)
+                if worker is not None:
+                    self.governor.observe(worker, event)
+                if progress_callback and event is not None:
+                    progress_callback(event)
+        except BaseException:
+            await self._kill(process)
+            raise
+        finally:
+            if worker is not None:
+                self.governor.unregister(worker)
+            if watchdog is not None:
+                watchdog.stop()
+        if watchdog is not None and watchdog.failure is not None:
+            outcome.failures.insert(0, watchdog.failure)
+        return process.returncode
+
+    async def stream(self, cmd: SteamCMD_command, timeout: float = None):
+        """
+        Runs a SteamCMD_command once, yielding its output line by line.
+
+        :param cmd: Sequence of commands to execute
+        :param timeout: Optional number of seconds after which steamcmd is killed and asyncio.TimeoutError raised.
+        :return: Async generator of output lines
+        """
+        process = await self._spawn(cmd)
+        try:
+            async for line in self._read_lines(process, timeout):
+                yield line
+        except BaseException:
+            await self._kill(process)
+            raise
+        if process.returncode != 0:
+            raise SteamCMDException(message=f"Steamcmd was unable to run. exit code was {process.returncode}")
+
+    @staticmethod
+    async def _acquire(pool: CredentialPool):
+        """
+        Takes an account from a pool. Waiting for one blocks, so it happens in a thread outside of the
+        event loop. When the call is cancelled the thread keeps waiting, and gives the account back.
+        """
+        lock = threading.Lock()
+        state = {"cancelled": False, "account": None}
+
+        def acquire():
+            account = pool.acquire()
+            with lock:
+                if state["cancelled"]:
+                    pool.release(account)
+                else:
+                    state["account"] = account
+            return account
+
+        try:
+            return await asyncio.get_event_loop().run_in_executor(None, acquire)
+        except asyncio.CancelledError:
+            with lock:
+                state["cancelled"] = True
+                # Taken just before the cancel arrived
+                if state["account"] is not None:
+                    pool.release(state["account"])
+            raise
+
+    async def _spawn(self, cmd: SteamCMD_command, credentials: tuple = None):
+        params = self._params(cmd, credentials)
+        passw = (credentials or (self._uname, self._passw))[1]
+        logger.info("Parameters used: %s", self._redact(" ".join(params), passw))
+        return await asyncio.create_subprocess_exec(
+            *params,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            # steamcmd.sh runs the real steamcmd as a child, killing the group stops both
+            start_new_session=True,
+        )
+
+    @staticmethod
+    async def _read_lines(process, timeout: float = None):
+        """
+        Yields decoded output lines of process until it exits. Like the universal newlines of
+        SteamCMD._run, carriage returns end a line too, steamcmd separates its progress lines with them.
+        Raises asyncio.TimeoutError when it runs longer than timeout seconds.
+        """
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        while True:
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            chunk = await asyncio.wait_for(process.stdout.read(_CHUNK_SIZE), remaining)
+            text = pending + decoder.decode(chunk, final=not chunk)
+            # May be the first half of a \r\n
+            held = "\r" if chunk and text.endswith("\r") else ""
+            *lines, pending = _NEWLINES.split(text[:len(text) - len(held)])
+            pending += held
+            for line in lines:
+                yield line
+            if not chunk:
+                break
+        if pending:
+            yield pending
+        remaining = None if deadline is None else max(deadline - loop.time(), 0)
+        await asyncio.wait_for(process.wait(), remaining)
+
+    @staticmethod
+    async def _kill(process):
+        """
+        Kills process along with its process group and waits for it to exit
+        """
+        if process.returncode is None:
+            try:
+                if hasattr(os, "killpg"):
+                    os.killpg(process.pid, signal.SIGKILL)
+                else:
+                    process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
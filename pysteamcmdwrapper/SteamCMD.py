@@ -1,12 +1,24 @@
 import os
+import time
+import logging
 import platform
-import zipfile
-import subprocess
-import urllib.request
 from pysteamcmdwrapper.SteamCMD_command import SteamCMD_command
+from pysteamcmdwrapper.progress import ProgressParser
+from pysteamcmdwrapper.retry import RetryPolicy, AttemptOutcome, classify, ACCOUNT_FAILURES, ABORTED
+from pysteamcmdwrapper.credentials import CredentialPool
+from pysteamcmdwrapper.watchdog import Watchdog
+from pysteamcmdwrapper.metrics import RunStats, RETRIES
 from pysteamcmdwrapper.exceptions import SteamCMDException, SteamCMDDownloadException, SteamCMDInstallException
 
-from getpass import getpass
+# urllib, http.client, zipfile, tarfile, subprocess and getpass are imported by the methods using them,
+# so importing the wrapper and creating instances stays cheap for callers that never install steamcmd.
+
+logger = logging.getLogger(__name__)
+# steamcmd's own output is logged separately, so it can be silenced or routed on its own
+output_logger = logging.getLogger("pysteamcmdwrapper.output")
+
+# Doesn't change while running, so it is looked up once instead of for every instance
+SYSTEM = platform.system()
 
 package_links = {
     "Windows": {
@@ -28,12 +40,25 @@ class SteamCMD:
     Will install from source depending on OS.
     """
 
-    _installation_path = ""
-    _uname = "anonymous"
-    _passw = ""
-
-    def __init__(self, installation_path):
+    def __init__(self, installation_path, retry_policy: RetryPolicy = None, metrics=None, governor=None,
+                 passthrough: bool = True):
+        """
+        :param installation_path: Directory steamcmd is or will be installed in
+        :param retry_policy: Optional RetryPolicy with the delays between tries of execute()
+        :param metrics: Optional metrics hook, a callable taking a metric name, a value and a dict of labels.
+            Called with the timings of every steamcmd process started by execute().
+        :param governor: Optional ThroughputGovernor measuring and limiting the download rate of the
+            steamcmd processes started by execute(). Share one between instances to limit them together.
+        :param passthrough: Write the output of steamcmd to stdout, as it did before it was logged.
+            It always goes to the pysteamcmdwrapper.output logger as well.
+        """
         self._installation_path = installation_path
+        self._uname = "anonymous"
+        self._passw = ""
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics
+        self.governor = governor
+        self.passthrough = passthrough
 
         if not os.path.isdir(self._installation_path):
             raise SteamCMDInstallException(message=
@@ -47,37 +72,97 @@ class SteamCMD:
         Sets internal configuration according to parameters and OS
         """
 
-        self.platform = platform.system()
+        self.platform = SYSTEM
         if self.platform not in ["Windows", "Linux"]:
             raise SteamCMDException(message=f"Non supported operating system. Expected Windows or Linux, got {self.platform}")
 
         self.steamcmd_url = package_links[self.platform]["url"]
-        self.zip = "steamcmd" + package_links[self.platform]["d_extension"]
+        # Download into the installation path, so concurrent installs into different paths don't collide
+        self.zip = os.path.join(
+            self._installation_path,
+            "steamcmd" + package_links[self.platform]["d_extension"]
+        )
         self.exe = os.path.join(
             self._installation_path,
             "steamcmd" + package_links[self.platform]["extension"]
         )
 
-    def _download(self):
+    def _download(self, progress_callback=None, checksum: str = None, n_tries: int = 3):
         """
         Internal method to download the SteamCMD Binaries from steams' servers.
+        The archive is streamed in chunks to a partial file next to self.zip.
+        Interrupted transfers are resumed with HTTP Range requests.
 
-        :return: downloaded data for debug purposes
+        :param progress_callback: Optional callable receiving bytes done and bytes total after every chunk.
+        :param checksum: Optional sha256 hex digest the archive has to match.
+        :param n_tries: Number of times the transfer is tried.
+        :return: Path of the downloaded archive
+        """
+        import hashlib
+        import http.client
+        import urllib.error
+
+        if not self.steamcmd_url.lower().startswith("http"):
+            raise SteamCMDException(message=f"An unknown exception occurred during downloading. "
+                                            f"Unsupported url {self.steamcmd_url}")
+
+        partial = self.zip + ".part"
+        for tries_left in range(n_tries - 1, -1, -1):
+            try:
+                self._download_partial(partial, progress_callback)
+                break
+            except urllib.error.HTTPError as e:
+                if not tries_left or (e.code < 500 and e.code != 416):
+                    raise SteamCMDDownloadException(message=f"An exception occurred during downloading. {e}")
+                if e.code == 416:
+                    # The partial file doesn't match the archive on the server, start over
+                    os.remove(partial)
+            except (OSError, http.client.HTTPException) as e:
+                if not tries_left:
+                    raise SteamCMDDownloadException(message=f"An exception occurred during downloading. {e}")
+                logger.warning("Download interrupted! Tries remaining: %d. Resuming...", tries_left)
+
+        if checksum:
+            digest = hashlib.sha256()
+            with open(partial, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            if digest.hexdigest().lower() != checksum.lower():
+                os.remove(partial)
+                raise SteamCMDDownloadException(message=
+                    f"Checksum mismatch for {self.steamcmd_url}, "
+                    f"expected {checksum} but got {digest.hexdigest()}")
+
+        os.replace(partial, self.zip)
+        return self.zip
+
+    def _download_partial(self, partial: str, progress_callback=None):
         """
+        Internal method that continues downloading the archive into partial.
 
-        try:
-            if self.steamcmd_url.lower().startswith("http"):
-                req = urllib.request.Request(self.steamcmd_url)
-            else:
-                raise ValueError from None
-            with urllib.request.urlopen(req) as resp:
-
-                data = resp.read()
-                with open(self.zip, "wb") as f:
-                    f.write(data)
-                return data
-        except Exception as e:
-            raise SteamCMDException(message=f"An unknown exception occurred during downloading. {e}")
+        :param partial: Path of the partial file, which may already hold the start of the archive
+        :param progress_callback: Optional callable receiving bytes done and bytes total after every chunk.
+        """
+        import urllib.request
+
+        offset = os.path.getsize(partial) if os.path.isfile(partial) else 0
+        req = urllib.request.Request(self.steamcmd_url)
+        if offset:
+            req.add_header("Range", f"bytes={offset}-")
+        with urllib.request.urlopen(req) as resp:
+            if resp.status != 206:
+                # Server ignored the range, so it's sending everything
+                offset = 0
+            length = resp.headers.get("Content-Length")
+            total = offset + int(length) if length else None
+            with open(partial, "ab" if offset else "wb") as f:
+                for chunk in iter(lambda: resp.read(64 * 1024), b""):
+                    f.write(chunk)
+                    offset += len(chunk)
+                    if progress_callback:
+                        progress_callback(offset, total)
+            if total is not None and offset < total:
+                raise ConnectionError(f"Connection closed after {offset} of {total} bytes")
 
     def _extract_steamcmd(self):
         """
@@ -85,6 +170,7 @@ class SteamCMD:
         windows and linux.
         """
         if self.platform == 'Windows':
+            import zipfile
             with zipfile.ZipFile(self.zip, 'r') as f:
                 f.extractall(self._installation_path)
 
@@ -102,54 +188,52 @@ class SteamCMD:
 
         os.remove(self.zip)
 
-    @staticmethod
-    def _print_log(*message):
-        """
-        Small helper function for printing log entries.
-        Helps with output of subprocess.check_call not always having newlines
-
-        :param *message: Accepts multiple messages, each will be printed on a
-        new line
-        """
-        # TODO: Handle logs better
-        print("")
-        print("")
-        for msg in message:
-            print(msg)
-        print("")
-
-    def install(self, force: bool = False):
+    def install(self, force: bool = False, progress_callback=None, checksum: str = None, cache=None,
+                refresh_cache: bool = False):
         """
         Installs steamcmd if it is not already installed to self.install_path.
 
         :param force: forces steamcmd install regardless of its presence
+        :param progress_callback: Optional callable receiving bytes done and bytes total while downloading.
+        :param checksum: Optional sha256 hex digest the downloaded archive has to match.
+        :param cache: Optional BootstrapCache to install a self-updated steamcmd from.
+        :param refresh_cache: Rebuild the cached steamcmd before installing from it.
         :return:
         """
-        if not os.path.isfile(self.exe) or force:
-            # Steamcmd isn't installed. Go ahead and install it.
-            self._download()
-            self._extract_steamcmd()
-
-        else:
+        if os.path.isfile(self.exe) and not force:
             raise SteamCMDException(message=
                 'Steamcmd is already installed. Reinstall is not necessary.'
                 'Use force=True to override.'
             )
-        try:
-            subprocess.check_call((self.exe, "+quit"))
-        except subprocess.CalledProcessError as e:
-            if e.returncode == 7:
-                self._print_log(
-                    "SteamCMD has returned error code 7 on fresh installation",
-                    "",
-                    "Not sure why this crashed,",
-                    "long live steamcmd and it's non existent documentation..",
-                    "It should be fine nevertheless")
-                return
-            else:
-                raise SteamCMDInstallException(message=f"Failed to install, check error code {e.returncode}")
-
-        return
+
+        if cache is not None:
+            # The cached tree has already updated itself
+            cache.populate(self, refresh_cache, checksum, progress_callback)
+            return
+
+        # Steamcmd isn't installed. Go ahead and install it.
+        self._download(progress_callback, checksum)
+        self._extract_steamcmd()
+        self._self_update()
+
+    def _self_update(self, stats: RunStats = None):
+        """
+        Internal method running steamcmd without commands, so it downloads and applies its own updates.
+
+        steamcmd checks for updates of itself every time it starts, before it runs any command. When it has
+        applied one it may quit with exit code 7 instead of running the commands, which a fresh installation
+        always does. The update is in place by then, so 7 counts as success here.
+
+        :param stats: Optional RunStats to record the bootstrap timings in
+        :return: Whether steamcmd updated itself
+        """
+        stats = stats or RunStats()
+        returncode, _ = self._run([self.exe, "+quit"], stats=stats, passthrough=self.passthrough)
+        if returncode not in (0, 7):
+            raise SteamCMDInstallException(message=f"Failed to install, check error code {returncode}")
+        if returncode == 7:
+            logger.info("SteamCMD quit with exit code 7 after updating itself")
+        return returncode == 7 or stats.self_updated
 
     def login(self, uname: str = None, passw: str = None):
         """
@@ -160,6 +244,8 @@ class SteamCMD:
         :param passw: Steam Password
         :return: status code of child process
         """
+        from getpass import getpass
+
         self._uname = uname if uname else input("Please enter steam username: ")
         self._passw = passw if passw else getpass("Please enter steam password: ")
 
@@ -167,7 +253,8 @@ class SteamCMD:
         return self.execute(sc)
 
     def app_update(self, app_id: int, install_dir: str = None, validate: bool = None, beta: str = None,
-                   betapassword: str = None):
+                   betapassword: str = None, progress_callback=None, timeout: float = None,
+                   stall_timeout: float = None):
         """
         Installer function for apps.
 
@@ -176,19 +263,21 @@ class SteamCMD:
         :param validate: Optional parameter for validation. Turn this on when updating something.
         :param beta: Optional parameter for running a beta branch.
         :param betapassword: Optional parameter for entering beta password.
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param timeout: Optional number of seconds after which steamcmd is killed.
+        :param stall_timeout: Optional number of seconds without progress after which steamcmd is killed.
         :return: Status code of child process.
         """
         sc = SteamCMD_command()
         if install_dir:
             sc.force_install_dir(install_dir)
         sc.app_update(app_id, validate, beta, betapassword)
-        self._print_log(
-            f"Downloading item {app_id}",
-            f"into {install_dir} with validate set to {validate}")
-        return self.execute(sc)
+        logger.info("Downloading item %s into %s with validate set to %s", app_id, install_dir, validate)
+        return self.execute(sc, progress_callback=progress_callback, timeout=timeout, stall_timeout=stall_timeout)
 
     def workshop_update(self, app_id: int, workshop_id: int, install_dir: str = None, validate: bool = None,
-                        n_tries: int = 5):
+                        n_tries: int = 5, progress_callback=None, timeout: float = None,
+                        stall_timeout: float = None):
         """
         Installer function for workshop content. Retries multiple times on timeout due to valves'
         stupid timeout on large downloads.
@@ -198,6 +287,9 @@ class SteamCMD:
         :param install_dir: Optional custom installation directory.
         :param validate: Optional parameter for validation. Turn this on when updating something.
         :param n_tries: Counter for how many redownloads it can make before officially timing out.
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param timeout: Optional number of seconds after which a try is killed and retried.
+        :param stall_timeout: Optional number of seconds without progress after which a try is killed and retried.
         :return: Status code of child process.
         """
 
@@ -205,44 +297,157 @@ class SteamCMD:
         if install_dir:
             sc.force_install_dir(install_dir)
         sc.workshop_download_item(app_id, workshop_id, validate)
-        return self.execute(sc, n_tries)
+        return self.execute(sc, n_tries, progress_callback, timeout=timeout, stall_timeout=stall_timeout)
 
-    def execute(self, cmd: SteamCMD_command, n_tries: int = 1):
+    def execute(self, cmd: SteamCMD_command, n_tries: int = 1, progress_callback=None, credentials=None,
+                timeout: float = None, stall_timeout: float = None, abort=None):
         """
         Executes a SteamCMD_command, with added actions occurring sequentially.
-        May retry multiple times on timeout due to valves' stupid timeout on large downloads.
+        Failures are classified using the exit code and output of steamcmd. Retryable ones,
+        like valves' stupid timeout on large downloads, are tried again after a delay from
+        self.retry_policy. Items that completed before the failure are left out of the retry.
+        Tries running into timeout or stall_timeout are killed by a Watchdog and retried the same way.
 
         :param cmd: Sequence of commands to execute
         :param n_tries: Number of times the command will be tried.
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param credentials: Optional (username, password) tuple to use instead of the ones given to login(),
+            or a CredentialPool to take an account from for every try. With a pool, tries failing on the
+            account itself, like an invalid password, are retried with another account.
+        :param timeout: Optional number of seconds after which a try is killed.
+        :param stall_timeout: Optional number of seconds without output or downloaded bytes after which a try is killed.
+        :param abort: Optional threading.Event. Once it is set the running try is killed and no other try is started.
         :return: Status code of child process.
         """
-        if n_tries == 0:
-            raise SteamCMDDownloadException(message=
-                """Error executing command, max number of timeout tries exceeded!
-                Consider increasing the n_tries parameter if the download is
-                particularly large"""
-            )
-
-        params = (
-            self.exe,
-            f"+login {self._uname} {self._passw}",
-            cmd.get_cmd(),
-            "+quit",
+        pool = credentials if isinstance(credentials, CredentialPool) else None
+        remaining = cmd
+        for attempt in range(n_tries):
+            if abort is not None and abort.is_set():
+                raise SteamCMDException(message=f"Steamcmd was unable to run ({ABORTED.reason})")
+            account = pool.acquire() if pool else credentials
+            failure = None
+            try:
+                params = self._params(remaining, account)
+                passw = (account or (self._uname, self._passw))[1]
+                logger.info("Parameters used: %s", self._redact(" ".join(params), passw))
+                stats = RunStats()
+                watchdog = self._watchdog(remaining, timeout, stall_timeout, abort)
+                returncode, outcome = self._run(params, progress_callback, stats, self.governor, watchdog,
+                                                AttemptOutcome(remaining), self.passthrough)
+                if returncode != 0:
+                    failure = classify(returncode, outcome.failures)
+            finally:
+                if pool:
+                    pool.release(account, failure)
+            if self.metrics:
+                stats.report(self.metrics, returncode)
+            if returncode == 0:
+                return returncode
+
+            if not failure.retryable and not (pool and failure in ACCOUNT_FAILURES):
+                raise SteamCMDException(message=
+                    f"Steamcmd was unable to run ({failure.reason}). exit code was {returncode}")
+
+            remaining = remaining.without(outcome.completed)
+            tries_left = n_tries - attempt - 1
+            if tries_left:
+                delay = self.retry_policy.delay(attempt, failure)
+                logger.warning("SteamCMD failed with %s! Tries remaining: %d. Retrying in %.1f seconds...",
+                               failure.reason, tries_left, delay)
+                if self.metrics:
+                    self.metrics(RETRIES, 1, {"reason": failure.reason})
+                time.sleep(delay)
+
+        raise SteamCMDDownloadException(message=
+            """Error executing command, max number of timeout tries exceeded!
+            Consider increasing the n_tries parameter if the download is
+            particularly large"""
         )
-        self._print_log("Parameters used:", " ".join(params))
+
+    def _watchdog(self, cmd: SteamCMD_command, timeout: float = None, stall_timeout: float = None, abort=None):
+        """
+        :return: Watchdog for a steamcmd process running cmd, or None without timeouts or abort event
+        """
+        if timeout is None and stall_timeout is None and abort is None:
+            return None
+        # Without force_install_dir steamcmd installs next to itself
+        install_dirs = {install_dir or self._installation_path for _, _, _, install_dir in cmd.get_items()}
+        return Watchdog(timeout, stall_timeout, sorted(install_dirs), abort=abort)
+
+    def _params(self, cmd: SteamCMD_command, credentials: tuple = None):
+        """
+        Builds the argument list for a steamcmd process running cmd
+        """
+        uname, passw = credentials or (self._uname, self._passw)
+        params = [self.exe, "+login", uname]
+        if passw:
+            params.append(passw)
+        return params + cmd.get_argv() + ["+quit"]
+
+    @staticmethod
+    def _redact(text: str, passw: str):
+        """
+        Hides the password in text that is about to be logged
+        """
+        return text.replace(passw, "********") if passw else text
+
+    @staticmethod
+    def _run(params: list, progress_callback=None, stats: RunStats = None, governor=None, watchdog=None,
+             outcome: AttemptOutcome = None, passthrough: bool = False):
+        """
+        Runs steamcmd, streaming its output line by line to the output logger and the progress parser.
+        No shell is involved, so install dirs and beta names are passed on exactly as given.
+
+        :param params: Argument list of the steamcmd process
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param stats: Optional RunStats to record timings in
+        :param governor: Optional ThroughputGovernor to register the process with
+        :param watchdog: Optional Watchdog killing the process when it hangs
+        :param outcome: Optional AttemptOutcome to collect the completed items and failures in
+        :param passthrough: Write every line of output to stdout as well
+        :return: Exit code of steamcmd and the AttemptOutcome of the run
+        """
+        import subprocess
+
+        parser = ProgressParser()
+        outcome = outcome or AttemptOutcome()
+        stats = stats or RunStats()
+        worker = None
+        # Universal newlines also splits the carriage return separated progress lines.
+        # A governed or watched process leads its own process group, so pausing or killing it
+        # reaches the children of steamcmd.sh too.
         try:
-            return subprocess.check_call(" ".join(params), shell=True)
-
-        except subprocess.CalledProcessError as e:
-            # SteamCMD has a habit of timing out large downloads, so  retry on timeout for the remainder of n_tries.
-            if e.returncode == 10:
-                self._print_log(f"Download timeout! Tries remaining: {n_tries}. Retrying...")
-                return self.execute(cmd, n_tries - 1)
-            # SteamCMD sometimes crashes when timing out downloads, due to
-            # an assert checking that the download actually finished.
-            # If this happens, retry.
-            elif e.returncode == 134:
-                self._print_log(f"SteamCMD errored! Tries remaining: {n_tries}. Retrying...")
-                return self.execute(cmd, n_tries - 1)
-
-            raise SteamCMDException(message=f"Steamcmd was unable to run. exit code was {e.returncode}")
+            with subprocess.Popen(params, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  universal_newlines=True, errors="replace",
+                                  start_new_session=governor is not None or watchdog is not None) as process:
+                stats.spawned()
+                try:
+                    if watchdog is not None:
+                        watchdog.start(process.pid)
+                    if governor is not None:
+                        worker = governor.register(process.pid, watchdog)
+                    for line in process.stdout:
+                        line = line.rstrip("\n")
+                        if watchdog is not None:
+                            watchdog.activity()
+                        output_logger.info(line)
+                        if passthrough:
+                            print(line, flush=True)
+                        event = parser.feed(line)
+                        outcome.observe(line, event)
+                        stats.observe(line, event)
+                        if worker is not None:
+                            governor.observe(worker, event)
+                        if progress_callback and event is not None:
+                            progress_callback(event)
+                finally:
+                    if worker is not None:
+                        governor.unregister(worker)
+        finally:
+            # Stopped once the process has been waited for, so a process that hangs on exit is still killed
+            if watchdog is not None:
+                watchdog.stop()
+        if watchdog is not None and watchdog.failure is not None:
+            # Ahead of the failures in the output, unless those are fatal
+            outcome.failures.insert(0, watchdog.failure)
+        return process.returncode, outcome
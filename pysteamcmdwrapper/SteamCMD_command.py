@@ -1,15 +1,113 @@
+import os
+import shlex
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+# Custom commands are split like a shell on this system would, Windows shells keep backslashes
+_POSIX = os.name != "nt"
+
+
+class _Op:
+    """
+    A single steamcmd command. Subclasses render to the string shown in logs and sent to
+    interactive sessions, and to the argv tokens passed to a steamcmd process.
+    """
+    __slots__ = ()
+
+    def render(self):
+        raise NotImplementedError
+
+    def argv(self):
+        raise NotImplementedError
+
+
+class _ForceInstallDir(_Op):
+    __slots__ = ("install_dir",)
+
+    def __init__(self, install_dir: str):
+        self.install_dir = str(install_dir)
+
+    def render(self):
+        return '+force_install_dir "{}"'.format(self.install_dir)
+
+    def argv(self):
+        return ["+force_install_dir", self.install_dir]
+
+
+class _AppUpdate(_Op):
+    __slots__ = ("app_id", "validate", "beta", "beta_pass")
+
+    def __init__(self, app_id: int, validate: bool, beta: str, beta_pass: str):
+        self.app_id = int(app_id)
+        self.validate = bool(validate)
+        self.beta = beta or None
+        self.beta_pass = beta_pass or None
+
+    def render(self):
+        return " ".join(self.argv())
+
+    def argv(self):
+        argv = ["+app_update", str(self.app_id)]
+        if self.validate:
+            argv.append("validate")
+        if self.beta:
+            argv += ["-beta", self.beta]
+        if self.beta_pass:
+            argv += ["-betapassword", self.beta_pass]
+        return argv
+
+
+class _WorkshopDownloadItem(_Op):
+    __slots__ = ("app_id", "workshop_id", "validate")
+
+    def __init__(self, app_id: int, workshop_id: int, validate: bool):
+        self.app_id = int(app_id)
+        self.workshop_id = int(workshop_id)
+        self.validate = bool(validate)
+
+    def render(self):
+        return " ".join(self.argv())
+
+    def argv(self):
+        argv = ["+workshop_download_item", str(self.app_id), str(self.workshop_id)]
+        if self.validate:
+            argv.append("validate")
+        return argv
+
+
+class _Custom(_Op):
+    __slots__ = ("cmd", "_argv")
+
+    def __init__(self, cmd: str):
+        self.cmd = cmd
+        # Custom commands are written the way they would be typed in a shell
+        tokens = shlex.split(cmd, posix=_POSIX)
+        if not _POSIX:
+            tokens = [t[1:-1] if len(t) > 1 and t[0] == t[-1] and t[0] in "\"'" else t for t in tokens]
+        self._argv = tokens
+
+    def render(self):
+        return self.cmd
+
+    def argv(self):
+        return list(self._argv)
+
+
 class SteamCMD_command:
     """
     Used to construct a sequence of commands to sequentially be executed by SteamCMD.
     This reduces the number of required logins, which when using the other provided
     methods may result in getting rate limited by Steam.
 
+    Commands are stored as typed operations. The rendered argv and command string are
+    cached until the commands change, so even batches of thousands of items are cheap to run again.
+
     To be used with the SteamCMD.execute() method.
     """
-    _commands = []
+    __slots__ = ("_commands", "_argv", "_cmd")
 
     def __init__(self):
         self._commands = []
+        self._changed()
 
     def force_install_dir(self, install_dir: str):
         """
@@ -18,8 +116,7 @@ class SteamCMD_command:
         :param install_dir: Directory to install to
         :return: Index command was added at
         """
-        self._commands.append('+force_install_dir "{}"'.format(install_dir))
-        return len(self._commands) - 1
+        return self._append(_ForceInstallDir(install_dir))
 
     def app_update(self, app_id: int, validate: bool = False, beta: str = '', beta_pass: str = ''):
         """
@@ -31,13 +128,7 @@ class SteamCMD_command:
         :param beta_pass: Optional parameter for entering beta password.
         :return: Index command was added at
         """
-        self._commands.append('+app_update {}{}{}{}'.format(
-            app_id,
-            ' validate' if validate else '',
-            ' -beta {}'.format(beta) if beta else '',
-            ' -betapassword {}'.format(beta_pass) if beta_pass else '',
-        ))
-        return len(self._commands) - 1
+        return self._append(_AppUpdate(app_id, validate, beta, beta_pass))
 
     def workshop_download_item(self, app_id: int, workshop_id: int, validate: bool = False):
         """
@@ -48,22 +139,19 @@ class SteamCMD_command:
         :param validate: Optional parameter for validation. Turn this on when updating something
         :return: Index command was added at
         """
-        self._commands.append('+workshop_download_item {} {}{}'.format(
-            app_id,
-            workshop_id,
-            ' validate' if validate else ''
-        ))
-        return len(self._commands) - 1
+        return self._append(_WorkshopDownloadItem(app_id, workshop_id, validate))
 
     def custom(self, cmd: str):
         """
-        Custom SteamCMD command
+        Custom SteamCMD command, split into arguments the way a shell of this system would.
 
         :param cmd: Command to execute
         :return: Index command was added at
         """
-        self._commands.append(cmd)
-        return len(self._commands) - 1
+        try:
+            return self._append(_Custom(cmd))
+        except ValueError as e:
+            raise SteamCMDException(message=f"Invalid custom command {cmd!r}: {e}")
 
     def remove(self, idx):
         """
@@ -75,10 +163,87 @@ class SteamCMD_command:
         if 0 <= idx < len(self._commands) and self._commands[idx]:
             # Replacing with None to keep indexes intact
             self._commands[idx] = None
+            self._changed()
             return True
         else:
             return False
 
+    def get_commands(self):
+        """
+        Returns the individual commands, skipping removed ones
+
+        :return: List of commands in order of execution
+        """
+        return [c.render() for c in self._commands if c]
+
+    def get_items(self):
+        """
+        Returns the apps and workshop items the commands update, in order of execution
+
+        :return: List of (kind, item_id, app_id, install_dir) tuples, kind being 'app' or 'workshop'.
+            install_dir is None when no force_install_dir precedes the item.
+        """
+        items = []
+        install_dir = None
+        for op in self._commands:
+            if isinstance(op, _ForceInstallDir):
+                install_dir = op.install_dir
+            elif isinstance(op, _AppUpdate):
+                items.append(("app", op.app_id, op.app_id, install_dir))
+            elif isinstance(op, _WorkshopDownloadItem):
+                items.append(("workshop", op.workshop_id, op.app_id, install_dir))
+        return items
+
+    def without(self, completed):
+        """
+        Returns a copy leaving out the app_update and workshop_download_item commands of completed items.
+        Other commands, like force_install_dir, are kept so following commands behave the same.
+
+        :param completed: Collection of ('app', app_id) and ('workshop', workshop_id) tuples, which match the
+            item in every install dir, and of (kind, item_id, install_dir) tuples matching one install dir only.
+            install_dir is None for items without a force_install_dir before them.
+        :return: New SteamCMD_command
+        """
+        remaining = SteamCMD_command()
+        install_dir = None
+        for op in self._commands:
+            if op is None:
+                continue
+            if isinstance(op, _ForceInstallDir):
+                install_dir = op.install_dir
+            elif isinstance(op, _AppUpdate):
+                if ("app", op.app_id) in completed or ("app", op.app_id, install_dir) in completed:
+                    continue
+            elif isinstance(op, _WorkshopDownloadItem):
+                if ("workshop", op.workshop_id) in completed or ("workshop", op.workshop_id, install_dir) in completed:
+                    continue
+            remaining._commands.append(op)
+        return remaining
+
+    def get_argv(self):
+        """
+        Returns the commands as arguments for a steamcmd process, to be run without a shell
+
+        :return: List of arguments
+        """
+        if self._argv is None:
+            argv = []
+            for op in self._commands:
+                if op:
+                    argv += op.argv()
+            self._argv = argv
+        return list(self._argv)
+
     def get_cmd(self):
-        params = filter(None, self._commands)
-        return " ".join(params)
+        if self._cmd is None:
+            self._cmd = " ".join(self.get_commands())
+        return self._cmd
+
+    def _append(self, op: _Op):
+        self._commands.append(op)
+        self._changed()
+        return len(self._commands) - 1
+
+    def _changed(self):
+        self._argv = None
+        self._cmd = None
@@ -7,6 +7,80 @@ __version__ = "1.1.1"
 __maintainer__ = "Wouter Mellema"
 __status__ = "Development"
 
-from pysteamcmdwrapper.SteamCMD import SteamCMD
-from pysteamcmdwrapper.SteamCMD_command import SteamCMD_command
+import sys
+from types import ModuleType
 from pysteamcmdwrapper.exceptions import SteamCMDException, SteamCMDDownloadException, SteamCMDInstallException
+
+# Public names and the modules defining them. Modules are imported on first access, so importing the
+# package doesn't pull in asyncio, sqlite3 or the download machinery of install() before they are needed.
+_exports = {
+    "SteamCMD": "SteamCMD",
+    "AsyncSteamCMD": "AsyncSteamCMD",
+    "SteamCMD_command": "SteamCMD_command",
+    "SteamCMDSession": "session",
+    "SteamCMDSessionPool": "session",
+    "WorkshopScheduler": "scheduler",
+    "WorkshopResult": "scheduler",
+    "ProgressEvent": "progress",
+    "ProgressParser": "progress",
+    "parse_progress": "progress",
+    "BootstrapCache": "cache",
+    "ManifestIndex": "manifest",
+    "AppManifest": "manifest",
+    "WorkshopManifest": "manifest",
+    "RetryPolicy": "retry",
+    "PrometheusTextExporter": "metrics",
+    "BatchPlanner": "planner",
+    "PlannedSession": "planner",
+    "PlanResult": "planner",
+    "InstallVerifier": "verify",
+    "VerifyResult": "verify",
+    "CredentialPool": "credentials",
+    "JobJournal": "journal",
+    "JournalEntry": "journal",
+    "DurationStats": "journal",
+    "ThroughputGovernor": "governor",
+    "CollectionSync": "collection",
+    "SyncPlan": "collection",
+    "SyncResult": "collection",
+    "Coordinator": "coordination",
+    "FileBackend": "coordination",
+    "SQLiteBackend": "coordination",
+    "WorkItem": "coordination",
+    "WarmStandby": "prewarm",
+    "RefreshResult": "prewarm",
+}
+
+__all__ = sorted(_exports) + ["SteamCMDException", "SteamCMDDownloadException", "SteamCMDInstallException"]
+
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # __import__ instead of importlib, which would only add to the import time it saves
+    value = getattr(__import__(f"{__name__}.{module}", fromlist=[name]), name)
+    # Cached, so later lookups don't come back here
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
+
+
+class _Package(ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule binds it on the package. SteamCMD, AsyncSteamCMD and SteamCMD_command are
+        # named after the class they define, and the package keeps exporting the class instead.
+        if isinstance(value, ModuleType) and _exports.get(name) == name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+if sys.version_info < (3, 7):
+    # Module __getattr__ (PEP 562) needs Python 3.7, so older versions import everything right away
+    for _name in _exports:
+        __getattr__(_name)
@@ -0,0 +1,4 @@
+import sys
+from pysteamcmdwrapper.cli import main
+
+sys.exit(main())
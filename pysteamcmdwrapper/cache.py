@@ -0,0 +1,170 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from pysteamcmdwrapper.lock import FileLock
+from pysteamcmdwrapper.SteamCMD import SteamCMD
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+MODES = ("copy", "hardlink")
+
+
+class BootstrapCache:
+    """
+    Local cache of the steamcmd bootstrap, shared by many installation paths on a host.
+
+    The cache holds the downloaded archive under its sha256, together with a steamcmd
+    tree that has already been extracted and has updated itself. New installation paths
+    are populated from that tree, which skips both the download and the self-update.
+    Trees that are missing or refreshed are built again from the stored archive.
+    Safe to use from several processes at once.
+
+    Layout of the cache directory::
+
+        index.json          url -> archive hash and tree
+        archives/<sha256>   bootstrap archives
+        trees/<sha>-<id>/   self-updated steamcmd trees
+    """
+
+    def __init__(self, cache_dir: str, mode: str = "copy"):
+        """
+        :param cache_dir: Directory to keep the cache in, created when missing
+        :param mode: How files are placed into installation paths, either 'copy' or 'hardlink'.
+            Hardlinked files are shared with the cache, so only use this when nothing writes to them in place.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode should be one of {MODES}, got {mode}")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        for sub in ("archives", "trees"):
+            os.makedirs(os.path.join(cache_dir, sub), exist_ok=True)
+        self._lock = FileLock(os.path.join(cache_dir, "lock"))
+
+    def populate(self, steamcmd, refresh: bool = False, checksum: str = None, progress_callback=None):
+        """
+        Installs steamcmd into the installation path of a SteamCMD instance from the cache,
+        filling the cache first when needed.
+
+        :param steamcmd: SteamCMD instance to install into
+        :param refresh: Rebuild the cached tree, so it updates itself again
+        :param checksum: Optional sha256 hex digest the archive has to match
+        :param progress_callback: Optional callable receiving bytes done and bytes total while downloading.
+        :return: Name of the tree that was used
+        """
+        with self._lock:
+            entry = self._read_index().get(steamcmd.steamcmd_url)
+            if refresh or entry is None or not os.path.isdir(self._tree_path(entry["tree"])):
+                known = None if entry is None else entry["archive"]
+                entry = self._build(steamcmd, checksum or known, checksum, progress_callback)
+        # Trees are never modified once built, so copying can happen outside of the lock
+        self._place(self._tree_path(entry["tree"]), steamcmd._installation_path)
+        return entry["tree"]
+
+    def prune(self):
+        """
+        Removes archives and trees which are no longer referenced from the index.
+        Make sure no other process is populating from an old tree while pruning.
+
+        :return: Number of removed entries
+        """
+        removed = 0
+        with self._lock:
+            index = self._read_index()
+            archives = {entry["archive"] for entry in index.values()}
+            trees = {entry["tree"] for entry in index.values()}
+            for name in os.listdir(os.path.join(self.cache_dir, "archives")):
+                if name.split(".")[0] not in archives:
+                    os.remove(os.path.join(self.cache_dir, "archives", name))
+                    removed += 1
+            for name in os.listdir(os.path.join(self.cache_dir, "trees")):
+                if name not in trees:
+                    shutil.rmtree(self._tree_path(name), ignore_errors=True)
+                    removed += 1
+        return removed
+
+    def _build(self, steamcmd, sha: str = None, checksum: str = None, progress_callback=None):
+        """
+        Builds a self-updated tree from the stored archive with the given sha256, downloading
+        the archive when it isn't stored. Must be called with the lock held.
+
+        :return: New index entry
+        """
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=os.path.join(self.cache_dir, "trees"))
+        try:
+            builder = SteamCMD(staging)
+            builder.steamcmd_url = steamcmd.steamcmd_url
+            extension = os.path.basename(builder.zip)[len("steamcmd"):]
+            stored = None if sha is None else os.path.join(self.cache_dir, "archives", sha.lower() + extension)
+            if stored is not None and os.path.isfile(stored) and _sha256(stored) == sha.lower():
+                shutil.copyfile(stored, builder.zip)
+                sha = sha.lower()
+            else:
+                sha = _sha256(builder._download(progress_callback, checksum))
+                shutil.copyfile(builder.zip, os.path.join(self.cache_dir, "archives", sha + extension))
+
+            builder._extract_steamcmd()
+            builder._self_update()
+
+            # The staging suffix keeps names unique when the same archive is built again
+            tree = f"{sha[:16]}-{os.path.basename(staging)[len('.staging-'):]}"
+            os.rename(staging, self._tree_path(tree))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        entry = {"archive": sha, "tree": tree}
+        index = self._read_index()
+        index[steamcmd.steamcmd_url] = entry
+        index_path = os.path.join(self.cache_dir, "index.json")
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(index_path + ".tmp", index_path)
+        return entry
+
+    def _place(self, tree: str, target: str):
+        """
+        Copies or hardlinks every file of tree into target
+        """
+        for root, dirs, files in os.walk(tree):
+            dest_root = os.path.join(target, os.path.relpath(root, tree))
+            os.makedirs(dest_root, exist_ok=True)
+            for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+                src = os.path.join(root, name)
+                dest = os.path.join(dest_root, name)
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), dest)
+                    continue
+                if self.mode == "hardlink":
+                    try:
+                        os.link(src, dest)
+                        continue
+                    except OSError:
+                        # Different filesystem, fall back to copying
+                        pass
+                shutil.copy2(src, dest)
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, "index.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            raise SteamCMDException(message=f"Cache index in {self.cache_dir} is corrupt: {e}")
+
+    def _tree_path(self, name: str):
+        return os.path.join(self.cache_dir, "trees", name)
+
+
+def _sha256(path: str):
+    """
+    :return: sha256 hex digest of a file
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,217 @@
+"""
+pysteamcmd: runs the apps and workshop items of a manifest file through steamcmd.
+
+    pysteamcmd manifest.yaml [-j JOBS] [--tries N] [--steamcmd PATH ...] [--install] [-v]
+
+The manifest is JSON, TOML or YAML (YAML needs PyYAML, TOML on Python < 3.11 needs toml):
+
+    {
+        "steamcmd": ["/opt/steamcmd0", "/opt/steamcmd1"],
+        "username": "anonymous",
+        "password_env": "STEAM_PASSWORD",
+        "jobs": 2,
+        "tries": 3,
+        "installs": [
+            {"install_dir": "/srv/csgo", "apps": [740, {"id": 90, "beta": "beta", "validate": true}]},
+            {"install_dir": "/srv/arma", "apps": [233780],
+             "workshop": [{"app_id": 107410, "items": [450814997, 463939057]}]}
+        ]
+    }
+
+Every install dir is a job, run on one of the steamcmd installations, so the number of jobs
+running at the same time is at most the number of installations. A JSON line with the outcome
+and timing of every job is printed when it finishes, followed by a summary line.
+The exit code is 0 when all jobs succeeded, 1 when any failed and 2 on invalid input.
+"""
+# Only the standard library modules the CLI needs are imported here, the wrapper itself is
+# imported when a manifest is run, so invocations from cron and hooks start quickly.
+import os
+import sys
+import json
+import time
+import argparse
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+
+def load_manifest(path: str):
+    """
+    Reads a manifest file, choosing the format by its extension
+
+    :param path: Path of a .json, .toml, .yaml or .yml file
+    :return: Manifest as a dict
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension == ".json":
+            with open(path) as f:
+                manifest = json.load(f)
+        elif extension == ".toml":
+            manifest = _load_toml(path)
+        elif extension in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise SteamCMDException(
+                    message="Reading YAML manifests needs PyYAML, install it with 'pip install pyyaml'")
+            with open(path) as f:
+                manifest = yaml.safe_load(f)
+        else:
+            raise SteamCMDException(
+                message=f"Unknown manifest format '{extension}', expected .json, .toml, .yaml or .yml")
+    except (OSError, ValueError) as e:
+        raise SteamCMDException(message=f"Unable to read manifest {path}: {e}")
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("installs"), list):
+        raise SteamCMDException(message="The manifest should hold a list of installs")
+    return manifest
+
+
+def _load_toml(path: str):
+    try:
+        import tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    except ImportError:
+        pass
+    try:
+        import toml
+    except ImportError:
+        raise SteamCMDException(
+            message="Reading TOML manifests needs toml on Python < 3.11, install it with 'pip install toml'")
+    with open(path) as f:
+        return toml.load(f)
+
+
+def build_jobs(manifest: dict):
+    """
+    Turns the installs of a manifest into SteamCMD_commands
+
+    :param manifest: Manifest as returned by load_manifest
+    :return: List of (install_dir, SteamCMD_command) tuples
+    """
+    from pysteamcmdwrapper.SteamCMD_command import SteamCMD_command
+
+    jobs = []
+    for install in manifest["installs"]:
+        if not isinstance(install, dict) or not install.get("install_dir"):
+            raise SteamCMDException(message="Every install needs an install_dir")
+        sc = SteamCMD_command()
+        sc.force_install_dir(install["install_dir"])
+        try:
+            for app in install.get("apps", []):
+                if not isinstance(app, dict):
+                    app = {"id": app}
+                sc.app_update(app["id"], app.get("validate", False), app.get("beta", ""),
+                              app.get("betapassword", ""))
+            for workshop in install.get("workshop", []):
+                for item in workshop["items"]:
+                    sc.workshop_download_item(workshop["app_id"], item, workshop.get("validate", False))
+        except (KeyError, TypeError, ValueError) as e:
+            raise SteamCMDException(message=f"Invalid entry for {install['install_dir']}: {e!r}")
+        jobs.append((install["install_dir"], sc))
+    return jobs
+
+
+def run(manifest: dict, steamcmd_paths, jobs: int, tries: int, install: bool = False, out=None):
+    """
+    Runs the installs of a manifest, printing a JSON line per install and a summary line.
+
+    :param manifest: Manifest as returned by load_manifest
+    :param steamcmd_paths: List of steamcmd installation paths, one per parallel job
+    :param jobs: Maximum number of jobs running at the same time
+    :param tries: Number of times every job is tried
+    :param install: Install steamcmd into installation paths where it is missing
+    :param out: Optional file to print the JSON lines to, defaults to stdout
+    :return: Whether all jobs succeeded
+    """
+    import queue
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from pysteamcmdwrapper.SteamCMD import SteamCMD
+
+    out = out or sys.stdout
+    commands = build_jobs(manifest)
+    credentials = None
+    if manifest.get("username"):
+        password = manifest.get("password", "")
+        if manifest.get("password_env"):
+            password = os.environ.get(manifest["password_env"], "")
+        credentials = (manifest["username"], password)
+
+    workers = queue.Queue()
+    for path in steamcmd_paths[:max(1, jobs)]:
+        # stdout holds the JSON lines, steamcmd output is only logged
+        steam = SteamCMD(path, passthrough=False)
+        if install and not os.path.isfile(steam.exe):
+            steam.install()
+        workers.put(steam)
+
+    def run_job(install_dir, sc):
+        steam = workers.get()
+        start = time.monotonic()
+        error = None
+        try:
+            steam.execute(sc, tries, credentials=credentials)
+        except SteamCMDException as e:
+            error = e.message
+        finally:
+            workers.put(steam)
+        items = sc.get_items()
+        return {
+            "install_dir": install_dir,
+            "apps": [item_id for kind, item_id, _, _ in items if kind == "app"],
+            "workshop_items": len([item for item in items if item[0] == "workshop"]),
+            "success": error is None,
+            "duration": round(time.monotonic() - start, 3),
+            "steamcmd": steam._installation_path,
+            "error": error,
+        }
+
+    start = time.monotonic()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers.qsize()) as executor:
+        futures = [executor.submit(run_job, install_dir, sc) for install_dir, sc in commands]
+        for future in as_completed(futures):
+            result = future.result()
+            failed += not result["success"]
+            print(json.dumps(result), file=out, flush=True)
+    print(json.dumps({"summary": True, "jobs": len(commands), "failed": failed,
+                      "duration": round(time.monotonic() - start, 3)}), file=out, flush=True)
+    return failed == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pysteamcmd", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="JSON, TOML or YAML manifest of the installs")
+    parser.add_argument("-j", "--jobs", type=int, help="number of installs running at the same time")
+    parser.add_argument("--tries", type=int, help="number of times every install is tried (default 3)")
+    parser.add_argument("--steamcmd", action="append", metavar="PATH",
+                        help="steamcmd installation path, once per parallel job; overrides the manifest")
+    parser.add_argument("--install", action="store_true", help="install steamcmd where it is missing")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="log to stderr, twice for steamcmd output")
+    args = parser.parse_args(argv)
+
+    if args.verbose:
+        import logging
+        logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+        if args.verbose < 2:
+            logging.getLogger("pysteamcmdwrapper.output").setLevel(logging.WARNING)
+
+    try:
+        manifest = load_manifest(args.manifest)
+        steamcmd_paths = args.steamcmd or manifest.get("steamcmd")
+        if isinstance(steamcmd_paths, str):
+            steamcmd_paths = [steamcmd_paths]
+        if not steamcmd_paths:
+            raise SteamCMDException(
+                message="No steamcmd installation path given, set steamcmd in the manifest or use --steamcmd")
+        jobs = args.jobs or manifest.get("jobs") or len(steamcmd_paths)
+        tries = args.tries or manifest.get("tries") or 3
+        success = run(manifest, steamcmd_paths, jobs, tries, args.install)
+    except SteamCMDException as e:
+        print(f"pysteamcmd: {e.message}", file=sys.stderr)
+        return 2
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
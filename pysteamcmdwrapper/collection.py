@@ -0,0 +1,165 @@
+import os
+import shutil
+import logging
+from typing import NamedTuple, List
+from pysteamcmdwrapper import vdf
+from pysteamcmdwrapper.manifest import ManifestIndex
+from pysteamcmdwrapper.planner import BatchPlanner
+
+logger = logging.getLogger(__name__)
+
+
+class SyncPlan(NamedTuple):
+    """
+    Changes needed to bring the workshop items of an app to the wanted collection
+    """
+    app_id: int
+    download: List[int]
+    prune: List[int]
+    unchanged: int
+
+
+class SyncResult(NamedTuple):
+    """
+    Outcome of syncing the workshop items of an app
+    """
+    app_id: int
+    downloaded: List[int]
+    failed: List[int]
+    pruned: List[int]
+    unchanged: int
+
+    @property
+    def success(self):
+        return not self.failed
+
+
+class CollectionSync:
+    """
+    Keeps the workshop items in an install dir equal to a wanted collection per app.
+
+    The installed items are taken from the workshop manifests, through a ManifestIndex, and from the
+    directories in steamapps/workshop/content/<app_id>. Only items that are missing or older than
+    wanted are downloaded, batched into as few steamcmd sessions as possible, so a sync takes time
+    in proportion to the number of changes rather than the size of the collection. Items that are
+    no longer wanted can be pruned, which removes their content and their entries in the workshop manifest.
+    """
+
+    def __init__(self, install_dir: str, max_items: int = 100, index_path: str = None):
+        """
+        :param install_dir: Directory steamcmd installs into (the force_install_dir)
+        :param max_items: Maximum number of workshop items per steamcmd session
+        :param index_path: Optional path of the ManifestIndex file
+        """
+        self.install_dir = install_dir
+        self.max_items = max_items
+        self.index = ManifestIndex(install_dir, index_path)
+
+    def plan(self, collections, prune: bool = False):
+        """
+        Compares the installed workshop items against the wanted collections.
+
+        :param collections: Dict of app_id to the wanted workshop ids, either an iterable of ids or a dict of
+            workshop_id to the time it was last updated on the workshop, to download items that are older
+        :param prune: Whether installed items that are not wanted are to be removed
+        :return: Dict of app_id to SyncPlan
+        """
+        self.index.refresh()
+        plans = {}
+        for app_id, wanted in _normalize(collections).items():
+            installed = self._installed(app_id)
+            # Missing from the manifest or older than wanted, or listed in the manifest while its content is gone
+            download = sorted(set(self.index.stale_workshop_items(app_id, wanted)) | (set(wanted) - installed))
+            removed = sorted(installed - set(wanted)) if prune else []
+            plans[app_id] = SyncPlan(app_id, download, removed, len(wanted) - len(download))
+        return plans
+
+    def sync(self, steamcmd, collections, prune: bool = False, n_tries: int = 3, validate: bool = False,
+             progress_callback=None, credentials: tuple = None):
+        """
+        Prunes and downloads the workshop items needed to match the wanted collections.
+        Pruning goes first, so the space it frees is available to the downloads.
+
+        :param steamcmd: SteamCMD instance to run the downloads with
+        :param collections: Dict of app_id to the wanted workshop ids, see plan()
+        :param prune: Remove installed items that are not wanted
+        :param n_tries: Number of times each session is tried
+        :param validate: Validate the downloaded items
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param credentials: Optional (username, password) tuple. Defaults to the credentials of the SteamCMD instance.
+        :return: Dict of app_id to SyncResult
+        """
+        collections = _normalize(collections)
+        plans = self.plan(collections, prune)
+        planner = BatchPlanner(self.max_items)
+        for plan in plans.values():
+            for workshop_id in plan.prune:
+                logger.info("Removing workshop item %d of app %d", workshop_id, plan.app_id)
+                shutil.rmtree(self._content_dir(plan.app_id, workshop_id), ignore_errors=True)
+            if plan.prune:
+                self._forget(plan.app_id, plan.prune)
+            for workshop_id in plan.download:
+                planner.add_workshop_item(plan.app_id, workshop_id, self.install_dir, validate, credentials)
+
+        for result in planner.run(steamcmd, n_tries, progress_callback):
+            if not result.success:
+                logger.warning("Syncing %d workshop items failed: %s", len(result.session.operations),
+                               result.error.message)
+
+        # Whatever is still out of date failed, including items of sessions that failed halfway
+        remaining = self.plan(collections)
+        results = {}
+        for app_id, plan in plans.items():
+            failed = set(remaining[app_id].download)
+            results[app_id] = SyncResult(
+                app_id,
+                [workshop_id for workshop_id in plan.download if workshop_id not in failed],
+                [workshop_id for workshop_id in plan.download if workshop_id in failed],
+                plan.prune,
+                plan.unchanged,
+            )
+        return results
+
+    def _installed(self, app_id: int):
+        """
+        :return: Set of the workshop ids of an app that have content
+        """
+        try:
+            with os.scandir(os.path.join(self.install_dir, "steamapps", "workshop", "content", str(app_id))) as it:
+                return {int(entry.name) for entry in it if entry.name.isdigit() and entry.is_dir()}
+        except FileNotFoundError:
+            return set()
+
+    def _forget(self, app_id: int, workshop_ids):
+        """
+        Removes workshop items from the workshop manifest of an app, so neither steamcmd nor the
+        index take them for installed anymore
+        """
+        path = os.path.join(self.install_dir, "steamapps", "workshop", f"appworkshop_{app_id}.acf")
+        try:
+            data = vdf.load(path)
+        except FileNotFoundError:
+            return
+        workshop = data.get("AppWorkshop", {})
+        installed = workshop.get("WorkshopItemsInstalled", {})
+        for workshop_id in workshop_ids:
+            item = installed.pop(str(workshop_id), None)
+            workshop.get("WorkshopItemDetails", {}).pop(str(workshop_id), None)
+            if item is not None and str(workshop.get("SizeOnDisk", "")).isdigit():
+                workshop["SizeOnDisk"] = str(max(int(workshop["SizeOnDisk"]) - int(item.get("size", 0)), 0))
+        vdf.dump(data, path)
+
+    def _content_dir(self, app_id: int, workshop_id: int):
+        return os.path.join(self.install_dir, "steamapps", "workshop", "content", str(app_id), str(workshop_id))
+
+
+def _normalize(collections):
+    """
+    :return: Dict of app_id to a dict of workshop_id to the wanted timeupdated or None
+    """
+    normalized = {}
+    for app_id, wanted in collections.items():
+        if not isinstance(wanted, dict):
+            wanted = dict.fromkeys(wanted)
+        normalized[int(app_id)] = {int(workshop_id): timeupdated for workshop_id, timeupdated in wanted.items()}
+    return normalized
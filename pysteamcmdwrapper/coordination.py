@@ -0,0 +1,424 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+from pysteamcmdwrapper.lock import FileLock
+from pysteamcmdwrapper.SteamCMD_command import SteamCMD_command
+from pysteamcmdwrapper.progress import SUCCESS, APP, WORKSHOP
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkItem(NamedTuple):
+    """
+    An app update, or a workshop item download when workshop_id is set, in an install dir
+    """
+    install_dir: str
+    app_id: int
+    workshop_id: Optional[int] = None
+
+    @property
+    def lease_key(self):
+        """
+        Key of the lease needed to download the item. steamcmd keeps a manifest per app in an
+        install dir, so all items of an app in the same install dir share a lease.
+        """
+        return lease_key(self.install_dir, self.app_id)
+
+    def dumps(self):
+        return json.dumps([self.install_dir, self.app_id, self.workshop_id])
+
+    @classmethod
+    def loads(cls, text: str):
+        return cls(*json.loads(text))
+
+
+def lease_key(install_dir: str, app_id: int):
+    """
+    :return: Key of the lease on an app in an install dir
+    """
+    return json.dumps([os.path.normpath(install_dir), int(app_id)])
+
+
+class FileBackend:
+    """
+    Coordination state in a directory on a shared filesystem, guarded by a FileLock.
+    The filesystem has to support flock between hosts, like NFSv4 and SMB do.
+    """
+
+    def __init__(self, directory: str, clock=time.time):
+        """
+        :param directory: Directory holding the state, created when missing
+        :param clock: Function returning the current time in seconds, shared between hosts
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._clock = clock
+        self._path = os.path.join(directory, "state.json")
+        self._lock = FileLock(os.path.join(directory, "lock"), poll_interval=0.01)
+        # A FileLock is held by a single thread at a time
+        self._thread_lock = threading.Lock()
+
+    def enqueue(self, batch: str, items):
+        with self._state() as state:
+            queue = state["batches"].setdefault(batch, {})
+            for item in items:
+                queue.setdefault(item.dumps(), {"state": PENDING, "error": None})
+
+    def claim(self, batch: str, owner: str, ttl: float, max_items: int):
+        with self._state() as state:
+            now = self._clock()
+            leases = state["leases"]
+            claimed = []
+            key = None
+            for text, entry in state["batches"].get(batch, {}).items():
+                if entry["state"] != PENDING:
+                    continue
+                item = WorkItem.loads(text)
+                if key is None:
+                    lease = leases.get(item.lease_key)
+                    if lease and lease["expires"] > now and lease["owner"] != owner:
+                        continue
+                    key = item.lease_key
+                if item.lease_key == key:
+                    claimed.append(item)
+                    if len(claimed) >= max_items:
+                        break
+            if key is not None:
+                leases[key] = {"owner": owner, "expires": now + ttl}
+            return claimed
+
+    def finish(self, batch: str, items, state: str, error: str = None):
+        with self._state() as current:
+            queue = current["batches"].get(batch, {})
+            for item in items:
+                queue[item.dumps()] = {"state": state, "error": error}
+
+    def status(self, batch: str):
+        with self._state() as state:
+            return {WorkItem.loads(text): entry["state"] for text, entry in state["batches"].get(batch, {}).items()}
+
+    def acquire(self, key: str, owner: str, ttl: float):
+        with self._state() as state:
+            now = self._clock()
+            lease = state["leases"].get(key)
+            if lease and lease["expires"] > now and lease["owner"] != owner:
+                return False
+            state["leases"][key] = {"owner": owner, "expires": now + ttl}
+            return True
+
+    def renew(self, key: str, owner: str, ttl: float):
+        with self._state() as state:
+            lease = state["leases"].get(key)
+            if not lease or lease["owner"] != owner:
+                return False
+            lease["expires"] = self._clock() + ttl
+            return True
+
+    def release(self, key: str, owner: str):
+        with self._state() as state:
+            lease = state["leases"].get(key)
+            if lease and lease["owner"] == owner:
+                del state["leases"][key]
+
+    @contextmanager
+    def _state(self):
+        """
+        Loads the state under the lock and writes it back afterwards
+        """
+        with self._thread_lock, self._lock:
+            try:
+                with open(self._path) as f:
+                    state = json.load(f)
+            except FileNotFoundError:
+                state = {"batches": {}, "leases": {}}
+            before = json.dumps(state, sort_keys=True)
+            yield state
+            if json.dumps(state, sort_keys=True) != before:
+                tmp = f"{self._path}.{socket.gethostname()}.{os.getpid()}"
+                with open(tmp, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp, self._path)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    batch TEXT NOT NULL,
+    item TEXT NOT NULL,
+    lease_key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (batch, item)
+);
+CREATE INDEX IF NOT EXISTS items_state ON items (batch, state, seq);
+CREATE TABLE IF NOT EXISTS leases (
+    lease_key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+class SQLiteBackend:
+    """
+    Coordination state in a SQLite database. Uses the rollback journal rather than WAL,
+    which needs shared memory and so doesn't work for databases on network filesystems.
+    """
+
+    def __init__(self, path: str, clock=time.time):
+        """
+        :param path: Path of the SQLite database, created when missing
+        :param clock: Function returning the current time in seconds, shared between hosts
+        """
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Autocommit, transactions are started explicitly with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def enqueue(self, batch: str, items):
+        with self._transaction() as db:
+            seq = db.execute("SELECT COALESCE(MAX(seq), 0) FROM items WHERE batch = ?", (batch,)).fetchone()[0]
+            db.executemany(
+                "INSERT OR IGNORE INTO items (batch, item, lease_key, state, seq) VALUES (?, ?, ?, ?, ?)",
+                [(batch, item.dumps(), item.lease_key, PENDING, seq + i) for i, item in enumerate(items, 1)])
+
+    def claim(self, batch: str, owner: str, ttl: float, max_items: int):
+        with self._transaction() as db:
+            now = self._clock()
+            row = db.execute(
+                "SELECT lease_key FROM items WHERE batch = ? AND state = ? AND lease_key NOT IN "
+                "(SELECT lease_key FROM leases WHERE expires > ? AND owner != ?) ORDER BY seq LIMIT 1",
+                (batch, PENDING, now, owner)).fetchone()
+            if row is None:
+                return []
+            db.execute("INSERT OR REPLACE INTO leases (lease_key, owner, expires) VALUES (?, ?, ?)",
+                       (row[0], owner, now + ttl))
+            return [WorkItem.loads(item) for item, in db.execute(
+                "SELECT item FROM items WHERE batch = ? AND state = ? AND lease_key = ? ORDER BY seq LIMIT ?",
+                (batch, PENDING, row[0], max_items))]
+
+    def finish(self, batch: str, items, state: str, error: str = None):
+        with self._transaction() as db:
+            db.executemany("UPDATE items SET state = ?, error = ? WHERE batch = ? AND item = ?",
+                           [(state, error, batch, item.dumps()) for item in items])
+
+    def status(self, batch: str):
+        with self._lock:
+            return {WorkItem.loads(item): state for item, state in self._db.execute(
+                "SELECT item, state FROM items WHERE batch = ? ORDER BY seq", (batch,))}
+
+    def acquire(self, key: str, owner: str, ttl: float):
+        with self._transaction() as db:
+            now = self._clock()
+            row = db.execute("SELECT owner, expires FROM leases WHERE lease_key = ?", (key,)).fetchone()
+            if row and row[1] > now and row[0] != owner:
+                return False
+            db.execute("INSERT OR REPLACE INTO leases (lease_key, owner, expires) VALUES (?, ?, ?)",
+                       (key, owner, now + ttl))
+            return True
+
+    def renew(self, key: str, owner: str, ttl: float):
+        with self._transaction() as db:
+            return db.execute("UPDATE leases SET expires = ? WHERE lease_key = ? AND owner = ?",
+                              (self._clock() + ttl, key, owner)).rowcount == 1
+
+    def release(self, key: str, owner: str):
+        with self._transaction() as db:
+            db.execute("DELETE FROM leases WHERE lease_key = ? AND owner = ?", (key, owner))
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+
+class _Heartbeat:
+    """
+    Renews a lease every third of its ttl until stopped. Sets the lost event when the lease could not be
+    renewed, from then on another host may hold it.
+    """
+
+    def __init__(self, backend, key: str, owner: str, ttl: float):
+        self.lost = threading.Event()
+        self._backend = backend
+        self._key = key
+        self._owner = owner
+        self._ttl = ttl
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="steamcmd-lease", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        renewed = time.monotonic()
+        while not self._stopped.wait(self._ttl / 3):
+            try:
+                if self._backend.renew(self._key, self._owner, self._ttl):
+                    renewed = time.monotonic()
+                    continue
+            except Exception:
+                logger.exception("Renewing the lease on %s failed", self._key)
+                # Still ours when the next renewal comes before it expires
+                if time.monotonic() - renewed + self._ttl / 3 < self._ttl:
+                    continue
+            self.lost.set()
+            logger.warning("Lost the lease on %s, it expired before it was renewed", self._key)
+            return
+
+
+class Coordinator:
+    """
+    Coordinates steamcmd runs of several hosts sharing install dirs, so they don't corrupt
+    each other's downloads.
+
+    Hosts take exclusive leases per app and install dir, which are renewed by a heartbeat
+    and expire after ttl seconds when their host dies. run() shares the items of a batch
+    through a work queue in the backend: every item is downloaded once in the cluster, by
+    the first host to claim it, and the other hosts wait for it and reuse the result.
+
+    The backend is a FileBackend on a shared filesystem or a SQLiteBackend. Leases expire
+    by the wall clock, so the clocks of the hosts should be in sync to well within ttl.
+    """
+
+    def __init__(self, backend, owner: str = None, ttl: float = 60.0, poll_interval: float = 1.0,
+                 max_items: int = 100):
+        """
+        :param backend: FileBackend or SQLiteBackend shared by all hosts
+        :param owner: Optional name of this host in the leases, unique in the cluster. Defaults to
+            the hostname, process id and a random suffix.
+        :param ttl: Number of seconds a lease lasts without being renewed
+        :param poll_interval: Number of seconds between checks while waiting for other hosts
+        :param max_items: Maximum number of items claimed for a single steamcmd process
+        """
+        self.backend = backend
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.max_items = max_items
+
+    @contextmanager
+    def lease(self, install_dir: str, app_id: int, timeout: float = None):
+        """
+        Holds the lease on an app in an install dir for the duration of a with block,
+        for instance around app_update(). Waits for other hosts holding it.
+        The block gets a threading.Event that is set when the lease is lost; pass it to execute() as abort
+        to kill steamcmd then. A block that finished after losing the lease raises a SteamCMDException.
+
+        :param install_dir: Directory steamcmd installs into (the force_install_dir)
+        :param app_id: The app, or the parent app of workshop items
+        :param timeout: Optional number of seconds to wait for the lease
+        """
+        key = lease_key(install_dir, app_id)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.backend.acquire(key, self.owner, self.ttl):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise SteamCMDException(message=f"Timed out waiting for the lease on app {app_id} in {install_dir}")
+            time.sleep(self.poll_interval)
+        heartbeat = _Heartbeat(self.backend, key, self.owner, self.ttl)
+        try:
+            yield heartbeat.lost
+        finally:
+            heartbeat.stop()
+            self.backend.release(key, self.owner)
+        if heartbeat.lost.is_set():
+            raise SteamCMDException(message=f"Lost the lease on app {app_id} in {install_dir} while holding it")
+
+    def run(self, steamcmd, batch: str, items, n_tries: int = 3, progress_callback=None, **execute_args):
+        """
+        Adds items to a batch and works on the batch until all of its items are done or failed.
+        Every host of the cluster runs the same batch, items already added by another host are
+        not added again. Failed items are not tried again in the batch.
+
+        :param steamcmd: SteamCMD instance to run the downloads with
+        :param batch: Name of the batch, shared by the hosts
+        :param items: Iterable of WorkItems
+        :param n_tries: Number of times every claim of items is tried
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param execute_args: Optional keyword arguments for execute(), like credentials or stall_timeout
+        :return: Dict of WorkItem to its state in the batch, DONE or FAILED
+        """
+        self.backend.enqueue(batch, [WorkItem(*item) for item in items])
+        while True:
+            claimed = self.backend.claim(batch, self.owner, self.ttl, self.max_items)
+            if claimed:
+                self._download(steamcmd, batch, claimed, n_tries, progress_callback, execute_args)
+                continue
+            status = self.backend.status(batch)
+            if PENDING not in status.values():
+                return status
+            # The remaining items are leased by other hosts
+            time.sleep(self.poll_interval)
+
+    def _download(self, steamcmd, batch: str, items, n_tries: int, progress_callback, execute_args):
+        """
+        Downloads claimed items of one lease key, holding the lease until they finished.
+        When the lease is lost steamcmd is killed, and the items are left pending for the host holding it now.
+        """
+        sc = SteamCMD_command()
+        sc.force_install_dir(items[0].install_dir)
+        for item in items:
+            if item.workshop_id is None:
+                sc.app_update(item.app_id)
+            else:
+                sc.workshop_download_item(item.app_id, item.workshop_id)
+        completed = set()
+
+        def on_progress(event):
+            if event.kind == SUCCESS and event.item_type:
+                completed.add((event.item_type, event.item_id))
+            if progress_callback:
+                progress_callback(event)
+
+        key = items[0].lease_key
+        heartbeat = _Heartbeat(self.backend, key, self.owner, self.ttl)
+        error = None
+        try:
+            try:
+                steamcmd.execute(sc, n_tries, on_progress, abort=heartbeat.lost, **execute_args)
+            except SteamCMDException as e:
+                error = e.message
+            finally:
+                heartbeat.stop()
+            if heartbeat.lost.is_set():
+                logger.warning("Stopped downloading %d items of app %d in %s, another host may hold the lease",
+                               len(items), items[0].app_id, items[0].install_dir)
+                return
+            done = items
+            if error is not None:
+                # Items that completed before the failure are kept
+                done = [item for item in items if ((APP, item.app_id) if item.workshop_id is None
+                                                   else (WORKSHOP, item.workshop_id)) in completed]
+                failed = [item for item in items if item not in done]
+                logger.warning("%d items of app %d in %s failed: %s", len(failed), items[0].app_id,
+                               items[0].install_dir, error)
+                self.backend.finish(batch, failed, FAILED, error)
+            self.backend.finish(batch, done, DONE)
+        finally:
+            self.backend.release(key, self.owner)
@@ -0,0 +1,164 @@
+import time
+import threading
+from contextlib import contextmanager
+from pysteamcmdwrapper.retry import RATE_LIMIT, STEAM_GUARD, INVALID_PASSWORD
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+# Seconds an account is left alone after a failure, an invalid password disables it for good
+DEFAULT_COOLDOWNS = {
+    RATE_LIMIT: 600.0,
+    STEAM_GUARD: 1800.0,
+    INVALID_PASSWORD: float("inf"),
+}
+
+
+class _Account:
+    __slots__ = ("uname", "passw", "tokens", "refilled", "active", "cooldown_until", "last_used")
+
+    def __init__(self, uname: str, passw: str, tokens: float, now: float):
+        self.uname = uname
+        self.passw = passw
+        self.tokens = tokens
+        self.refilled = now
+        self.active = 0
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+
+
+class CredentialPool:
+    """
+    Hands out Steam accounts to concurrent steamcmd runs.
+
+    Every account has a token bucket limiting how often it logs in, a maximum number of
+    sessions at the same time, and a cooldown after failures like being rate limited.
+    Work is spread over the accounts: acquire() picks the usable account with the fewest
+    sessions running, and blocks while none is usable.
+
+    Pass a pool as the credentials of SteamCMD.execute() to take an account for every try.
+    """
+
+    def __init__(self, accounts, max_sessions: int = 1, login_rate: float = 1 / 60, burst: int = 3,
+                 cooldowns=None, clock=time.monotonic):
+        """
+        :param accounts: Iterable of (username, password) tuples
+        :param max_sessions: Maximum number of sessions per account at the same time
+        :param login_rate: Logins per second an account earns, the refill rate of its token bucket
+        :param burst: Number of logins an account can make in a row, the size of its token bucket
+        :param cooldowns: Optional dict of retry Failure to the seconds an account is not used after it.
+            Defaults to DEFAULT_COOLDOWNS.
+        :param clock: Function returning the current time in seconds
+        """
+        if max_sessions < 1 or burst < 1:
+            raise ValueError("max_sessions and burst should be at least 1")
+        self.max_sessions = max_sessions
+        self.login_rate = login_rate
+        self.burst = burst
+        self.cooldowns = DEFAULT_COOLDOWNS if cooldowns is None else cooldowns
+        self._clock = clock
+        self._condition = threading.Condition()
+        now = clock()
+        self._accounts = [_Account(uname, passw, float(burst), now) for uname, passw in accounts]
+        if not self._accounts:
+            raise ValueError("At least one account is required")
+        self._by_credentials = {(a.uname, a.passw): a for a in self._accounts}
+
+    def acquire(self, timeout: float = None):
+        """
+        Takes an account for a single login.
+
+        :param timeout: Optional number of seconds to wait for an account
+        :return: (username, password) tuple, or None when the timeout passed
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._condition:
+            while True:
+                now = self._clock()
+                usable = [a for a in self._accounts if a.cooldown_until != float("inf")]
+                if not usable:
+                    raise SteamCMDException(message="No usable accounts left in the credential pool")
+                account = self._pick(usable, now)
+                if account is not None:
+                    account.tokens -= 1
+                    account.active += 1
+                    account.last_used = now
+                    return account.uname, account.passw
+
+                wait = self._next_available(usable, now)
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._condition.wait(wait)
+
+    def release(self, credentials: tuple, failure=None):
+        """
+        Returns an account to the pool.
+
+        :param credentials: (username, password) tuple from acquire()
+        :param failure: Optional retry Failure of the run, which may start a cooldown
+        """
+        with self._condition:
+            account = self._by_credentials[tuple(credentials)]
+            account.active -= 1
+            cooldown = self.cooldowns.get(failure) if failure is not None else None
+            if cooldown:
+                account.cooldown_until = max(account.cooldown_until, self._clock() + cooldown)
+            self._condition.notify_all()
+
+    @contextmanager
+    def account(self, timeout: float = None):
+        """
+        Context manager taking an account from the pool and returning it afterwards.
+
+        :param timeout: Optional number of seconds to wait for an account
+        :return: (username, password) tuple
+        """
+        credentials = self.acquire(timeout)
+        if credentials is None:
+            raise SteamCMDException(message=f"No account became available within {timeout} seconds")
+        try:
+            yield credentials
+        finally:
+            self.release(credentials)
+
+    def cooling_down(self):
+        """
+        :return: Dict of the usernames of accounts in a cooldown to the seconds it has left
+        """
+        now = self._clock()
+        with self._condition:
+            return {a.uname: a.cooldown_until - now for a in self._accounts if a.cooldown_until > now}
+
+    def _refill(self, account: _Account, now: float):
+        account.tokens = min(float(self.burst), account.tokens + (now - account.refilled) * self.login_rate)
+        account.refilled = now
+
+    def _pick(self, accounts, now: float):
+        """
+        :return: The usable account with the fewest sessions, or None when no account is usable now
+        """
+        candidates = []
+        for account in accounts:
+            self._refill(account, now)
+            if account.active < self.max_sessions and account.cooldown_until <= now and account.tokens >= 1:
+                candidates.append(account)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda a: (a.active, -a.tokens, a.last_used))
+
+    def _next_available(self, accounts, now: float):
+        """
+        :return: Seconds until an account without a full set of sessions becomes usable,
+            or None when one of the running sessions has to finish first
+        """
+        waits = []
+        for account in accounts:
+            if account.active >= self.max_sessions:
+                continue
+            wait = max(account.cooldown_until - now, 0.0)
+            if account.tokens < 1:
+                if self.login_rate <= 0:
+                    continue
+                wait = max(wait, (1 - account.tokens) / self.login_rate)
+            waits.append(wait)
+        return min(waits) if waits else None
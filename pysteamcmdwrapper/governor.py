@@ -0,0 +1,222 @@
+import os
+import time
+import signal
+import logging
+import threading
+import itertools
+from collections import deque
+from pysteamcmdwrapper.progress import PROGRESS, SUCCESS, STARTED, WORKSHOP, APP
+
+logger = logging.getLogger(__name__)
+
+# Pausing needs job control signals, which Windows does not have
+CAN_PAUSE = hasattr(signal, "SIGSTOP")
+
+
+class _Worker:
+    __slots__ = ("pid", "samples", "item", "item_bytes", "total", "paused_since", "watchdog")
+
+    def __init__(self, pid: int, watchdog=None):
+        self.pid = pid
+        self.watchdog = watchdog
+        self.samples = deque()
+        self.item = None
+        self.item_bytes = 0
+        self.total = 0
+        self.paused_since = None
+
+
+class ThroughputGovernor:
+    """
+    Measures the download rate of running steamcmd processes and keeps their sum below a budget.
+
+    Rates are taken from the progress output of every process, over a sliding window. When the
+    total goes over max_rate the fastest running process is paused with SIGSTOP, and paused
+    processes are resumed with SIGCONT once the total drops below the budget again. No process is
+    paused longer than max_pause, so its connections to Steam don't time out. Processes can also be
+    started with a lower CPU priority through niceness.
+
+    Give a governor to SteamCMD to govern every process it starts. Without a max_rate, or on
+    Windows, the governor only measures.
+    """
+
+    def __init__(self, max_rate: float = None, window: float = 5.0, interval: float = 0.25,
+                 max_pause: float = 10.0, niceness: int = None, clock=time.monotonic):
+        """
+        :param max_rate: Optional budget in bytes per second for all processes together
+        :param window: Number of seconds rates are averaged over
+        :param interval: Number of seconds between checks of the budget
+        :param max_pause: Maximum number of seconds a process is paused at a time
+        :param niceness: Optional niceness increment for every process, lowering its CPU priority
+        :param clock: Function returning the current time in seconds
+        """
+        self.max_rate = max_rate
+        self.window = window
+        self.interval = interval
+        self.max_pause = max_pause
+        self.niceness = niceness
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._workers = {}
+        self._ids = itertools.count()
+        self._total = 0
+        self._thread = None
+
+    def register(self, pid: int, watchdog=None):
+        """
+        Starts governing a process. The process should lead its own process group,
+        so steamcmd's children are paused along with it.
+
+        :param pid: Process id of steamcmd
+        :param watchdog: Optional Watchdog of the process, told when it is paused so it does not count as stalled
+        :return: Id to pass to observe() and unregister()
+        """
+        if self.niceness and hasattr(os, "setpriority"):
+            try:
+                os.setpriority(os.PRIO_PGRP, pid, os.getpriority(os.PRIO_PGRP, pid) + self.niceness)
+            except OSError as e:
+                logger.warning("Unable to lower the priority of steamcmd process %d: %s", pid, e)
+        with self._lock:
+            worker_id = next(self._ids)
+            self._workers[worker_id] = _Worker(pid, watchdog)
+            if self.max_rate and CAN_PAUSE and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._govern, name="steamcmd-governor", daemon=True)
+                self._thread.start()
+        return worker_id
+
+    def unregister(self, worker_id: int):
+        """
+        Stops governing a process, resuming it when it was paused
+
+        :param worker_id: Id returned by register()
+        """
+        with self._lock:
+            worker = self._workers.pop(worker_id, None)
+            if worker is not None and worker.paused_since is not None:
+                self._signal(worker, signal.SIGCONT)
+                if worker.watchdog is not None:
+                    worker.watchdog.resume()
+
+    def observe(self, worker_id: int, event):
+        """
+        Counts the bytes downloaded according to a progress event of a process
+
+        :param worker_id: Id returned by register()
+        :param event: ProgressEvent parsed from the output of the process
+        """
+        if event is None or event.bytes_done is None and event.kind != STARTED:
+            return
+        now = self._clock()
+        with self._lock:
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                return
+            # Progress lines of apps carry no app id, so all apps count as one item
+            key = (WORKSHOP, event.item_id) if event.item_type == WORKSHOP else APP
+            if event.kind == STARTED or key != worker.item:
+                worker.item, worker.item_bytes = key, 0
+            if event.kind not in (PROGRESS, SUCCESS) or event.bytes_done is None:
+                return
+            delta = event.bytes_done - worker.item_bytes
+            if delta < 0:
+                # The next app started
+                delta = event.bytes_done
+            worker.item_bytes = event.bytes_done
+            if delta == 0:
+                return
+            worker.samples.append((now, delta))
+            worker.total += delta
+            self._total += delta
+
+    def rate(self):
+        """
+        :return: Download rate of all processes together, in bytes per second over the window
+        """
+        return sum(self.rates().values())
+
+    def rates(self):
+        """
+        :return: Dict of worker id to its download rate in bytes per second over the window
+        """
+        now = self._clock()
+        with self._lock:
+            return {worker_id: self._rate(worker, now) for worker_id, worker in self._workers.items()}
+
+    def total_bytes(self):
+        """
+        :return: Number of bytes downloaded by all processes since the governor was created
+        """
+        with self._lock:
+            return self._total
+
+    def paused(self):
+        """
+        :return: List of the ids of paused workers
+        """
+        with self._lock:
+            return [worker_id for worker_id, worker in self._workers.items() if worker.paused_since is not None]
+
+    def check(self):
+        """
+        Pauses or resumes a single process to move the total rate towards the budget.
+        Called every interval by the governing thread.
+        """
+        if not self.max_rate or not CAN_PAUSE:
+            return
+        now = self._clock()
+        with self._lock:
+            rates = {worker_id: self._rate(worker, now) for worker_id, worker in self._workers.items()}
+            total = sum(rates.values())
+            running = [w for w in self._workers if self._workers[w].paused_since is None]
+            paused = sorted((w for w in self._workers if self._workers[w].paused_since is not None),
+                            key=lambda w: self._workers[w].paused_since)
+
+            overdue = [w for w in paused if now - self._workers[w].paused_since >= self.max_pause]
+            if overdue:
+                # Take turns, pausing the fastest running process in place of one paused for too long
+                self._resume(overdue[0])
+                if running and total > self.max_rate:
+                    self._pause(max(running, key=lambda w: rates[w]), now)
+            elif total > self.max_rate and running:
+                self._pause(max(running, key=lambda w: rates[w]), now)
+            elif total < self.max_rate and paused:
+                self._resume(paused[0])
+
+    def _govern(self):
+        while True:
+            with self._lock:
+                if not self._workers:
+                    self._thread = None
+                    return
+            self.check()
+            time.sleep(self.interval)
+
+    def _rate(self, worker: _Worker, now: float):
+        while worker.samples and worker.samples[0][0] < now - self.window:
+            worker.samples.popleft()
+        return sum(delta for _, delta in worker.samples) / self.window
+
+    def _pause(self, worker_id: int, now: float):
+        worker = self._workers[worker_id]
+        if worker.watchdog is not None:
+            worker.watchdog.pause()
+        if self._signal(worker, signal.SIGSTOP):
+            worker.paused_since = now
+        elif worker.watchdog is not None:
+            worker.watchdog.resume()
+
+    def _resume(self, worker_id: int):
+        worker = self._workers[worker_id]
+        self._signal(worker, signal.SIGCONT)
+        worker.paused_since = None
+        if worker.watchdog is not None:
+            worker.watchdog.resume()
+
+    @staticmethod
+    def _signal(worker: _Worker, signum):
+        try:
+            os.killpg(worker.pid, signum)
+            return True
+        except OSError:
+            # Already exited
+            return False
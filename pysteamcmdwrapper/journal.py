@@ -0,0 +1,357 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import NamedTuple, Optional
+from pysteamcmdwrapper import vdf, progress
+from pysteamcmdwrapper.progress import APP, WORKSHOP
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+QUEUED = "queued"
+STARTED = "started"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    app_id INTEGER NOT NULL,
+    install_dir TEXT,
+    state TEXT NOT NULL,
+    buildid INTEGER,
+    duration REAL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_batch ON events (batch, state);
+CREATE INDEX IF NOT EXISTS events_item ON events (kind, item_id);
+"""
+
+
+class JournalEntry(NamedTuple):
+    """
+    A single recorded state change of an item.
+    buildid is the build of apps and the workshop update time of workshop items.
+    install_dir is the force_install_dir the item was run with, None without one.
+    """
+    batch: str
+    kind: str
+    item_id: int
+    app_id: int
+    state: str
+    buildid: Optional[int]
+    duration: Optional[float]
+    at: float
+    install_dir: Optional[str]
+
+
+class DurationStats(NamedTuple):
+    """
+    Download durations of an item over all completed runs in the journal
+    """
+    kind: str
+    item_id: int
+    count: int
+    mean: float
+    min: float
+    max: float
+
+
+class JobJournal:
+    """
+    Append-only journal of the items of execute() batches, kept in SQLite in WAL mode.
+
+    execute() records every item as queued, started and completed (or failed) together with
+    its build and timing. When a batch is run again under the same name, for instance after
+    the orchestrator restarted halfway, only the items which did not complete yet are run.
+
+    Events are written in batches, at most flush_interval seconds apart, so large batches don't
+    wait for a disk sync per item. At most the last interval is lost on a crash, and those items
+    are simply run again.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, clock=time.time):
+        """
+        :param path: Path of the SQLite database, created when missing
+        :param flush_interval: Maximum number of seconds events are buffered before being written
+        :param clock: Function returning the current time in seconds
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._pending = []
+        self._last_flush = clock()
+        # Shared by the threads of a scheduler, all access goes through the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        # Journals written before install dirs were recorded
+        if "install_dir" not in [row[1] for row in self._db.execute("PRAGMA table_info(events)")]:
+            self._db.execute("ALTER TABLE events ADD COLUMN install_dir TEXT")
+
+    def close(self):
+        """
+        Writes buffered events and closes the database
+        """
+        with self._lock:
+            self.flush()
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def queue(self, batch: str, cmd):
+        """
+        Records the items of a command as queued in a batch, skipping ones queued before.
+        The same item in another install dir is a different item.
+
+        :param batch: Name of the batch
+        :param cmd: SteamCMD_command
+        :return: Number of items queued
+        """
+        with self._lock:
+            self.flush()
+            queued = set(self._db.execute(
+                "SELECT kind, item_id, install_dir FROM events WHERE batch = ? AND state = ?", (batch, QUEUED)))
+            now = self._clock()
+            rows = []
+            for kind, item_id, app_id, install_dir in cmd.get_items():
+                if (kind, item_id, install_dir) not in queued:
+                    queued.add((kind, item_id, install_dir))
+                    rows.append((batch, kind, item_id, app_id, install_dir, QUEUED, None, None, now))
+            self._insert(rows)
+            return len(rows)
+
+    def completed(self, batch: str):
+        """
+        :param batch: Name of the batch
+        :return: Set of (kind, item_id, install_dir) tuples completed in the batch, kind being 'app' or 'workshop'.
+            install_dir is None for items run without a force_install_dir.
+        """
+        with self._lock:
+            self.flush()
+            return set(self._db.execute(
+                "SELECT kind, item_id, install_dir FROM events WHERE batch = ? AND state = ?", (batch, COMPLETED)))
+
+    def remaining(self, batch: str, cmd):
+        """
+        :param batch: Name of the batch
+        :param cmd: SteamCMD_command
+        :return: Copy of cmd without the items completed in the batch
+        """
+        return cmd.without(self.completed(batch))
+
+    def execute(self, steamcmd, cmd, batch: str, n_tries: int = 1, progress_callback=None, credentials=None,
+                timeout: float = None, stall_timeout: float = None):
+        """
+        Runs the items of a command that did not complete in the batch yet, recording their progress.
+
+        :param steamcmd: SteamCMD instance to run the command with
+        :param cmd: SteamCMD_command
+        :param batch: Name of the batch. Run a batch again under the same name to resume it.
+        :param n_tries: Number of times the command will be tried.
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :param credentials: Optional credentials, passed on to execute()
+        :param timeout: Optional number of seconds after which a try is killed, passed on to execute()
+        :param stall_timeout: Optional number of seconds without progress after which a try is killed,
+            passed on to execute()
+        :return: Status code of child process, 0 when nothing was left to run
+        """
+        self.queue(batch, cmd)
+        remaining = self.remaining(batch, cmd)
+        if not remaining.get_items():
+            return 0
+        recorder = _Recorder(self, batch, remaining, steamcmd._installation_path, progress_callback)
+        try:
+            return steamcmd.execute(remaining, n_tries, recorder, credentials=credentials, timeout=timeout,
+                                    stall_timeout=stall_timeout)
+        finally:
+            self.flush()
+
+    def history(self, kind: str = None, item_id: int = None, batch: str = None, limit: int = None):
+        """
+        :param kind: Optional 'app' or 'workshop' to limit the entries to
+        :param item_id: Optional item to limit the entries to
+        :param batch: Optional batch to limit the entries to
+        :param limit: Optional maximum number of entries, the newest are returned
+        :return: List of JournalEntries, oldest first
+        """
+        where, args = [], []
+        for column, value in (("kind", kind), ("item_id", item_id), ("batch", batch)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                args.append(value)
+        query = "SELECT batch, kind, item_id, app_id, state, buildid, duration, at, install_dir FROM events"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(int(limit))
+        with self._lock:
+            self.flush()
+            rows = self._db.execute(query, args).fetchall()
+        return [JournalEntry(*row) for row in reversed(rows)]
+
+    def durations(self, kind: str = None):
+        """
+        Statistics of the download durations of items, for estimating how long work will take.
+
+        :param kind: Optional 'app' or 'workshop' to limit the items to
+        :return: Dict of (kind, item_id) to DurationStats
+        """
+        query = ("SELECT kind, item_id, COUNT(*), AVG(duration), MIN(duration), MAX(duration) FROM events "
+                 "WHERE state = ? AND duration IS NOT NULL")
+        args = [COMPLETED]
+        if kind is not None:
+            query += " AND kind = ?"
+            args.append(kind)
+        query += " GROUP BY kind, item_id"
+        with self._lock:
+            self.flush()
+            return {(row[0], row[1]): DurationStats(*row) for row in self._db.execute(query, args)}
+
+    def record(self, batch: str, kind: str, item_id: int, app_id: int, state: str, buildid: int = None,
+               duration: float = None, install_dir: str = None, manifest_dir: str = None):
+        """
+        Buffers an event, writing the buffer when flush_interval passed.
+        The build of completed items is looked up in the manifests of manifest_dir, or of install_dir
+        without one, when it is written.
+        """
+        with self._lock:
+            self._pending.append((batch, kind, item_id, app_id, install_dir, state, buildid, duration, self._clock(),
+                                  manifest_dir or install_dir))
+            if self._clock() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes buffered events to the database
+        """
+        with self._lock:
+            self._last_flush = self._clock()
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            builds = _Builds()
+            rows = []
+            for batch, kind, item_id, app_id, install_dir, state, buildid, duration, at, manifest_dir in pending:
+                if buildid is None and state == COMPLETED and manifest_dir:
+                    buildid = builds.get(manifest_dir, kind, item_id, app_id)
+                rows.append((batch, kind, item_id, app_id, install_dir, state, buildid, duration, at))
+            self._insert(rows)
+
+    def _insert(self, rows):
+        if not rows:
+            return
+        try:
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO events (batch, kind, item_id, app_id, install_dir, state, buildid, duration, at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            raise SteamCMDException(message=f"Unable to write to job journal {self.path}: {e}")
+
+
+class _Recorder:
+    """
+    Progress callback recording the state changes of the items of a command in a journal.
+    Like AttemptOutcome, events are matched to the commands in order, so the same item in two
+    install dirs is recorded as two items.
+    """
+
+    def __init__(self, journal: JobJournal, batch: str, cmd, default_dir: str, progress_callback=None):
+        self._journal = journal
+        self._batch = batch
+        self._progress_callback = progress_callback
+        self._default_dir = default_dir
+        self._items = cmd.get_items()
+        self._started = {}
+        self._next = 0
+        self._current_app = None
+
+    def __call__(self, event):
+        if event.item_type == WORKSHOP and event.kind == progress.STARTED:
+            idx = self._match(WORKSHOP, event.item_id)
+            if idx is not None:
+                self._next = idx
+                self._start(idx)
+        elif event.item_type is None and event.kind == progress.PROGRESS and self._current_app is None:
+            # Apps print no start line, they start with their first progress line, in command order
+            pending = [idx for idx, item in enumerate(self._items) if item[0] == APP and idx not in self._started]
+            if pending:
+                self._current_app = pending[0]
+                self._start(pending[0])
+        elif event.kind in (progress.SUCCESS, progress.ERROR) and event.item_type is not None:
+            self._end(event)
+        if self._progress_callback:
+            self._progress_callback(event)
+
+    def _end(self, event):
+        idx = None
+        if event.item_type == APP:
+            if self._current_app is not None and self._items[self._current_app][1] == event.item_id:
+                idx = self._current_app
+            self._current_app = None
+        if idx is None:
+            idx = self._match(event.item_type, event.item_id)
+        if idx is not None:
+            self._next = idx + 1
+            self._finish(idx, event.kind == progress.SUCCESS)
+
+    def _match(self, kind: str, item_id: int):
+        """
+        :return: Index of the next command of an item, or None when there is none
+        """
+        for idx in range(self._next, len(self._items)):
+            if self._items[idx][:2] == (kind, item_id):
+                return idx
+        return None
+
+    def _start(self, idx: int):
+        self._started[idx] = time.monotonic()
+        kind, item_id, app_id, install_dir = self._items[idx]
+        self._journal.record(self._batch, kind, item_id, app_id, STARTED, install_dir=install_dir)
+
+    def _finish(self, idx: int, success: bool):
+        started = self._started.get(idx)
+        duration = time.monotonic() - started if started is not None and success else None
+        kind, item_id, app_id, install_dir = self._items[idx]
+        self._journal.record(self._batch, kind, item_id, app_id, COMPLETED if success else FAILED,
+                             duration=duration, install_dir=install_dir,
+                             manifest_dir=install_dir or self._default_dir)
+
+
+class _Builds:
+    """
+    Looks up builds in the manifests of install dirs, reading every manifest once
+    """
+
+    def __init__(self):
+        self._manifests = {}
+
+    def get(self, install_dir: str, kind: str, item_id: int, app_id: int):
+        steamapps = os.path.join(install_dir, "steamapps")
+        if kind == APP:
+            path = os.path.join(steamapps, f"appmanifest_{app_id}.acf")
+        else:
+            path = os.path.join(steamapps, "workshop", f"appworkshop_{app_id}.acf")
+        if path not in self._manifests:
+            try:
+                self._manifests[path] = vdf.load(path)
+            except (OSError, SteamCMDException):
+                self._manifests[path] = {}
+        data = self._manifests[path]
+        try:
+            if kind == APP:
+                return int(data["AppState"]["buildid"])
+            return int(data["AppWorkshop"]["WorkshopItemsInstalled"][str(item_id)]["timeupdated"])
+        except (KeyError, TypeError, ValueError):
+            return None
@@ -0,0 +1,78 @@
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    Exclusive lock on a file, shared between processes on the same host.
+    Used as a context manager. The lock file itself is left in place.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.1, shared: bool = False):
+        """
+        :param path: Path of the lock file, created when missing
+        :param poll_interval: Seconds between attempts when the lock is held elsewhere
+        :param shared: Take a shared lock instead, held by any number of holders at once but never
+            together with an exclusive one. Windows only has exclusive locks.
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.shared = shared
+        self._fd = None
+
+    def acquire(self, timeout: float = None):
+        """
+        Waits for the lock.
+
+        :param timeout: Optional number of seconds to wait
+        :return: Whether the lock was acquired
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(fd, (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                self._fd = fd
+                return True
+            except OSError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(self.poll_interval)
+
+    def release(self):
+        """
+        Releases the lock
+        """
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
+
+    @property
+    def locked(self):
+        """
+        Whether this object holds the lock
+        """
+        return self._fd is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
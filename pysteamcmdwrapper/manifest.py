@@ -0,0 +1,186 @@
+import os
+import json
+from typing import NamedTuple
+from pysteamcmdwrapper import vdf
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+INDEX_VERSION = 1
+
+# StateFlags value of an app that is fully installed and up to date
+STATE_FULLY_INSTALLED = 4
+
+
+class AppManifest(NamedTuple):
+    """
+    Installed state of an app, from its appmanifest_<app_id>.acf
+    """
+    app_id: int
+    buildid: int
+    size_on_disk: int
+    last_updated: int
+    state_flags: int
+    installdir: str = ""
+
+
+class WorkshopManifest(NamedTuple):
+    """
+    Installed state of a workshop item, from appworkshop_<app_id>.acf
+    """
+    app_id: int
+    workshop_id: int
+    size: int
+    timeupdated: int
+    manifest: str
+
+
+class ManifestIndex:
+    """
+    Index of the app and workshop manifests steamcmd writes into an install dir.
+
+    Only the manifest files are looked at, never the installed content. Parsed manifests
+    are kept in an index file together with their size and mtime, so following refreshes
+    only parse the manifests that changed since the previous run.
+    """
+
+    def __init__(self, install_dir: str, index_path: str = None):
+        """
+        :param install_dir: Directory steamcmd installs into (the force_install_dir)
+        :param index_path: Optional path of the index file. Defaults to a file in install_dir/steamapps.
+        """
+        self.install_dir = install_dir
+        self.steamapps = os.path.join(install_dir, "steamapps")
+        self.index_path = index_path or os.path.join(self.steamapps, ".pysteamcmdwrapper-index.json")
+        self._files = self._load()
+        self._apps = {}
+        self._workshop = {}
+        self._rebuild()
+
+    def refresh(self):
+        """
+        Picks up manifests that were added, changed or removed since the index was last saved.
+
+        :return: Number of manifests that were parsed
+        """
+        found = {}
+        for directory, prefix in ((self.steamapps, "appmanifest_"),
+                                  (os.path.join(self.steamapps, "workshop"), "appworkshop_")):
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.startswith(prefix) and entry.name.endswith(".acf") and entry.is_file():
+                            found[os.path.relpath(entry.path, self.steamapps)] = entry.stat()
+            except FileNotFoundError:
+                continue
+
+        parsed = 0
+        files = {}
+        for name, stat in found.items():
+            cached = self._files.get(name)
+            if cached and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                files[name] = cached
+                continue
+            try:
+                data = vdf.load(os.path.join(self.steamapps, name))
+            except SteamCMDException:
+                # steamcmd may be writing it right now, pick it up on the next refresh
+                continue
+            files[name] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "data": data}
+            parsed += 1
+
+        if parsed or files.keys() != self._files.keys():
+            self._files = files
+            self._rebuild()
+            self._save()
+        return parsed
+
+    def apps(self):
+        """
+        :return: Dict of app_id to AppManifest
+        """
+        return dict(self._apps)
+
+    def workshop_items(self, app_id: int = None):
+        """
+        :param app_id: Optional app to limit the items to
+        :return: Dict of (app_id, workshop_id) to WorkshopManifest
+        """
+        return {key: item for key, item in self._workshop.items() if app_id is None or key[0] == int(app_id)}
+
+    def stale_apps(self, targets):
+        """
+        Compares installed apps against a target state.
+
+        :param targets: Dict of app_id to the wanted buildid, or None when any installed build will do
+        :return: List of app_ids which are missing, not fully installed or on another build
+        """
+        stale = []
+        for app_id, buildid in targets.items():
+            app = self._apps.get(int(app_id))
+            if app is None or app.state_flags != STATE_FULLY_INSTALLED or \
+                    (buildid is not None and app.buildid != int(buildid)):
+                stale.append(app_id)
+        return stale
+
+    def stale_workshop_items(self, app_id: int, targets):
+        """
+        Compares installed workshop items of an app against a target state.
+
+        :param app_id: The parent application ID
+        :param targets: Dict of workshop_id to the time it was last updated on the workshop,
+            or None when any installed version will do
+        :return: List of workshop_ids which are missing or older than their target
+        """
+        stale = []
+        for workshop_id, timeupdated in targets.items():
+            item = self._workshop.get((int(app_id), int(workshop_id)))
+            if item is None or (timeupdated is not None and item.timeupdated < int(timeupdated)):
+                stale.append(workshop_id)
+        return stale
+
+    def _rebuild(self):
+        """
+        Builds the manifest records from the parsed files
+        """
+        self._apps = {}
+        self._workshop = {}
+        for name, cached in self._files.items():
+            data = cached["data"]
+            if "AppState" in data:
+                state = data["AppState"]
+                app = AppManifest(
+                    int(state.get("appid", 0)),
+                    int(state.get("buildid", 0)),
+                    int(state.get("SizeOnDisk", 0)),
+                    int(state.get("LastUpdated", 0)),
+                    int(state.get("StateFlags", 0)),
+                    state.get("installdir", ""),
+                )
+                self._apps[app.app_id] = app
+            elif "AppWorkshop" in data:
+                workshop = data["AppWorkshop"]
+                app_id = int(workshop.get("appid", 0))
+                for workshop_id, item in workshop.get("WorkshopItemsInstalled", {}).items():
+                    self._workshop[(app_id, int(workshop_id))] = WorkshopManifest(
+                        app_id,
+                        int(workshop_id),
+                        int(item.get("size", 0)),
+                        int(item.get("timeupdated", 0)),
+                        item.get("manifest", ""),
+                    )
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != INDEX_VERSION:
+            return {}
+        return index.get("files", {})
+
+    def _save(self):
+        if not os.path.isdir(os.path.dirname(self.index_path)):
+            return
+        with open(self.index_path + ".tmp", "w") as f:
+            json.dump({"version": INDEX_VERSION, "files": self._files}, f)
+        os.replace(self.index_path + ".tmp", self.index_path)
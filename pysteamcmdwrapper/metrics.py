@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+from pysteamcmdwrapper.progress import PROGRESS, SUCCESS
+
+# Metrics reported for every steamcmd process started by execute()
+SPAWN_SECONDS = "steamcmd_spawn_seconds"
+LOGIN_SECONDS = "steamcmd_login_seconds"
+BOOTSTRAP_SECONDS = "steamcmd_bootstrap_seconds"
+WORK_SECONDS = "steamcmd_work_seconds"
+FIRST_BYTE_SECONDS = "steamcmd_first_byte_seconds"
+RUN_SECONDS = "steamcmd_run_seconds"
+DOWNLOADED_BYTES = "steamcmd_downloaded_bytes_total"
+RUNS = "steamcmd_runs_total"
+RETRIES = "steamcmd_retries_total"
+SELF_UPDATES = "steamcmd_self_updates_total"
+# Reported by WarmStandby for every refresh of its runtime
+PREWARM_SECONDS = "steamcmd_prewarm_seconds"
+
+_LOGIN_MARKERS = ("Waiting for user info...OK", "Logged in OK")
+# steamcmd checks for and applies its own updates before it prints this and runs any command
+_BOOTSTRAP_MARKER = "Loading Steam API"
+_UPDATE_MARKERS = ("Downloading update", "Applying update")
+
+
+class RunStats:
+    """
+    Timings of a single steamcmd process, measured from the moment it was started.
+    The run is split into the bootstrap phase, in which steamcmd starts and updates itself,
+    and the work done on our commands after it.
+    Metrics hooks are callables taking a metric name, a value and a dict of labels;
+    report() sends the collected timings to one.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.started = clock()
+        self.spawn_seconds = None
+        self.login_seconds = None
+        self.bootstrap_seconds = None
+        self.self_updated = False
+        self.first_byte_seconds = None
+        self.downloaded_bytes = 0
+
+    def spawned(self):
+        """
+        Marks the process as started
+        """
+        self.spawn_seconds = self._clock() - self.started
+
+    def observe(self, line: str, event=None):
+        """
+        :param line: Line of steamcmd output
+        :param event: Optional ProgressEvent parsed from the line
+        """
+        if self.bootstrap_seconds is None:
+            if _BOOTSTRAP_MARKER in line:
+                self.bootstrap_seconds = self._clock() - self.started
+            elif any(marker in line for marker in _UPDATE_MARKERS):
+                self.self_updated = True
+        if self.login_seconds is None and any(marker in line for marker in _LOGIN_MARKERS):
+            self.login_seconds = self._clock() - self.started
+        if event is None:
+            return
+        if self.first_byte_seconds is None and event.bytes_done and event.kind in (PROGRESS, SUCCESS):
+            self.first_byte_seconds = self._clock() - self.started
+        if event.kind == SUCCESS and event.bytes_done:
+            self.downloaded_bytes += event.bytes_done
+
+    def report(self, hook, returncode: int, labels=None):
+        """
+        Sends the collected timings to a metrics hook.
+
+        :param hook: Callable taking a metric name, a value and a dict of labels
+        :param returncode: Exit code of steamcmd
+        :param labels: Optional labels added to every metric
+        """
+        labels = dict(labels or {})
+        run_seconds = self._clock() - self.started
+        work_seconds = None if self.bootstrap_seconds is None else run_seconds - self.bootstrap_seconds
+        for name, value in ((SPAWN_SECONDS, self.spawn_seconds),
+                            (BOOTSTRAP_SECONDS, self.bootstrap_seconds),
+                            (LOGIN_SECONDS, self.login_seconds),
+                            (FIRST_BYTE_SECONDS, self.first_byte_seconds),
+                            (WORK_SECONDS, work_seconds),
+                            (RUN_SECONDS, run_seconds),
+                            (DOWNLOADED_BYTES, self.downloaded_bytes)):
+            if value is not None:
+                hook(name, value, labels)
+        if self.self_updated:
+            hook(SELF_UPDATES, 1, labels)
+        hook(RUNS, 1, dict(labels, exit_code=str(returncode)))
+
+
+class PrometheusTextExporter:
+    """
+    Metrics hook that aggregates metrics in memory and renders them in the Prometheus text format.
+    No server is needed: write() the output to a file for the node_exporter textfile collector,
+    or serve render() from an existing web application.
+
+    Metric names ending in _total are counters, all others are summaries with a _count and _sum.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+
+    def __call__(self, name: str, value: float, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            if name.endswith("_total"):
+                self._counters[key] = self._counters.get(key, 0) + value
+            else:
+                count, total = self._summaries.get(key, (0, 0))
+                self._summaries[key] = (count + 1, total + value)
+
+    def render(self):
+        """
+        :return: All metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (count, total) in summaries:
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Atomically writes the rendered metrics to a file
+
+        :param path: Path of the file, usually ending in .prom
+        """
+        with open(path + ".tmp", "w") as f:
+            f.write(self.render())
+        os.replace(path + ".tmp", path)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
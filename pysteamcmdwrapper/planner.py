@@ -0,0 +1,206 @@
+import threading
+from typing import NamedTuple, Optional, List
+from pysteamcmdwrapper.SteamCMD_command import SteamCMD_command
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+APP = "app"
+WORKSHOP = "workshop"
+
+# Sessions without credentials login with the account of the SteamCMD instance, which is only known when they
+# run, so the longest Steam account name and password are assumed
+_LONGEST_CREDENTIALS = ("x" * 64, "x" * 64)
+
+
+class Operation(NamedTuple):
+    """
+    A single pending app_update or workshop_download_item
+    """
+    kind: str
+    app_id: int
+    workshop_id: Optional[int] = None
+    install_dir: Optional[str] = None
+    validate: bool = False
+    beta: Optional[str] = None
+    betapassword: Optional[str] = None
+    credentials: Optional[tuple] = None
+
+
+class PlannedSession(NamedTuple):
+    """
+    A single steamcmd login running a batch of operations
+    """
+    credentials: Optional[tuple]
+    command: SteamCMD_command
+    operations: List[Operation]
+
+
+class PlanResult(NamedTuple):
+    """
+    Outcome of running a PlannedSession
+    """
+    session: PlannedSession
+    error: Optional[SteamCMDException] = None
+
+    @property
+    def success(self):
+        return self.error is None
+
+
+class BatchPlanner:
+    """
+    Queue of pending operations, collected from anywhere in an application, which are
+    coalesced into as few steamcmd sessions as possible.
+
+    Different betas of the same app in the same install dir would overwrite each other, so queueing
+    a second one raises a ValueError until the queue is planned.
+
+    Operations are grouped by credentials, so the number of logins grows with the number of
+    accounts rather than the number of items. Within a session they are ordered by install
+    dir and app, which keeps force_install_dir switches to a minimum. Safe to use from
+    multiple threads.
+    """
+
+    def __init__(self, max_items: int = 100, max_command_length: int = 30000):
+        """
+        :param max_items: Maximum number of app and workshop items per session
+        :param max_command_length: Maximum length of the arguments of a session, including the login and quit.
+            The default stays below the command line limit on Windows.
+        """
+        if max_items < 1:
+            raise ValueError("max_items should be at least 1")
+        self.max_items = max_items
+        self.max_command_length = max_command_length
+        self._lock = threading.Lock()
+        self._pending = []
+        self._betas = {}
+
+    def add_app_update(self, app_id: int, install_dir: str = None, validate: bool = False, beta: str = None,
+                       betapassword: str = None, credentials: tuple = None):
+        """
+        Queues an app update.
+
+        :param app_id: The Steam ID for the app you want to install
+        :param install_dir: Optional custom installation directory.
+        :param validate: Optional parameter for validation.
+        :param beta: Optional parameter for running a beta branch.
+        :param betapassword: Optional parameter for entering beta password.
+        :param credentials: Optional (username, password) tuple. Defaults to the credentials of the SteamCMD instance.
+        :raises ValueError: When another beta of the app is queued for the same install dir
+        """
+        self._add(Operation(APP, int(app_id), None, install_dir, bool(validate), beta, betapassword, credentials))
+
+    def add_workshop_item(self, app_id: int, workshop_id: int, install_dir: str = None, validate: bool = False,
+                          credentials: tuple = None):
+        """
+        Queues a workshop item download.
+
+        :param app_id: The parent application ID
+        :param workshop_id: The ID for workshop content. Can be found in the url.
+        :param install_dir: Optional custom installation directory.
+        :param validate: Optional parameter for validation.
+        :param credentials: Optional (username, password) tuple. Defaults to the credentials of the SteamCMD instance.
+        """
+        self._add(Operation(WORKSHOP, int(app_id), int(workshop_id), install_dir, bool(validate),
+                            credentials=credentials))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def plan(self):
+        """
+        Takes all pending operations from the queue and plans the sessions to run them in.
+        Duplicate operations are merged.
+
+        :return: List of PlannedSessions
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._betas = {}
+
+        groups = {}
+        for op in pending:
+            groups.setdefault(op.credentials, {})
+            key = op._replace(validate=False)
+            existing = groups[op.credentials].get(key)
+            # A duplicate that asks for validation wins
+            if existing is None or op.validate:
+                groups[op.credentials][key] = op
+
+        sessions = []
+        for credentials, ops in groups.items():
+            ordered = sorted(ops.values(), key=lambda op: (
+                op.install_dir or "", op.app_id, op.kind != APP, op.workshop_id or 0))
+            sessions.extend(self._chunk(credentials, ordered))
+        return sessions
+
+    def run(self, steamcmd, n_tries: int = 1, progress_callback=None):
+        """
+        Plans and runs all pending operations, one execute() per session.
+
+        :param steamcmd: SteamCMD instance to run the sessions with
+        :param n_tries: Number of times each session is tried
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :return: List of PlanResults
+        """
+        results = []
+        for session in self.plan():
+            try:
+                steamcmd.execute(session.command, n_tries, progress_callback, credentials=session.credentials)
+                results.append(PlanResult(session))
+            except SteamCMDException as e:
+                results.append(PlanResult(session, e))
+        return results
+
+    def _add(self, op: Operation):
+        with self._lock:
+            if op.kind == APP:
+                branch = (op.beta or None, op.betapassword or None)
+                queued = self._betas.setdefault((op.app_id, op.install_dir), branch)
+                if queued != branch:
+                    raise ValueError(f"App {op.app_id} is already queued for {op.install_dir or 'its default dir'} "
+                                     f"with beta {queued[0]!r}, not {branch[0]!r}")
+            self._pending.append(op)
+
+    def _chunk(self, credentials, ops):
+        """
+        Splits ordered operations of one account into sessions within the item and length limits
+        """
+        sessions = []
+        command = batch = current_dir = None
+        length = 0
+        login = len(f"+login {' '.join(credentials or _LONGEST_CREDENTIALS)} +quit") + 1
+        for op in ops:
+            rendered = _render(op)
+            switch = op.install_dir is not None and op.install_dir != current_dir
+            needed = len(rendered) + 1 + (len(_render_force_install_dir(op.install_dir)) + 1 if switch else 0)
+            if command is None or len(batch) >= self.max_items or length + needed > self.max_command_length:
+                command, batch, length, current_dir = SteamCMD_command(), [], login, None
+                sessions.append(PlannedSession(credentials, command, batch))
+
+            if op.install_dir is not None and op.install_dir != current_dir:
+                command.force_install_dir(op.install_dir)
+                length += len(_render_force_install_dir(op.install_dir)) + 1
+                current_dir = op.install_dir
+            if op.kind == APP:
+                command.app_update(op.app_id, op.validate, op.beta, op.betapassword)
+            else:
+                command.workshop_download_item(op.app_id, op.workshop_id, op.validate)
+            length += len(rendered) + 1
+            batch.append(op)
+        return sessions
+
+
+def _render_force_install_dir(install_dir):
+    sc = SteamCMD_command()
+    sc.force_install_dir(install_dir)
+    return sc.get_cmd()
+
+
+def _render(op: Operation):
+    sc = SteamCMD_command()
+    if op.kind == APP:
+        sc.app_update(op.app_id, op.validate, op.beta, op.betapassword)
+    else:
+        sc.workshop_download_item(op.app_id, op.workshop_id, op.validate)
+    return sc.get_cmd()
@@ -0,0 +1,238 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from typing import NamedTuple
+from pysteamcmdwrapper.lock import FileLock
+from pysteamcmdwrapper.SteamCMD import SteamCMD
+from pysteamcmdwrapper.metrics import RunStats, PREWARM_SECONDS
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshResult(NamedTuple):
+    """
+    Outcome of refreshing the runtime of a WarmStandby
+    """
+    runtime: str
+    updated: bool
+    seconds: float
+
+
+class WarmStandby:
+    """
+    Keeps a steamcmd runtime that has already updated itself, so the steamcmd processes running
+    our commands skip the self-update and start working right away.
+
+    refresh() copies the current runtime, lets the copy update itself and, when it did, swaps the
+    current symlink over to it with a single rename. Processes running from the previous runtime
+    are left alone: the instances made by steamcmd() hold a shared lock on their runtime while
+    execute() runs, and a runtime is only removed once keep newer ones exist and nothing holds
+    its lock. The current runtime is never changed in place, so it is copied without waiting for
+    those processes. start() refreshes in the background every interval seconds; the
+    steamcmd_self_updates_total metric of the processes running commands shows whether that is
+    often enough. Uses a directory symlink, so this needs a POSIX system.
+
+    Layout of the root directory::
+
+        current             symlink to the runtime in use
+        runtimes/<id>/      steamcmd installations, oldest first
+        locks/<id>          locks on the runtimes
+    """
+
+    def __init__(self, root: str, interval: float = 3600, keep: int = 2, seed: str = None, cache=None,
+                 metrics=None):
+        """
+        :param root: Directory to keep the runtimes in, created when missing
+        :param interval: Seconds between background refreshes
+        :param keep: Number of runtimes kept, including the current one
+        :param seed: Optional path of an existing steamcmd installation the first runtime is copied from,
+            instead of installing a new one
+        :param cache: Optional BootstrapCache the first runtime is installed from
+        :param metrics: Optional metrics hook, called with the duration of every refresh
+        """
+        if keep < 1:
+            raise ValueError(f"keep should be at least 1, got {keep}")
+        self.root = root
+        self.interval = interval
+        self.keep = keep
+        self.seed = seed
+        self.cache = cache
+        self.metrics = metrics
+        self.last_error = None
+        self._runtimes = os.path.join(root, "runtimes")
+        self._locks = os.path.join(root, "locks")
+        os.makedirs(self._runtimes, exist_ok=True)
+        os.makedirs(self._locks, exist_ok=True)
+        self._lock = FileLock(os.path.join(root, "lock"))
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    @property
+    def path(self):
+        """
+        Path of the current runtime, through the symlink
+        """
+        return os.path.join(self.root, "current")
+
+    def current(self):
+        """
+        :return: Name of the current runtime, or None when there is none yet
+        """
+        if not os.path.islink(self.path):
+            return None
+        return os.path.basename(os.readlink(self.path))
+
+    def steamcmd(self, **kwargs):
+        """
+        Creates a SteamCMD instance running the current runtime. The runtime is resolved now,
+        so a swap never changes the files under a running process; create a new instance per
+        job to pick up newer runtimes. An instance whose runtime was removed before its next
+        execute() moves on to the current runtime.
+
+        :param kwargs: Keyword arguments of SteamCMD
+        :return: SteamCMD instance
+        """
+        runtime = self.current()
+        if runtime is None:
+            raise SteamCMDException(message=f"No steamcmd runtime in {self.root} yet, call refresh() first")
+        return _RuntimeSteamCMD(self, runtime, **kwargs)
+
+    def refresh(self):
+        """
+        Lets a copy of the current runtime update itself and swaps it in when it did.
+        The first refresh creates the first runtime from the seed, the cache or a fresh install.
+
+        :return: RefreshResult
+        """
+        with self._lock:
+            staging = tempfile.mkdtemp(prefix=".staging-", dir=self._runtimes)
+            start = time.monotonic()
+            try:
+                current = self.current()
+                if current is None and self.seed is None:
+                    SteamCMD(staging).install(cache=self.cache)
+                    updated = True
+                else:
+                    os.rmdir(staging)
+                    # Copied rather than hardlinked, the self-update writes to files in place
+                    source = self.seed if current is None else os.path.join(self._runtimes, current)
+                    shutil.copytree(source, staging, symlinks=True)
+                    updated = SteamCMD(staging)._self_update(RunStats()) or current is None
+                seconds = time.monotonic() - start
+                if updated:
+                    # Named by creation time so they sort oldest first, the staging suffix keeps them unique
+                    runtime = f"{int(time.time() * 1000):013d}-{os.path.basename(staging)[len('.staging-'):]}"
+                    os.rename(staging, os.path.join(self._runtimes, runtime))
+                    self._swap(runtime)
+                    logger.info("Swapped in steamcmd runtime %s after %.1f seconds", runtime, seconds)
+                else:
+                    shutil.rmtree(staging)
+                    runtime = current
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            self._prune()
+        if self.metrics is not None:
+            self.metrics(PREWARM_SECONDS, seconds, {"updated": str(updated).lower()})
+        return RefreshResult(runtime, updated, seconds)
+
+    def start(self):
+        """
+        Starts refreshing in a background thread, beginning with a refresh right away
+        """
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name="steamcmd-prewarm", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread, waiting for a running refresh to finish
+        """
+        if self._thread is None:
+            return
+        self._stopped = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    def _loop(self):
+        while not self._stopped:
+            self._wake.clear()
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+                logger.exception("Refreshing the steamcmd runtime in %s failed", self.root)
+            self._wake.wait(self.interval)
+
+    def _swap(self, runtime: str):
+        """
+        Points the current symlink at a runtime. Renaming over the old symlink is atomic,
+        so the current path always leads to a complete runtime.
+        """
+        link = os.path.join(self.root, f".current-{os.getpid()}")
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.join("runtimes", runtime), link)
+        os.replace(link, self.path)
+
+    def _runtime_lock(self, runtime: str):
+        """
+        :return: Path of the lock file of a runtime
+        """
+        return os.path.join(self._locks, runtime)
+
+    def _prune(self):
+        """
+        Removes the runtimes beyond the newest keep ones that are not in use and leftovers of failed refreshes.
+        Must be called with the lock held.
+        """
+        current = self.current()
+        runtimes = sorted(name for name in os.listdir(self._runtimes) if not name.startswith("."))
+        for name in runtimes[:-self.keep]:
+            if name == current:
+                continue
+            lock = FileLock(self._runtime_lock(name))
+            if not lock.acquire(timeout=0):
+                logger.info("Keeping steamcmd runtime %s, it is still in use", name)
+                continue
+            try:
+                shutil.rmtree(os.path.join(self._runtimes, name), ignore_errors=True)
+                os.remove(lock.path)
+            finally:
+                lock.release()
+        for name in os.listdir(self._runtimes):
+            if name.startswith(".staging-"):
+                shutil.rmtree(os.path.join(self._runtimes, name), ignore_errors=True)
+
+
+class _RuntimeSteamCMD(SteamCMD):
+    """
+    SteamCMD running a runtime of a WarmStandby, holding a shared lock on it while execute() runs
+    """
+
+    def __init__(self, standby: WarmStandby, runtime: str, **kwargs):
+        self._standby = standby
+        self._runtime = runtime
+        super().__init__(os.path.join(standby._runtimes, runtime), **kwargs)
+
+    def execute(self, *args, **kwargs):
+        while True:
+            with FileLock(self._standby._runtime_lock(self._runtime), shared=True):
+                if os.path.isfile(self.exe):
+                    return super().execute(*args, **kwargs)
+            runtime = self._standby.current()
+            if runtime is None or runtime == self._runtime:
+                raise SteamCMDException(message=f"Steamcmd runtime {self._runtime} in {self._standby.root} is gone")
+            logger.info("Steamcmd runtime %s was removed, moving on to %s", self._runtime, runtime)
+            self._runtime = runtime
+            self._installation_path = os.path.join(self._standby._runtimes, runtime)
+            self._prepare_installation()
@@ -0,0 +1,140 @@
+import re
+import time
+from typing import NamedTuple, Optional
+
+PROGRESS = "progress"
+STARTED = "started"
+SUCCESS = "success"
+ERROR = "error"
+
+APP = "app"
+WORKSHOP = "workshop"
+
+_UPDATE_STATE = re.compile(
+    r"Update state \(0x([0-9a-fA-F]+)\) ([^,]+), progress: ([\d.]+) \((\d+) / (\d+)\)")
+_ITEM_STARTED = re.compile(r"Downloading item (\d+)")
+_ITEM_SUCCESS = re.compile(r'Success\. Downloaded item (\d+) to "(.*)" \((\d+) bytes\)')
+_ITEM_ERROR = re.compile(r"ERROR! Download item (\d+) failed \((.*)\)")
+_APP_SUCCESS = re.compile(r"Success! App '(\d+)' (.*)\.")
+_APP_ERROR = re.compile(r"(?:Error|ERROR)! (?:App '(\d+)' (.*)|Failed to install app '(\d+)' \((.*)\))")
+
+
+class ProgressEvent(NamedTuple):
+    """
+    A parsed line of steamcmd output.
+
+    kind is one of PROGRESS, STARTED, SUCCESS or ERROR. phase holds the update state
+    for progress events ('downloading', 'verifying install', ...), or the reason
+    for errors. rate is in bytes per second, when it can be determined.
+    item_type tells whether item_id is an APP or a WORKSHOP item.
+    """
+    kind: str
+    phase: Optional[str] = None
+    item_id: Optional[int] = None
+    bytes_done: Optional[int] = None
+    bytes_total: Optional[int] = None
+    rate: Optional[float] = None
+    line: str = ""
+    item_type: Optional[str] = None
+
+
+class ProgressParser:
+    """
+    Turns steamcmd output lines into ProgressEvents.
+    Keeps track of the item being downloaded, so download rates can be determined
+    from consecutive progress lines and from the time an item took in total.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        """
+        :param clock: Function returning the current time in seconds
+        """
+        self._clock = clock
+        self._item_id = None
+        self._item_started = {}
+        self._last_progress = None
+        self._first_progress = None
+
+    def feed(self, line: str):
+        """
+        Parses a single line of output.
+
+        :param line: Line of steamcmd output
+        :return: ProgressEvent, or None when the line holds no progress information
+        """
+        line = line.strip()
+        now = self._clock()
+
+        match = _UPDATE_STATE.search(line)
+        if match:
+            done, total = int(match.group(4)), int(match.group(5))
+            rate = None
+            if self._last_progress is not None:
+                last_done, last_time = self._last_progress
+                if now > last_time and done >= last_done:
+                    rate = (done - last_done) / (now - last_time)
+            else:
+                self._first_progress = (done, now)
+            self._last_progress = (done, now)
+            item_type = WORKSHOP if self._item_id is not None else None
+            return ProgressEvent(PROGRESS, match.group(2).strip(), self._item_id, done, total, rate, line, item_type)
+
+        match = _ITEM_SUCCESS.search(line)
+        if match:
+            item_id, size = int(match.group(1)), int(match.group(3))
+            started = self._item_started.pop(item_id, None)
+            rate = size / (now - started) if started is not None and now > started else None
+            self._reset()
+            return ProgressEvent(SUCCESS, None, item_id, size, size, rate, line, WORKSHOP)
+
+        match = _ITEM_STARTED.search(line)
+        if match:
+            self._reset()
+            self._item_id = int(match.group(1))
+            self._item_started[self._item_id] = now
+            return ProgressEvent(STARTED, None, self._item_id, line=line, item_type=WORKSHOP)
+
+        match = _ITEM_ERROR.search(line)
+        if match:
+            item_id = int(match.group(1))
+            self._item_started.pop(item_id, None)
+            self._reset()
+            return ProgressEvent(ERROR, match.group(2), item_id, line=line, item_type=WORKSHOP)
+
+        match = _APP_SUCCESS.search(line)
+        if match:
+            size = rate = None
+            if self._last_progress is not None:
+                size = self._last_progress[0]
+                first_done, first_time = self._first_progress
+                if now > first_time:
+                    rate = (size - first_done) / (now - first_time)
+            self._reset()
+            return ProgressEvent(SUCCESS, match.group(2), int(match.group(1)), size, size, rate, line, APP)
+
+        match = _APP_ERROR.search(line)
+        if match:
+            self._reset()
+            app_id = match.group(1) or match.group(3)
+            return ProgressEvent(ERROR, match.group(2) or match.group(4), int(app_id), line=line, item_type=APP)
+
+        return None
+
+    def _reset(self):
+        self._item_id = None
+        self._last_progress = None
+        self._first_progress = None
+
+
+def parse_progress(lines):
+    """
+    Generator turning steamcmd output lines into ProgressEvents, skipping lines without progress information.
+
+    :param lines: Iterable of output lines
+    :return: Generator of ProgressEvents
+    """
+    parser = ProgressParser()
+    for line in lines:
+        event = parser.feed(line)
+        if event is not None:
+            yield event
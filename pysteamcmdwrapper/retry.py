@@ -0,0 +1,177 @@
+import random
+from typing import NamedTuple
+from pysteamcmdwrapper.progress import STARTED, SUCCESS, ERROR
+
+RETRYABLE = "retryable"
+FATAL = "fatal"
+
+
+class Failure(NamedTuple):
+    """
+    Classification of a failed steamcmd run
+    """
+    kind: str
+    reason: str
+
+    @property
+    def retryable(self):
+        return self.kind == RETRYABLE
+
+
+RATE_LIMIT = Failure(RETRYABLE, "rate limit exceeded")
+NO_CONNECTION = Failure(RETRYABLE, "no connection")
+TIMEOUT = Failure(RETRYABLE, "download timeout")
+ASSERT = Failure(RETRYABLE, "steamcmd assert")
+INVALID_PASSWORD = Failure(FATAL, "invalid password")
+STEAM_GUARD = Failure(FATAL, "steam guard code required")
+NO_SUBSCRIPTION = Failure(FATAL, "no subscription")
+DISK_FULL = Failure(FATAL, "disk full")
+# Set by a Watchdog that killed steamcmd
+HUNG = Failure(RETRYABLE, "wall clock timeout")
+STALLED = Failure(RETRYABLE, "stalled")
+# Set by a Watchdog that killed steamcmd because its abort event was set
+ABORTED = Failure(FATAL, "aborted")
+# steamcmd exits with 7 when it quit to finish updating itself instead of running the commands
+SELF_UPDATED = Failure(RETRYABLE, "steamcmd updated itself")
+
+# Failures caused by the account rather than the command, another account may succeed
+ACCOUNT_FAILURES = (INVALID_PASSWORD, STEAM_GUARD)
+
+# Output lines that tell more than the exit code does, checked in order
+_LINE_PATTERNS = (
+    ("Invalid Password", INVALID_PASSWORD),
+    ("Two-factor code mismatch", STEAM_GUARD),
+    ("Steam Guard", STEAM_GUARD),
+    ("Account Logon Denied", STEAM_GUARD),
+    ("No subscription", NO_SUBSCRIPTION),
+    ("Disk write failure", DISK_FULL),
+    ("Not enough disk space", DISK_FULL),
+    ("Rate Limit Exceeded", RATE_LIMIT),
+    ("No Connection", NO_CONNECTION),
+    ("(Timeout)", TIMEOUT),
+)
+
+# SteamCMD has a habit of timing out large downloads (10), and sometimes crashes when timing out
+# downloads due to an assert checking that the download actually finished (134). After updating
+# itself it may quit with 7 before running the commands, which a second run does.
+_EXIT_CODES = {
+    7: SELF_UPDATED,
+    10: TIMEOUT,
+    134: ASSERT,
+}
+
+
+def match_line(line: str):
+    """
+    Checks a line of steamcmd output for known failures.
+
+    :param line: Line of output
+    :return: Failure, or None when the line is not a known failure
+    """
+    for pattern, failure in _LINE_PATTERNS:
+        if pattern in line:
+            return failure
+    return None
+
+
+def classify(returncode: int, failures=()):
+    """
+    Classifies a failed steamcmd run. Fatal failures found in the output win over
+    everything else, followed by other failures in the output and finally the exit code.
+
+    :param returncode: Exit code of steamcmd
+    :param failures: Failures matched in the output with match_line
+    :return: Failure
+    """
+    failures = list(failures)
+    for failure in failures:
+        if not failure.retryable:
+            return failure
+    if failures:
+        return failures[0]
+    return _EXIT_CODES.get(returncode, Failure(FATAL, f"exit code {returncode}"))
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter between tries of a steamcmd command.
+    The jitter spreads retries of many hosts failing at the same moment.
+    """
+
+    def __init__(self, base_delay: float = 2.0, max_delay: float = 120.0, multiplier: float = 2.0,
+                 jitter: float = 0.5, rate_limit_delay: float = 60.0):
+        """
+        :param base_delay: Seconds to wait before the first retry
+        :param max_delay: Maximum number of seconds to wait before any retry
+        :param multiplier: Factor the delay grows with after every retry
+        :param jitter: Fraction of the delay that is randomised, between 0 and 1
+        :param rate_limit_delay: Minimum number of seconds to wait after being rate limited
+        """
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter should be between 0 and 1")
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.rate_limit_delay = rate_limit_delay
+
+    def delay(self, attempt: int, failure: Failure = None):
+        """
+        :param attempt: Number of the try that failed, starting at 0
+        :param failure: Optional classification of the failure
+        :return: Number of seconds to wait before the next try
+        """
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** attempt)
+        if failure == RATE_LIMIT:
+            delay = max(delay, self.rate_limit_delay)
+        return delay * (1 - self.jitter * random.random())
+
+
+class AttemptOutcome:
+    """
+    Collects what happened during a single steamcmd run:
+    the items that completed and the failures recognised in the output.
+
+    Given the command that ran, completed items are keyed by ('app' or 'workshop', item_id, install_dir).
+    steamcmd runs the commands in order, so every item event is matched to the first command of that
+    item after the previous match, which tells apart the same item updated into different install dirs.
+    Items that match no command are keyed by (kind, item_id) alone.
+    """
+
+    def __init__(self, cmd=None):
+        """
+        :param cmd: Optional SteamCMD_command the run executes
+        """
+        self.completed = set()
+        self.failures = []
+        self._items = cmd.get_items() if cmd is not None else []
+        self._next = 0
+
+    def observe(self, line: str, event=None):
+        """
+        :param line: Line of steamcmd output
+        :param event: Optional ProgressEvent parsed from the line
+        """
+        failure = match_line(line)
+        if failure is not None:
+            self.failures.append(failure)
+        if event is None or not event.item_type or event.kind not in (STARTED, SUCCESS, ERROR):
+            return
+        idx = self._match(event.item_type, event.item_id)
+        if idx is not None:
+            # A started item may still complete, finished ones are passed
+            self._next = idx if event.kind == STARTED else idx + 1
+        if event.kind == SUCCESS:
+            if idx is None:
+                self.completed.add((event.item_type, event.item_id))
+            else:
+                self.completed.add((event.item_type, event.item_id, self._items[idx][3]))
+
+    def _match(self, kind: str, item_id: int):
+        """
+        :return: Index of the next command of an item, or None when there is none
+        """
+        for idx in range(self._next, len(self._items)):
+            if self._items[idx][:2] == (kind, item_id):
+                return idx
+        return None
@@ -0,0 +1,304 @@
+import os
+import time
+import queue
+import shutil
+import threading
+from typing import NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from pysteamcmdwrapper.SteamCMD_command import SteamCMD_command
+from pysteamcmdwrapper.progress import STARTED, SUCCESS, APP, WORKSHOP
+from pysteamcmdwrapper.manifest import ManifestIndex
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+SMALLEST_FIRST = "smallest"
+LARGEST_FIRST = "largest"
+
+
+class WorkshopResult(NamedTuple):
+    """
+    Outcome of downloading a single workshop item, or of updating an app when workshop_id is None
+    """
+    app_id: int
+    workshop_id: Optional[int]
+    success: bool
+    duration: float
+    worker: str
+    error: Optional[str] = None
+    deferred: bool = False
+
+
+class WorkshopScheduler:
+    """
+    Downloads many workshop items in parallel.
+    Items are packed into SteamCMD_command chunks, which run on a bounded pool of workers.
+    Every worker is a separate SteamCMD installation, so concurrent steamcmd processes
+    never fight over the same locks. Items with None as workshop_id are app updates.
+
+    Item sizes are taken from the sizes given and from the app and workshop manifests in the install
+    dirs, and recorded again after every chunk. They are used to order the items and, with preflight,
+    to check the install dir has enough free space before a chunk starts. A chunk that fits on none
+    of the workers waits for running chunks to give their space back, and is deferred instead of
+    failing halfway with a full disk when it doesn't fit once nothing else runs.
+    """
+
+    def __init__(self, workers, install_dirs=None, concurrency: int = None, chunk_size: int = 50,
+                 n_tries: int = 3, validate: bool = False, order: str = None, sizes=None,
+                 default_size: int = 0, preflight: bool = False, reserve: int = 0, credentials=None,
+                 timeout: float = None, stall_timeout: float = None):
+        """
+        :param workers: List of SteamCMD instances, each with its own installation path
+        :param install_dirs: Optional list with a force_install_dir per worker
+        :param concurrency: Number of workers running at the same time. Defaults to all workers.
+        :param chunk_size: Maximum number of workshop items per steamcmd process
+        :param n_tries: Number of times a chunk is tried on timeouts, per worker
+        :param validate: Validate every downloaded item
+        :param order: Optional SMALLEST_FIRST or LARGEST_FIRST to order items by size. Defaults to the given order.
+        :param sizes: Optional dict of (app_id, workshop_id) to the size in bytes of items not installed yet,
+            with None as workshop_id for apps
+        :param default_size: Size in bytes assumed for items of unknown size
+        :param preflight: Check free space in the install dir before starting a chunk
+        :param reserve: Number of bytes to keep free on top of the size of a chunk
+        :param credentials: Optional (username, password) tuple or CredentialPool passed on to execute()
+        :param timeout: Optional number of seconds after which a try of a chunk is killed
+        :param stall_timeout: Optional number of seconds without progress after which a try of a chunk is killed
+        """
+        if not workers:
+            raise ValueError("At least one worker is required")
+        if install_dirs is not None and len(install_dirs) != len(workers):
+            raise ValueError("install_dirs needs an entry for every worker")
+        if concurrency is None:
+            concurrency = len(workers)
+        if not 0 < concurrency <= len(workers):
+            raise ValueError(f"concurrency should be between 1 and the number of workers ({len(workers)})")
+        if chunk_size < 1:
+            raise ValueError("chunk_size should be at least 1")
+        if order not in (None, SMALLEST_FIRST, LARGEST_FIRST):
+            raise ValueError(f"order should be None, '{SMALLEST_FIRST}' or '{LARGEST_FIRST}'")
+
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.n_tries = n_tries
+        self.validate = validate
+        self.order = order
+        self.default_size = default_size
+        self.preflight = preflight
+        self.reserve = reserve
+        self.credentials = credentials
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.sizes = {}
+        self._workers = len(workers)
+        self._lock = threading.Condition()
+        self._reserved = {}
+        # Counts the reservations given back, so waiting chunks know when to try again
+        self._released = 0
+        self._idle = queue.Queue()
+        for idx, worker in enumerate(workers):
+            install_dir = install_dirs[idx] if install_dirs else None
+            self._idle.put((worker, install_dir))
+            self._record_sizes(worker, install_dir)
+        for (app_id, workshop_id), size in (sizes or {}).items():
+            self.sizes[_key(app_id, workshop_id)] = size
+
+    def size(self, app_id: int, workshop_id: int = None):
+        """
+        :return: Known or assumed size of an item in bytes
+        """
+        return self.sizes.get(_key(app_id, workshop_id), self.default_size)
+
+    def chunks(self, items):
+        """
+        Packs items into chunks of at most chunk_size items, ordered by size when an order is set
+
+        :param items: Iterable of (app_id, workshop_id) tuples, workshop_id being None for apps
+        :return: List of chunks
+        """
+        items = list(items)
+        if self.order is not None:
+            items.sort(key=lambda item: self.size(*item), reverse=self.order == LARGEST_FIRST)
+        return [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+
+    def run(self, items, journal=None, batch: str = None):
+        """
+        Downloads all items, yielding a WorkshopResult per item as soon as it finished.
+        Items that failed are yielded when their chunk gave up on them.
+
+        With a JobJournal and a batch name, the progress of every item is recorded and items that
+        completed in an earlier run of the same batch are not downloaded again. Those are
+        yielded first, as successful results without a worker.
+
+        :param items: Iterable of (app_id, workshop_id) tuples, workshop_id being None for app updates
+        :param journal: Optional JobJournal to record the items in
+        :param batch: Name of the batch in the journal, required with a journal
+        :return: Generator of WorkshopResults
+        """
+        if journal is not None:
+            if batch is None:
+                raise ValueError("A batch name is required to run with a journal")
+            # Items are placed in install dirs by the scheduler, so completed in any of them counts
+            completed = {key[:2] for key in journal.completed(batch)}
+            remaining = []
+            for app_id, workshop_id in items:
+                if _kind_id(app_id, workshop_id) in completed:
+                    yield WorkshopResult(app_id, workshop_id, True, 0.0, None)
+                else:
+                    remaining.append((app_id, workshop_id))
+            items = remaining
+        # Chunks put their results on the queue as the items finish, followed by None when done
+        results = queue.Queue()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._run_chunk, chunk, results.put, journal, batch)
+                       for chunk in self.chunks(items)]
+            running = len(futures)
+            while running:
+                result = results.get()
+                if result is None:
+                    running -= 1
+                else:
+                    yield result
+            for future in futures:
+                future.result()
+
+    def _run_chunk(self, chunk, emit, journal=None, batch: str = None):
+        """
+        Runs a chunk on the first idle worker with enough free space. When there is none, the chunk waits
+        for a running chunk to give its space back, and is deferred once no space is reserved anymore.
+
+        :param chunk: List of (app_id, workshop_id) tuples
+        :param emit: Callable receiving the WorkshopResult of every item, and None once the chunk is done
+        :param journal: Optional JobJournal to record the items in
+        :param batch: Name of the batch in the journal
+        """
+        try:
+            needed = sum(self.size(app_id, workshop_id) for app_id, workshop_id in chunk) + self.reserve
+            while True:
+                with self._lock:
+                    released = self._released
+                error = None
+                # Idle workers go to the back of the queue, so every worker is tried once
+                for _ in range(self._workers):
+                    worker, install_dir = self._idle.get()
+                    target = install_dir or worker._installation_path
+                    device = self._claim(target, needed) if self.preflight else None
+                    if self.preflight and device is None:
+                        error = f"Not enough free space in {target} for {needed} bytes"
+                        self._idle.put((worker, install_dir))
+                        continue
+                    try:
+                        self._download(chunk, worker, install_dir, emit, journal, batch)
+                        return
+                    finally:
+                        if device is not None:
+                            with self._lock:
+                                self._reserved[device] -= needed
+                                self._released += 1
+                                self._lock.notify_all()
+                        self._record_sizes(worker, install_dir)
+                        self._idle.put((worker, install_dir))
+                with self._lock:
+                    # Space given back since the workers were tried is worth another try
+                    while self._released == released and any(self._reserved.values()):
+                        self._lock.wait()
+                    if self._released == released:
+                        break
+            for app_id, workshop_id in chunk:
+                emit(WorkshopResult(app_id, workshop_id, False, 0.0, None, error, deferred=True))
+        finally:
+            emit(None)
+
+    def _download(self, chunk, worker, install_dir, emit, journal=None, batch: str = None):
+        """
+        Downloads a chunk on a worker, emitting the result of every item as it completes.
+        Durations run from the start of the last try of an item until it completed or the chunk failed.
+        """
+        sc = SteamCMD_command()
+        if install_dir:
+            sc.force_install_dir(install_dir)
+        for app_id, workshop_id in chunk:
+            if workshop_id is None:
+                sc.app_update(app_id, self.validate)
+            else:
+                sc.workshop_download_item(app_id, workshop_id, self.validate)
+
+        start = time.monotonic()
+        started = {}
+        pending = {_kind_id(app_id, workshop_id): (app_id, workshop_id) for app_id, workshop_id in chunk}
+
+        def on_progress(event):
+            key = (event.item_type, event.item_id)
+            if key not in pending:
+                return
+            if event.kind == STARTED:
+                started[key] = time.monotonic()
+            elif event.kind == SUCCESS:
+                app_id, workshop_id = pending.pop(key)
+                duration = time.monotonic() - started.get(key, start)
+                emit(WorkshopResult(app_id, workshop_id, True, duration, worker._installation_path))
+
+        error = None
+        try:
+            if journal is not None:
+                journal.execute(worker, sc, batch, self.n_tries, on_progress, credentials=self.credentials,
+                                timeout=self.timeout, stall_timeout=self.stall_timeout)
+            else:
+                worker.execute(sc, self.n_tries, on_progress, credentials=self.credentials, timeout=self.timeout,
+                               stall_timeout=self.stall_timeout)
+        except SteamCMDException as e:
+            error = e.message
+        # Without an error steamcmd completed everything, also items whose success line was not recognized
+        now = time.monotonic()
+        for key, (app_id, workshop_id) in pending.items():
+            emit(WorkshopResult(app_id, workshop_id, error is None, now - started.get(key, start),
+                                worker._installation_path, error))
+
+    def _claim(self, path: str, needed: int):
+        """
+        Reserves space on the filesystem of path for a chunk, so chunks running at the same time
+        are not all counted against the same free space.
+
+        :return: Device the space was reserved on, or None when it does not fit
+        """
+        path = _existing_parent(path)
+        device = os.stat(path).st_dev
+        free = shutil.disk_usage(path).free
+        with self._lock:
+            reserved = self._reserved.get(device, 0)
+            if free - reserved < needed:
+                return None
+            self._reserved[device] = reserved + needed
+        return device
+
+    def _record_sizes(self, worker, install_dir):
+        """
+        Records the sizes of the items installed in the install dir of a worker
+        """
+        index = ManifestIndex(install_dir or worker._installation_path)
+        index.refresh()
+        sizes = {key: item.size for key, item in index.workshop_items().items()}
+        sizes.update({(app_id, None): app.size_on_disk for app_id, app in index.apps().items()})
+        with self._lock:
+            self.sizes.update(sizes)
+
+
+def _key(app_id, workshop_id):
+    """
+    :return: Key of an item in the sizes
+    """
+    return int(app_id), None if workshop_id is None else int(workshop_id)
+
+
+def _kind_id(app_id, workshop_id):
+    """
+    :return: (kind, item_id) of an item, as used by ProgressEvents and the journal
+    """
+    return (APP, int(app_id)) if workshop_id is None else (WORKSHOP, int(workshop_id))
+
+
+def _existing_parent(path: str):
+    """
+    :return: path, or its closest parent that exists
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
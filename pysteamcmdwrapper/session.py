@@ -0,0 +1,229 @@
+import re
+import time
+import queue
+import threading
+import subprocess
+from pysteamcmdwrapper.SteamCMD_command import SteamCMD_command
+from pysteamcmdwrapper.exceptions import SteamCMDException, SteamCMDDownloadException
+
+PROMPT = "Steam>"
+
+# steamcmd colours its prompt when attached to a terminal-like stdout
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+_ERROR_MARKERS = ("ERROR!", "Error!", "FAILED")
+
+
+class SteamCMDSession:
+    """
+    A single long-lived steamcmd process running in interactive mode.
+    The process logs in once when started, after which SteamCMD_command batches
+    are fed to it over stdin. This avoids paying the bootstrap, self-update check
+    and login for every batch.
+    """
+
+    def __init__(self, steamcmd, credentials: tuple = None, timeout: float = 3600):
+        """
+        :param steamcmd: SteamCMD instance providing the executable
+        :param credentials: Optional (username, password) tuple to login with, defaults to anonymous
+        :param timeout: Seconds to wait for the prompt after a command before the process is killed,
+            None to wait forever
+        """
+        self._steamcmd = steamcmd
+        self.credentials = credentials or ("anonymous", "")
+        self.timeout = timeout
+        self._process = None
+        self._chunks = None
+
+    @property
+    def alive(self):
+        """
+        Whether the steamcmd process is running
+        """
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """
+        Starts steamcmd in interactive mode and logs in.
+        Any previous process of this session is closed first.
+
+        :return: Output of the login command
+        """
+        self.close()
+        self._process = subprocess.Popen(
+            (self._steamcmd.exe,),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+        )
+        # Read in a thread, so waiting for the prompt can give up at a deadline
+        self._chunks = queue.Queue()
+        threading.Thread(target=_read_chunks, args=(self._process.stdout, self._chunks),
+                         name="steamcmd-session", daemon=True).start()
+        self._read_until_prompt()
+        login = " ".join(filter(None, ("login",) + tuple(self.credentials)))
+        output = self.send(login)
+        if "FAILED" in output:
+            self.close()
+            raise SteamCMDException(message=f"SteamCMD session was unable to login: {output.strip()}")
+        return output
+
+    def send(self, line: str, timeout: float = None):
+        """
+        Sends a single line to steamcmd and waits for the prompt to return.
+
+        :param line: Interactive command, without the leading '+'
+        :param timeout: Optional seconds to wait for the prompt instead of the timeout of the session
+        :return: Output of the command
+        """
+        if not self.alive:
+            raise SteamCMDException(message="SteamCMD session is not running")
+        try:
+            self._process.stdin.write(line.encode() + b"\n")
+            self._process.stdin.flush()
+        except OSError as e:
+            raise SteamCMDException(message=f"SteamCMD session closed its input: {e}")
+        return self._read_until_prompt(timeout)
+
+    def run(self, cmd: SteamCMD_command):
+        """
+        Runs every command of a SteamCMD_command in this session.
+
+        :param cmd: Sequence of commands to execute
+        :return: List with the output of each command
+        """
+        outputs = []
+        for command in cmd.get_commands():
+            line = command[1:] if command.startswith("+") else command
+            output = self.send(line)
+            outputs.append(output)
+            for out_line in output.splitlines():
+                if out_line.strip().startswith(_ERROR_MARKERS):
+                    raise SteamCMDDownloadException(message=f"Command '{line}' failed: {out_line.strip()}")
+        return outputs
+
+    def close(self, timeout: float = 10):
+        """
+        Asks steamcmd to quit, killing it if it does not exit within timeout seconds.
+        """
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        if process.poll() is None:
+            try:
+                process.stdin.write(b"quit\n")
+                process.stdin.flush()
+            except OSError:
+                pass
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        process.stdin.close()
+        process.stdout.close()
+
+    def _read_until_prompt(self, timeout: float = None):
+        """
+        Reads output until steamcmd shows its prompt. A process that doesn't show it in time is killed.
+
+        :param timeout: Optional seconds to wait instead of the timeout of the session
+        :return: Output read, excluding the prompt
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        raw = b""
+        while True:
+            try:
+                data = self._chunks.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                self._process.kill()
+                self._process.wait()
+                raise SteamCMDException(message=f"SteamCMD session showed no prompt within {timeout} seconds")
+            if not data:
+                self._process.wait()
+                raise SteamCMDException(message=
+                    f"SteamCMD session exited unexpectedly with exit code {self._process.returncode}")
+            raw += data
+            tail = _ANSI_ESCAPE.sub("", raw[-256:].decode("utf-8", errors="replace"))
+            if tail.rstrip().endswith(PROMPT):
+                break
+        output = _ANSI_ESCAPE.sub("", raw.decode("utf-8", errors="replace")).rstrip()
+        return output[:-len(PROMPT)]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_chunks(stdout, chunks):
+    """
+    Moves the output of a session into a queue, ending with an empty chunk once the process closed it
+    """
+    try:
+        for data in iter(lambda: stdout.read(4096), b""):
+            chunks.put(data)
+    except (OSError, ValueError):
+        # The session closed its end of the pipe
+        pass
+    chunks.put(b"")
+
+
+class SteamCMDSessionPool:
+    """
+    Pool of logged in SteamCMDSessions. Commands are run on the first idle session,
+    and sessions whose steamcmd process has died are restarted before being reused.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, steamcmd, size: int = 1, credentials: tuple = None, timeout: float = 3600):
+        """
+        :param steamcmd: SteamCMD instance providing the executable
+        :param size: Number of steamcmd processes to keep open
+        :param credentials: Optional (username, password) tuple the sessions login with, defaults to anonymous
+        :param timeout: Seconds a session waits for the prompt after a command, see SteamCMDSession
+        """
+        if size < 1:
+            raise ValueError("A session pool needs at least one session")
+        self._sessions = [SteamCMDSession(steamcmd, credentials, timeout) for _ in range(size)]
+        self._idle = queue.LifoQueue()
+        for session in self._sessions:
+            self._idle.put(session)
+
+    def execute(self, cmd: SteamCMD_command):
+        """
+        Executes a SteamCMD_command on an idle session, starting it when needed.
+        Blocks until a session is available.
+
+        :param cmd: Sequence of commands to execute
+        :return: List with the output of each command
+        """
+        session = self._idle.get()
+        try:
+            if not session.alive:
+                session.start()
+            return session.run(cmd)
+        except SteamCMDDownloadException:
+            # The command failed, but the session itself is still usable
+            raise
+        except SteamCMDException:
+            session.close()
+            raise
+        finally:
+            self._idle.put(session)
+
+    def close(self):
+        """
+        Closes all sessions in the pool
+        """
+        for session in self._sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
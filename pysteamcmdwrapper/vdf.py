@@ -0,0 +1,121 @@
+import os
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+_ESCAPES = {"n": "\n", "t": "\t", "\\": "\\", '"': '"'}
+_QUOTES = {value: "\\" + key for key, value in _ESCAPES.items()}
+
+
+def _tokens(text: str):
+    """
+    Yields the tokens of a KeyValues document: strings, '{' and '}'
+    """
+    i, length = 0, len(text)
+    while i < length:
+        char = text[i]
+        if char.isspace():
+            i += 1
+        elif char in "{}":
+            yield char
+            i += 1
+        elif text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = length if newline == -1 else newline + 1
+        elif char == '"':
+            i += 1
+            chunks = []
+            start = i
+            while i < length and text[i] != '"':
+                if text[i] == "\\" and i + 1 < length:
+                    chunks.append(text[start:i])
+                    chunks.append(_ESCAPES.get(text[i + 1], text[i + 1]))
+                    i += 2
+                    start = i
+                else:
+                    i += 1
+            if i >= length:
+                raise SteamCMDException(message="Unterminated string in VDF document")
+            chunks.append(text[start:i])
+            yield "".join(chunks)
+            i += 1
+        else:
+            start = i
+            while i < length and not text[i].isspace() and text[i] not in '{}"':
+                i += 1
+            yield text[start:i]
+
+
+def loads(text: str):
+    """
+    Parses a document in Valve's KeyValues text format (VDF), as used by the .acf manifests steamcmd writes.
+
+    :param text: Document contents
+    :return: Nested dicts with string keys and values
+    """
+    root = {}
+    stack = [root]
+    key = None
+    for token in _tokens(text):
+        if token == "{":
+            if key is None:
+                raise SteamCMDException(message="Unexpected '{' in VDF document")
+            child = {}
+            stack[-1][key] = child
+            stack.append(child)
+            key = None
+        elif token == "}":
+            if key is not None or len(stack) == 1:
+                raise SteamCMDException(message="Unexpected '}' in VDF document")
+            stack.pop()
+        elif key is None:
+            key = token
+        else:
+            stack[-1][key] = token
+            key = None
+    if key is not None or len(stack) != 1:
+        raise SteamCMDException(message="Unexpected end of VDF document")
+    return root
+
+
+def load(path: str):
+    """
+    Parses a KeyValues file.
+
+    :param path: Path of the file
+    :return: Nested dicts with string keys and values
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return loads(f.read())
+
+
+def _quote(value: str):
+    return '"' + "".join(_QUOTES.get(char, char) for char in value) + '"'
+
+
+def dumps(data: dict, depth: int = 0):
+    """
+    Writes nested dicts in the KeyValues text format, laid out like the manifests steamcmd writes.
+
+    :param data: Nested dicts with string keys and values, as returned by loads()
+    :param depth: Indentation of the outer keys
+    :return: Document contents
+    """
+    indent = "\t" * depth
+    lines = []
+    for key, value in data.items():
+        if isinstance(value, dict):
+            lines.append(f"{indent}{_quote(key)}\n{indent}{{\n{dumps(value, depth + 1)}{indent}}}\n")
+        else:
+            lines.append(f"{indent}{_quote(key)}\t\t{_quote(str(value))}\n")
+    return "".join(lines)
+
+
+def dump(data: dict, path: str):
+    """
+    Atomically writes a KeyValues file.
+
+    :param data: Nested dicts with string keys and values
+    :param path: Path of the file
+    """
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(dumps(data))
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,231 @@
+import os
+import json
+import mmap
+import hashlib
+from typing import NamedTuple, List
+from concurrent.futures import ProcessPoolExecutor
+from pysteamcmdwrapper.manifest import ManifestIndex
+from pysteamcmdwrapper.SteamCMD_command import SteamCMD_command
+
+INDEX_VERSION = 1
+
+
+class VerifyResult(NamedTuple):
+    """
+    Outcome of verifying the files of a single app against its recorded baseline.
+    Paths are relative to the content dir of the app.
+    """
+    app_id: int
+    baseline: bool
+    changed: List[str]
+    missing: List[str]
+    hashed: int
+    skipped: int
+
+    @property
+    def ok(self):
+        return self.baseline and not self.changed and not self.missing
+
+
+class InstallVerifier:
+    """
+    Checks installed apps locally, so steamcmd's validate only has to run for apps that differ.
+
+    record() hashes the files of a known good install into an index of (size, mtime, hash) per file.
+    verify() only hashes files whose size or mtime changed since, in parallel over a process pool,
+    and reports files which no longer match. repair() validates just the apps that failed.
+    """
+
+    def __init__(self, install_dir: str, index_path: str = None, processes: int = None):
+        """
+        :param install_dir: Directory steamcmd installs into (the force_install_dir)
+        :param index_path: Optional path of the index file. Defaults to a file in install_dir/steamapps.
+        :param processes: Number of processes hashing files. Defaults to the number of CPUs.
+        """
+        self.install_dir = install_dir
+        self.index_path = index_path or os.path.join(install_dir, "steamapps", ".pysteamcmdwrapper-verify.json")
+        self.processes = processes
+        self._apps = self._load()
+
+    def record(self, app_ids):
+        """
+        Records the current files of apps as their known good state.
+
+        :param app_ids: Iterable of app ids
+        :return: Dict of app_id to the number of files recorded
+        """
+        content_dirs = self._content_dirs(app_ids)
+        scans = {app_id: _scan(path) for app_id, path in content_dirs.items()}
+        to_hash = []
+        for app_id, files in scans.items():
+            known = self._apps.get(str(app_id), {})
+            to_hash += [os.path.join(content_dirs[app_id], name) for name, (size, mtime) in files.items()
+                        if known.get(name, [None, None])[:2] != [size, mtime]]
+        hashes = self._hash(to_hash)
+
+        recorded = {}
+        for app_id, files in scans.items():
+            known = self._apps.get(str(app_id), {})
+            entries = {}
+            for name, (size, mtime) in files.items():
+                digest = hashes.get(os.path.join(content_dirs[app_id], name))
+                if digest is not None:
+                    entries[name] = [size, mtime, digest]
+                elif name in known and known[name][:2] == [size, mtime]:
+                    entries[name] = known[name]
+            self._apps[str(app_id)] = entries
+            recorded[app_id] = len(entries)
+        self._save()
+        return recorded
+
+    def verify(self, app_ids):
+        """
+        Compares the files of apps against their recorded state.
+        Files with the recorded size and mtime are assumed unchanged and not hashed again.
+        Files that were added since the recording are ignored, like steamcmd does.
+
+        :param app_ids: Iterable of app ids
+        :return: Dict of app_id to VerifyResult
+        """
+        app_ids = [int(app_id) for app_id in app_ids]
+        content_dirs = self._content_dirs(app_ids)
+        scans = {}
+        to_hash = []
+        for app_id, path in content_dirs.items():
+            files = _scan(path)
+            scans[app_id] = files
+            for name, entry in self._apps.get(str(app_id), {}).items():
+                if name in files and list(files[name]) != entry[:2]:
+                    to_hash.append(os.path.join(path, name))
+        hashes = self._hash(to_hash)
+
+        results = {}
+        for app_id in app_ids:
+            known = self._apps.get(str(app_id))
+            if app_id not in content_dirs or known is None:
+                results[app_id] = VerifyResult(app_id, False, [], [], 0, 0)
+                continue
+            files = scans[app_id]
+            changed, missing = [], []
+            hashed = skipped = 0
+            for name, entry in sorted(known.items()):
+                if name not in files:
+                    missing.append(name)
+                    continue
+                digest = hashes.get(os.path.join(content_dirs[app_id], name))
+                if digest is None:
+                    skipped += 1
+                    continue
+                hashed += 1
+                if digest == entry[2]:
+                    # Touched but identical, no need to hash it next time
+                    entry[:2] = files[name]
+                else:
+                    changed.append(name)
+            results[app_id] = VerifyResult(app_id, True, changed, missing, hashed, skipped)
+        self._save()
+        return results
+
+    def repair(self, steamcmd, app_ids, n_tries: int = 1, progress_callback=None):
+        """
+        Verifies apps and runs app_update with validate for the ones that differ,
+        recording their state again afterwards. Apps without a recorded state are validated too.
+
+        :param steamcmd: SteamCMD instance to run the validation with
+        :param app_ids: Iterable of app ids
+        :param n_tries: Number of times the validation is tried
+        :param progress_callback: Optional callable receiving a ProgressEvent for every progress line.
+        :return: List of VerifyResults of the apps that were validated
+        """
+        failed = [result for result in self.verify(app_ids).values() if not result.ok]
+        if not failed:
+            return []
+        sc = SteamCMD_command()
+        sc.force_install_dir(self.install_dir)
+        for result in failed:
+            sc.app_update(result.app_id, validate=True)
+        steamcmd.execute(sc, n_tries, progress_callback)
+        self.record(result.app_id for result in failed)
+        return failed
+
+    def _content_dirs(self, app_ids):
+        """
+        :return: Dict of app_id to the content dir of installed apps
+        """
+        index = ManifestIndex(self.install_dir)
+        index.refresh()
+        apps = index.apps()
+        content_dirs = {}
+        for app_id in app_ids:
+            app = apps.get(int(app_id))
+            if app is not None and app.installdir:
+                content_dirs[int(app_id)] = os.path.join(self.install_dir, "steamapps", "common", app.installdir)
+        return content_dirs
+
+    def _hash(self, paths):
+        """
+        :return: Dict of path to its hash, leaving out files that disappeared
+        """
+        if len(paths) < 2 or self.processes == 1:
+            digests = map(hash_file, paths)
+        else:
+            with ProcessPoolExecutor(self.processes) as executor:
+                digests = list(executor.map(hash_file, paths, chunksize=max(1, len(paths) // 64)))
+        return {path: digest for path, digest in zip(paths, digests) if digest is not None}
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != INDEX_VERSION:
+            return {}
+        return index.get("apps", {})
+
+    def _save(self):
+        if not os.path.isdir(os.path.dirname(self.index_path)):
+            return
+        with open(self.index_path + ".tmp", "w") as f:
+            json.dump({"version": INDEX_VERSION, "apps": self._apps}, f)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+
+def hash_file(path: str):
+    """
+    Hashes a file through a memory map, so it is not copied into the process.
+
+    :param path: Path of the file
+    :return: Hex sha256 of the file, or None when it does not exist
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    digest.update(mapped)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def _scan(path: str):
+    """
+    :return: Dict of the relative paths of all files under path to their (size, mtime_ns)
+    """
+    files = {}
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat()
+                        name = os.path.relpath(entry.path, path).replace(os.sep, "/")
+                        files[name] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            continue
+    return files
@@ -0,0 +1,167 @@
+import os
+import time
+import signal
+import logging
+import threading
+from pysteamcmdwrapper.retry import HUNG, STALLED, ABORTED
+
+logger = logging.getLogger(__name__)
+
+# Where steamcmd downloads into before moving the files in place, relative to the install dir
+STAGING_DIRS = (
+    os.path.join("steamapps", "downloading"),
+    os.path.join("steamapps", "workshop", "downloads"),
+    os.path.join("steamapps", "workshop", "temp"),
+)
+
+
+class Watchdog:
+    """
+    Kills a steamcmd process that runs longer than timeout, or that stalls: shows no activity for
+    stall_timeout seconds. Activity is a line of output or a change in the files steamcmd downloads
+    into, as workshop downloads print nothing until they are done.
+
+    The process is killed along with its process group, with SIGTERM and after grace seconds with
+    SIGKILL. failure then holds HUNG or STALLED, which execute() retries like other timeouts.
+    Setting the abort event kills the process as well, with ABORTED as failure, which is not retried.
+    A watchdog watches a single process. While a ThroughputGovernor has the process paused it
+    cannot show activity, so the stall clock is suspended from pause() until resume().
+    """
+
+    def __init__(self, timeout: float = None, stall_timeout: float = None, install_dirs=(),
+                 interval: float = None, grace: float = 5.0, clock=time.monotonic, abort=None):
+        """
+        :param timeout: Optional number of seconds the process may run
+        :param stall_timeout: Optional number of seconds the process may go without activity
+        :param install_dirs: Install dirs whose staging dirs count as activity when their files change
+        :param interval: Number of seconds between checks, defaults to a quarter of the shortest timeout up to a second
+        :param grace: Number of seconds between SIGTERM and SIGKILL
+        :param clock: Function returning the current time in seconds
+        :param abort: Optional threading.Event, the process is killed once it is set
+        """
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.staging_dirs = [os.path.join(d, staging) for d in install_dirs for staging in STAGING_DIRS]
+        if interval is None:
+            interval = min([1.0] + [t / 4 for t in (timeout, stall_timeout) if t is not None])
+        self.interval = interval
+        self.grace = grace
+        self.abort = abort
+        self.failure = None
+        self._clock = clock
+        self._pid = None
+        self._group = False
+        self._started = self._active = None
+        self._staged = None
+        self._paused = False
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, pid: int, group: bool = True):
+        """
+        Starts watching a process
+
+        :param pid: Process id of steamcmd
+        :param group: Whether the process leads its own process group, which is killed along with it
+        """
+        self._pid = pid
+        self._group = group
+        self._started = self._active = self._clock()
+        self._staged = self._staged_files()
+        self._thread = threading.Thread(target=self._watch, name="steamcmd-watchdog", daemon=True)
+        self._thread.start()
+
+    def activity(self):
+        """
+        Records activity of the process, like a line of output
+        """
+        self._active = self._clock()
+
+    def pause(self):
+        """
+        Suspends the stall clock, while the process is paused on purpose
+        """
+        self._paused = True
+
+    def resume(self):
+        """
+        Restarts the stall clock once the process runs again
+        """
+        self._active = self._clock()
+        self._paused = False
+
+    def check(self):
+        """
+        Called every interval by the watching thread.
+
+        :return: ABORTED when aborted, HUNG or STALLED when a timeout expired, otherwise None
+        """
+        if self.abort is not None and self.abort.is_set():
+            return ABORTED
+        now = self._clock()
+        if self.timeout is not None and now - self._started >= self.timeout:
+            return HUNG
+        if self.stall_timeout is not None and not self._paused:
+            staged = self._staged_files()
+            if staged != self._staged:
+                self._staged = staged
+                self._active = now
+            if now - self._active >= self.stall_timeout:
+                return STALLED
+        return None
+
+    def stop(self):
+        """
+        Stops watching, call once the output of the process ended
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            failure = self.check()
+            if failure is not None:
+                self.failure = failure
+                logger.warning("Killing steamcmd process %d, %s after %.1f seconds",
+                               self._pid, failure.reason, self._clock() - self._started)
+                self._kill()
+                return
+
+    def _kill(self):
+        self._signal(signal.SIGTERM)
+        if not self._stopped.wait(self.grace):
+            # Windows has no SIGKILL, but SIGTERM already terminates the process there
+            self._signal(getattr(signal, "SIGKILL", signal.SIGTERM))
+
+    def _signal(self, signum):
+        try:
+            if self._group and hasattr(os, "killpg"):
+                os.killpg(self._pid, signum)
+            else:
+                os.kill(self._pid, signum)
+        except OSError:
+            # Already exited
+            pass
+
+    def _staged_files(self):
+        """
+        :return: Number of files and total size of the files in the staging dirs
+        """
+        files = size = 0
+        stack = list(self.staging_dirs)
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        files += 1
+                        size += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+        return files, size
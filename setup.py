@@ -21,4 +21,13 @@ setuptools.setup(
     ],
     python_requires='>=3.6',
     install_requires=['requests'],
+    extras_require={
+        'yaml': ['pyyaml'],
+        'toml': ['toml; python_version < "3.11"'],
+    },
+    entry_points={
+        'console_scripts': [
+            'pysteamcmd=pysteamcmdwrapper.cli:main',
+        ],
+    },
 )
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Import time benchmark of the wrapper, measured with python -X importtime in fresh interpreters.
+
+Reports the median cumulative import time of pysteamcmdwrapper, of pysteamcmdwrapper.SteamCMD when a SteamCMD is
+created, and the slowest modules imported along the way.
+
+    python tests/benchmarks/bench_import.py [--runs N] [--json] [--budget MICROSECONDS]
+
+With --budget the exit code is 1 when importing the package takes longer, so CI catches imports that creep back
+into the start up path.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Name, code run in the fresh interpreter and the module whose import time is reported
+SCENARIOS = [
+    ("import", "import pysteamcmdwrapper", "pysteamcmdwrapper"),
+    ("construct", "import sys, pysteamcmdwrapper; pysteamcmdwrapper.SteamCMD(sys.argv[1])",
+     "pysteamcmdwrapper.SteamCMD"),
+]
+
+
+def import_times(code):
+    """
+    Runs code in a fresh interpreter with -X importtime
+
+    :return: Dict of module name to its cumulative import time in microseconds
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    workdir = tempfile.gettempdir()
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", code, workdir], env=env, cwd=workdir,
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def bench(name, code, module, runs, top=5):
+    """
+    :return: Dict with the median import time of module and of the slowest other modules it pulled in
+    """
+    startup = set(import_times("pass"))
+    samples = [import_times(code) for _ in range(runs)]
+    modules = set().union(*samples) - startup
+    medians = {m: median([s.get(m, 0) for s in samples]) for m in modules}
+    slowest = sorted((m for m in medians if not m.startswith("pysteamcmdwrapper")), key=medians.get,
+                     reverse=True)[:top]
+    return {
+        "scenario": name,
+        "runs": runs,
+        "module": module,
+        "import_us": medians.get(module, 0),
+        "modules": len(modules),
+        "slowest": [[m, medians[m]] for m in slowest],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=15, help="number of interpreters per scenario")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    parser.add_argument("--budget", type=int, help="fail when importing the package takes more microseconds")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name, code, module in SCENARIOS:
+        result = bench(name, code, module, args.runs)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print("{scenario:<10} {module:<28} {import_us:>7} us  {modules:>4} modules  slowest: ".format(**result)
+                  + ", ".join(f"{m} {us} us" for m, us in result["slowest"]))
+        if name == "import" and args.budget is not None and result["import_us"] > args.budget:
+            print(f"importing pysteamcmdwrapper took {result['import_us']} us, "
+                  f"exceeding the budget of {args.budget} us", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
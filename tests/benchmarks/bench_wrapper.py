@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks of the wrapper, running against the fake steamcmd in tests/fake_steamcmd.py.
+
+Times building large commands, execute, workshop_update, the workshop scheduler and install end to end at different
+batch sizes and concurrency levels, and reports ops/sec, p50/p99 latency and peak RSS.
+
+    python tests/benchmarks/bench_wrapper.py [--quick] [--json] [--max-p99 SECONDS]
+
+The fake steamcmd is tuned with the same environment variables as in the tests, see
+fake_steamcmd.py. --login-delay, --rate, --timeout-rate and --assert-rate set them for a run.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fake_steamcmd import install_fake, make_archive, ArchiveServer  # noqa: E402
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, WorkshopScheduler, RetryPolicy  # noqa: E402
+
+APP_ID = 107410
+# Generous, so runs with --timeout-rate or --assert-rate measure the retries instead of failing
+N_TRIES = 50
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of values
+    """
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def peak_rss_kib():
+    """
+    :return: Peak resident set size of this process and of its children, in KiB
+    """
+    if resource is None:
+        return None, None
+    factor = 1024 if sys.platform == "darwin" else 1  # macOS reports bytes
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // factor,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // factor)
+
+
+def measure(name, runs, ops_per_run, fn):
+    """
+    Runs fn repeatedly and summarises its latency
+
+    :param name: Name of the scenario
+    :param runs: Number of times to run fn
+    :param ops_per_run: Number of operations (items) one call of fn handles
+    :param fn: Callable taking the run number
+    :return: Dict with the results
+    """
+    latencies = []
+    start = time.perf_counter()
+    for i in range(runs):
+        t = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+    rss_self, rss_children = peak_rss_kib()
+    return {
+        "scenario": name,
+        "runs": runs,
+        "ops_per_sec": runs * ops_per_run / total,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "peak_rss_kib": rss_self,
+        "peak_child_rss_kib": rss_children,
+    }
+
+
+def fake_steamcmd(root):
+    """
+    :return: SteamCMD instance running the fake steamcmd from root
+    """
+    os.makedirs(root, exist_ok=True)
+    install_fake(root)
+    return SteamCMD(root, RetryPolicy(base_delay=0), passthrough=False)
+
+
+def bench_execute(workdir, runs, batch_sizes):
+    steam = fake_steamcmd(workdir)
+    results = []
+    for batch in batch_sizes:
+        def run(i):
+            sc = SteamCMD_command()
+            sc.force_install_dir(os.path.join(workdir, "content"))
+            for item in range(batch):
+                sc.workshop_download_item(APP_ID, i * batch + item)
+            steam.execute(sc, n_tries=N_TRIES)
+        results.append(measure(f"execute batch={batch}", runs, batch, run))
+    return results
+
+
+def bench_build(runs, items):
+    def run(i):
+        sc = SteamCMD_command()
+        sc.force_install_dir("content")
+        for item in range(items):
+            sc.workshop_download_item(APP_ID, item)
+        sc.get_argv()
+        sc.without({("workshop", 0)}).get_argv()
+    return [measure(f"build command items={items}", runs, items, run)]
+
+
+def bench_workshop_update(workdir, runs):
+    steam = fake_steamcmd(workdir)
+    return [measure("workshop_update", runs, 1,
+                    lambda i: steam.workshop_update(APP_ID, i, os.path.join(workdir, "content")))]
+
+
+def bench_scheduler(workdir, items, concurrencies, chunk_size):
+    results = []
+    for concurrency in concurrencies:
+        workers = [fake_steamcmd(os.path.join(workdir, f"c{concurrency}-worker{n}")) for n in range(concurrency)]
+        scheduler = WorkshopScheduler(workers, chunk_size=chunk_size, n_tries=N_TRIES)
+
+        def run(_):
+            for result in scheduler.run([(APP_ID, i) for i in range(items)]):
+                if not result.success:
+                    raise RuntimeError(f"Item {result.workshop_id} failed: {result.error}")
+        results.append(measure(f"scheduler concurrency={concurrency} chunk={chunk_size}", 1, items, run))
+    return results
+
+
+def bench_install(workdir, runs):
+    with ArchiveServer(make_archive()) as server:
+        def run(i):
+            root = os.path.join(workdir, f"install{i}")
+            os.makedirs(root)
+            steam = SteamCMD(root, passthrough=False)
+            steam.steamcmd_url = server.url
+            steam.install()
+        return [measure("install", runs, 1, run)]
+
+
+def set_fake_env(args):
+    for name, value in (("LOGIN_DELAY", args.login_delay), ("RATE", args.rate),
+                        ("TIMEOUT_RATE", args.timeout_rate), ("ASSERT_RATE", args.assert_rate),
+                        ("ITEM_SIZE", args.item_size)):
+        if value is not None:
+            os.environ["FAKE_STEAMCMD_" + name] = str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="fewer runs, for CI")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    parser.add_argument("--max-p99", type=float, help="fail when any scenario's p99 latency exceeds this")
+    parser.add_argument("--login-delay", type=float)
+    parser.add_argument("--rate", type=float, help="fake download rate in bytes per second")
+    parser.add_argument("--item-size", type=int, help="fake item size in bytes")
+    parser.add_argument("--timeout-rate", type=float, help="chance per item of exit code 10")
+    parser.add_argument("--assert-rate", type=float, help="chance per item of exit code 134")
+    args = parser.parse_args(argv)
+    set_fake_env(args)
+    logging.disable(logging.WARNING)
+
+    runs = 3 if args.quick else 20
+    items = 20 if args.quick else 200
+    workdir = tempfile.mkdtemp(prefix="pysteamcmd-bench-")
+    try:
+        results = []
+        results += bench_build(runs, 10000)
+        results += bench_execute(os.path.join(workdir, "execute"), runs, (1, 10, 100))
+        results += bench_workshop_update(os.path.join(workdir, "workshop"), runs)
+        results += bench_scheduler(workdir, items, (1, 2, 4), chunk_size=10)
+        results += bench_install(workdir, runs)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    failed = False
+    for result in results:
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print("{scenario:<36} {ops_per_sec:>10.1f} ops/s  p50 {p50:>8.3f}s  p99 {p99:>8.3f}s  "
+                  "rss {peak_rss_kib} KiB (children {peak_child_rss_kib} KiB)".format(**result))
+        if args.max_p99 is not None and result["p99"] > args.max_p99:
+            print(f"{result['scenario']}: p99 {result['p99']:.3f}s exceeds budget of {args.max_p99}s",
+                  file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
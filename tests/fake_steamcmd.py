@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the steamcmd executable, used to test and benchmark the wrapper without network access.
+
+Understands enough of the steamcmd command set to emulate logins, app updates and
+workshop downloads, both from the command line (+command) and in interactive mode.
+Its behaviour is configured through environment variables:
+
+    FAKE_STEAMCMD_STARTUP_DELAY     seconds spent bootstrapping before running commands
+    FAKE_STEAMCMD_VERSION           version steamcmd updates itself to when the installed one differs (default 1)
+    FAKE_STEAMCMD_UPDATE_DELAY      seconds a self-update takes
+    FAKE_STEAMCMD_LOGIN_DELAY       seconds a login takes
+    FAKE_STEAMCMD_ITEM_SIZE         bytes per app or workshop item (default 1000)
+    FAKE_STEAMCMD_RATE              download rate in bytes per second, 0 for instant downloads
+    FAKE_STEAMCMD_TIMEOUT_RATE      chance per item of a download timeout (exit code 10)
+    FAKE_STEAMCMD_ASSERT_RATE       chance per item of an assert crash (exit code 134)
+    FAKE_STEAMCMD_FAIL_ITEMS        comma separated workshop ids that time out on their first download
+    FAKE_STEAMCMD_HANG_ITEMS        comma separated workshop ids that hang without output on their first download
+    FAKE_STEAMCMD_EXIT              exit code used on +quit
+    FAKE_STEAMCMD_BUILDID           buildid written to app manifests
+    FAKE_STEAMCMD_TIMEUPDATED       timeupdated written to workshop manifests
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shlex
+import tarfile
+import threading
+import http.server
+
+PROMPT = "Steam>"
+
+
+def install_fake(path):
+    """
+    Writes a steamcmd.sh into path which runs this script instead of steamcmd.
+
+    :param path: Installation path used for the SteamCMD wrapper
+    :return: Path to the fake executable
+    """
+    exe = os.path.join(path, "steamcmd.sh")
+    with open(exe, "w") as f:
+        f.write('#!/bin/sh\nexec "{}" "{}" --home "$(dirname "$0")" "$@"\n'.format(
+            sys.executable, os.path.abspath(__file__)))
+    os.chmod(exe, 0o755)
+    return exe
+
+
+def make_archive():
+    """
+    Builds a steamcmd_linux.tar.gz lookalike holding the fake steamcmd.sh
+
+    :return: Archive contents
+    """
+    script = '#!/bin/sh\nexec "{}" "{}" --home "$(dirname "$0")" "$@"\n'.format(
+        sys.executable, os.path.abspath(__file__)).encode()
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        info = tarfile.TarInfo("steamcmd.sh")
+        info.size = len(script)
+        info.mode = 0o755
+        tar.addfile(info, io.BytesIO(script))
+    return buf.getvalue()
+
+
+class ArchiveServer:
+    """
+    Local HTTP server handing out an archive, with support for Range requests.
+    Used as context manager, url holds the address to download from.
+    """
+
+    def __init__(self, data, fail_after=None):
+        """
+        :param data: Bytes to serve
+        :param fail_after: Optional number of bytes after which the first response is cut off
+        """
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.ranges.append(self.headers.get("Range"))
+                start = 0
+                if self.headers.get("Range"):
+                    start = int(self.headers["Range"].split("=")[1].split("-")[0])
+                    self.send_response(206)
+                    self.send_header("Content-Range", "bytes {}-{}/{}".format(start, len(data) - 1, len(data)))
+                else:
+                    self.send_response(200)
+                body = data[start:]
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if server.fail_after is not None:
+                    body, server.fail_after = body[:server.fail_after], None
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.ranges = []
+        self.fail_after = fail_after
+        self._httpd = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}/steamcmd_linux.tar.gz".format(self._httpd.server_port)
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class FakeSteamCMD:
+    """
+    Emulated steamcmd state for a single process
+    """
+
+    def __init__(self, home):
+        self.home = home
+        self.install_dir = home
+        self.logged_in = False
+        self.exit_code = None
+        self.fail_items = set(filter(None, os.environ.get("FAKE_STEAMCMD_FAIL_ITEMS", "").split(",")))
+        self.hang_items = set(filter(None, os.environ.get("FAKE_STEAMCMD_HANG_ITEMS", "").split(",")))
+        self.login_delay = float(os.environ.get("FAKE_STEAMCMD_LOGIN_DELAY", "0"))
+        self.item_size = int(os.environ.get("FAKE_STEAMCMD_ITEM_SIZE", "1000"))
+        self.rate = float(os.environ.get("FAKE_STEAMCMD_RATE", "0"))
+        self.timeout_rate = float(os.environ.get("FAKE_STEAMCMD_TIMEOUT_RATE", "0"))
+        self.assert_rate = float(os.environ.get("FAKE_STEAMCMD_ASSERT_RATE", "0"))
+
+    def out(self, *lines):
+        for line in lines:
+            sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    def run(self, name, args):
+        """
+        Runs a single command.
+
+        :return: False when steamcmd should exit
+        """
+        handler = getattr(self, "cmd_" + name.lower(), None)
+        if handler is None:
+            self.out('Command not found: {}'.format(name))
+            return True
+        return handler(*args) is not False
+
+    def cmd_login(self, uname="", passw="", *_):
+        self.out("Logging in user '{}' to Steam Public...".format(uname))
+        if uname == "badpass":
+            self.out("FAILED (Invalid Password)")
+            self.exit_code = 5
+            return False
+        time.sleep(self.login_delay)
+        self.logged_in = True
+        self.out("OK", "Waiting for user info...OK")
+
+    def cmd_force_install_dir(self, path, *_):
+        self.install_dir = path
+
+    def download(self):
+        """
+        Emulates downloading an item, printing progress lines
+
+        :return: False when the download crashed or timed out
+        """
+        roll = random.random()
+        failed = None
+        if roll < self.timeout_rate:
+            failed = 10
+        elif roll < self.timeout_rate + self.assert_rate:
+            failed = 134
+        total = self.item_size
+        for step in (1, 2, 3, 4):
+            if self.rate:
+                time.sleep(total / self.rate / 4)
+            if failed and step == 3:
+                self.exit_code = failed
+                return False
+            done = total * step // 4
+            self.out(" Update state (0x61) downloading, progress: {:.2f} ({} / {})".format(
+                done * 100.0 / total, done, total))
+        return True
+
+    def cmd_app_update(self, app_id, *_):
+        if not self.download():
+            self.out("Error! App '{}' state is 0x602 after update job.".format(app_id))
+            return False
+        content = os.path.join(self.install_dir, "steamapps", "common", "app_{}".format(app_id))
+        os.makedirs(content, exist_ok=True)
+        with open(os.path.join(content, "app.bin"), "wb") as f:
+            f.truncate(self.item_size)
+        self.write_app_manifest(app_id, self.item_size)
+        self.out("Success! App '{}' fully installed.".format(app_id))
+
+    def cmd_workshop_download_item(self, app_id, workshop_id, *_):
+        # Items in FAKE_STEAMCMD_FAIL_ITEMS time out the first time they are downloaded
+        marker = os.path.join(self.home, ".fake_failed_{}".format(workshop_id))
+        if workshop_id in self.fail_items and not os.path.exists(marker):
+            open(marker, "w").close()
+            self.out("Downloading item {} ...".format(workshop_id))
+            self.out("ERROR! Download item {} failed (Timeout).".format(workshop_id))
+            self.exit_code = 10
+            return False
+        self.out("Downloading item {} ...".format(workshop_id))
+        marker = os.path.join(self.home, ".fake_hung_{}".format(workshop_id))
+        if workshop_id in self.hang_items and not os.path.exists(marker):
+            open(marker, "w").close()
+            time.sleep(3600)
+        if not self.download():
+            self.out("ERROR! Download item {} failed (Timeout).".format(workshop_id))
+            return False
+        content = os.path.join(self.install_dir, "steamapps", "workshop", "content", app_id, workshop_id)
+        os.makedirs(content, exist_ok=True)
+        with open(os.path.join(content, "item.bin"), "wb") as f:
+            f.truncate(self.item_size)
+        self.write_workshop_manifest(app_id, workshop_id, self.item_size)
+        self.out('Success. Downloaded item {} to "{}" ({} bytes)'.format(workshop_id, content, self.item_size))
+
+    def write_app_manifest(self, app_id, size):
+        steamapps = os.path.join(self.install_dir, "steamapps")
+        os.makedirs(steamapps, exist_ok=True)
+        with open(os.path.join(steamapps, "appmanifest_{}.acf".format(app_id)), "w") as f:
+            f.write('"AppState"\n{{\n\t"appid"\t\t"{}"\n\t"installdir"\t\t"app_{}"\n\t"StateFlags"\t\t"4"\n'
+                    '\t"buildid"\t\t"{}"\n\t"SizeOnDisk"\t\t"{}"\n\t"LastUpdated"\t\t"{}"\n}}\n'.format(
+                        app_id, app_id, os.environ.get("FAKE_STEAMCMD_BUILDID", "1"), size, int(time.time())))
+
+    def write_workshop_manifest(self, app_id, workshop_id, size):
+        workshop = os.path.join(self.install_dir, "steamapps", "workshop")
+        state_path = os.path.join(workshop, ".fake_items_{}.json".format(app_id))
+        items = {}
+        if os.path.isfile(state_path):
+            with open(state_path) as f:
+                items = json.load(f)
+        items[workshop_id] = {"size": size, "timeupdated": int(os.environ.get("FAKE_STEAMCMD_TIMEUPDATED", "1000"))}
+        # Concurrent fakes share the install dir, so never leave a half written file behind
+        with open("{}.{}".format(state_path, os.getpid()), "w") as f:
+            json.dump(items, f)
+        os.replace("{}.{}".format(state_path, os.getpid()), state_path)
+        entries = "".join(
+            '\t\t"{}"\n\t\t{{\n\t\t\t"size"\t\t"{}"\n\t\t\t"timeupdated"\t\t"{}"\n'
+            '\t\t\t"manifest"\t\t"123"\n\t\t}}\n'.format(item_id, item["size"], item["timeupdated"])
+            for item_id, item in sorted(items.items()))
+        manifest_path = os.path.join(workshop, "appworkshop_{}.acf".format(app_id))
+        with open("{}.{}".format(manifest_path, os.getpid()), "w") as f:
+            f.write('"AppWorkshop"\n{{\n\t"appid"\t\t"{}"\n\t"WorkshopItemsInstalled"\n\t{{\n{}\t}}\n}}\n'.format(
+                app_id, entries))
+        os.replace("{}.{}".format(manifest_path, os.getpid()), manifest_path)
+
+    def cmd_sleep(self, seconds, *_):
+        time.sleep(float(seconds))
+
+    def cmd_quit(self, *_):
+        return False
+
+
+def split_commands(argv):
+    """
+    Splits +command style arguments into (name, args) tuples
+    """
+    commands = []
+    for arg in argv:
+        if arg.startswith("+"):
+            commands.append((arg[1:], []))
+        elif commands:
+            commands[-1][1].append(arg)
+    return commands
+
+
+def self_update(steam):
+    """
+    Emulates steamcmd updating itself to FAKE_STEAMCMD_VERSION, the installed version is kept in the home
+
+    :return: Whether an update was applied
+    """
+    version_path = os.path.join(steam.home, ".fake_version")
+    installed = "1"
+    if os.path.isfile(version_path):
+        with open(version_path) as f:
+            installed = f.read()
+    steam.out("[  0%] Checking for available updates...")
+    wanted = os.environ.get("FAKE_STEAMCMD_VERSION", "1")
+    if installed == wanted:
+        return False
+    steam.out("[----] Downloading update (1 of 1 KB)...")
+    time.sleep(float(os.environ.get("FAKE_STEAMCMD_UPDATE_DELAY", "0")))
+    steam.out("[----] Applying update...")
+    with open(version_path, "w") as f:
+        f.write(wanted)
+    steam.out("[----] Verifying installation...")
+    return True
+
+
+def main(argv):
+    home = os.getcwd()
+    if argv[:1] == ["--home"]:
+        home, argv = argv[1], argv[2:]
+    steam = FakeSteamCMD(home)
+    with open(os.path.join(home, ".fake_calls"), "a") as f:
+        f.write(" ".join(argv) + "\n")
+    if self_update(steam) and argv == ["+quit"]:
+        # Like a fresh installation, quit once the update is applied
+        return 7
+    time.sleep(float(os.environ.get("FAKE_STEAMCMD_STARTUP_DELAY", "0")))
+    steam.out("Steam Console Client (c) Valve Corporation", "-- type 'quit' to exit --", "Loading Steam API...OK")
+    for name, args in split_commands(argv):
+        if not steam.run(name, args):
+            if steam.exit_code is not None:
+                return steam.exit_code
+            return int(os.environ.get("FAKE_STEAMCMD_EXIT", "0"))
+
+    # No +quit given, so act as the interactive shell
+    while True:
+        sys.stdout.write("\n" + PROMPT)
+        sys.stdout.flush()
+        line = sys.stdin.readline()
+        if not line:
+            return 0
+        parts = shlex.split(line)
+        if parts and not steam.run(parts[0], parts[1:]):
+            return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
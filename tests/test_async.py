@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import asyncio
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import AsyncSteamCMD, SteamCMD_command, RetryPolicy, CredentialPool
+from pysteamcmdwrapper.progress import PROGRESS
+from pysteamcmdwrapper.exceptions import SteamCMDDownloadException
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def testAsyncAppUpdate(tmp_path):
+    install_fake(str(tmp_path))
+    s = AsyncSteamCMD(str(tmp_path))
+    lines = []
+    if run(s.app_update(740, str(tmp_path / "game"), line_callback=lines.append)) != 0:
+        raise AssertionError
+    if "Success! App '740' fully installed." not in lines:
+        raise AssertionError
+
+
+def testAsyncStream(tmp_path):
+    install_fake(str(tmp_path))
+    s = AsyncSteamCMD(str(tmp_path))
+    sc = SteamCMD_command()
+    sc.workshop_download_item(107410, 5)
+
+    async def collect():
+        return [line async for line in s.stream(sc)]
+
+    if not any(line.startswith("Success. Downloaded item 5") for line in run(collect())):
+        raise AssertionError
+
+
+def testAsyncConcurrentUpdates(tmp_path):
+    install_fake(str(tmp_path))
+    s = AsyncSteamCMD(str(tmp_path))
+
+    async def update_all():
+        return await asyncio.gather(*(s.workshop_update(107410, i, str(tmp_path / "mods")) for i in range(5)))
+
+    if run(update_all()) != [0] * 5:
+        raise AssertionError
+
+
+def testAsyncTimeout(tmp_path):
+    install_fake(str(tmp_path))
+    s = AsyncSteamCMD(str(tmp_path), RetryPolicy(base_delay=0))
+    sc = SteamCMD_command()
+    sc.custom("+sleep 30")
+    start = time.monotonic()
+    # Killed like a hung try and retried, until the tries run out
+    with pytest.raises(SteamCMDDownloadException):
+        run(s.execute(sc, n_tries=2, timeout=0.5))
+    if time.monotonic() - start > 10:
+        raise AssertionError
+
+
+def testAsyncCarriageReturnLines(tmp_path):
+    # Progress lines separated by carriage returns only, well over the 64 KiB line limit of a StreamReader
+    exe = tmp_path / "steamcmd.sh"
+    script = ("import sys\n"
+              "out = sys.stdout.buffer\n"
+              "out.write(b'Loading Steam API...OK\\r\\n')\n"
+              "for i in range(1, 2001):\n"
+              "    out.write(b' Update state (0x61) downloading, progress: 50.00 (%d / 4000)\\r' % i)\n"
+              "out.write(b'\\nSuccess! App \\'740\\' fully installed.\\n')\n")
+    exe.write_text('#!/bin/sh\nexec "{}" -c "{}"\n'.format(sys.executable, script.replace('"', '\\"')))
+    exe.chmod(0o755)
+    s = AsyncSteamCMD(str(tmp_path), passthrough=False)
+    lines, events = [], []
+    if run(s.execute(SteamCMD_command(), line_callback=lines.append, progress_callback=events.append)) != 0:
+        raise AssertionError
+    progress = [event for event in events if event.kind == PROGRESS]
+    if len(progress) != 2000 or progress[-1].bytes_done != 2000:
+        raise AssertionError(len(progress))
+    if lines[0] != "Loading Steam API...OK" or lines[-1] != "Success! App '740' fully installed." or len(lines) != 2002:
+        raise AssertionError(lines[:2] + lines[-2:])
+
+
+def running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Zombies have exited, they are only waiting to be reaped
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def testAsyncCancelKillsProcessGroup(tmp_path):
+    # Like steamcmd.sh, which runs the real steamcmd as its child
+    exe = tmp_path / "steamcmd.sh"
+    exe.write_text('#!/bin/sh\nsleep 30 &\necho $! > "$(dirname "$0")/child.pid"\nwait\n')
+    exe.chmod(0o755)
+    s = AsyncSteamCMD(str(tmp_path))
+
+    async def cancel_running():
+        task = asyncio.ensure_future(s.execute(SteamCMD_command()))
+        while not (tmp_path / "child.pid").exists():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.monotonic()
+    run(cancel_running())
+    pid = int((tmp_path / "child.pid").read_text())
+    # An orphaned child would also hold the output pipe open until it exits
+    if time.monotonic() - start > 10:
+        raise AssertionError
+    deadline = time.monotonic() + 5
+    while running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if running(pid):
+        raise AssertionError
+
+
+def testAsyncRetriesExhausted(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_EXIT", "10")
+    s = AsyncSteamCMD(str(tmp_path), RetryPolicy(base_delay=0))
+    with pytest.raises(SteamCMDDownloadException):
+        run(s.workshop_update(107410, 1, n_tries=2))
+
+
+def testAsyncStallRetried(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_HANG_ITEMS", "1")
+    s = AsyncSteamCMD(str(tmp_path), RetryPolicy(base_delay=0))
+    sc = SteamCMD_command()
+    sc.force_install_dir(str(tmp_path / "content"))
+    sc.workshop_download_item(107410, 1)
+    if run(s.execute(sc, n_tries=2, stall_timeout=0.5)) != 0:
+        raise AssertionError
+    if len((tmp_path / ".fake_calls").read_text().splitlines()) != 2:
+        raise AssertionError
+
+
+
+def testAsyncWorkshopUpdateStallTimeout(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_HANG_ITEMS", "1")
+    s = AsyncSteamCMD(str(tmp_path), RetryPolicy(base_delay=0))
+    start = time.monotonic()
+    if run(s.workshop_update(107410, 1, str(tmp_path / "content"), n_tries=2, stall_timeout=0.5)) != 0:
+        raise AssertionError
+    if time.monotonic() - start > 30 or len((tmp_path / ".fake_calls").read_text().splitlines()) != 2:
+        raise AssertionError
+
+
+def testAsyncLogin(tmp_path):
+    install_fake(str(tmp_path))
+    s = AsyncSteamCMD(str(tmp_path))
+    if run(s.login("user", "hunter2")) != 0:
+        raise AssertionError
+    if "+login user hunter2" not in (tmp_path / ".fake_calls").read_text():
+        raise AssertionError
+
+
+def testAsyncCancelReleasesAccount(tmp_path):
+    install_fake(str(tmp_path))
+    pool = CredentialPool([("user", "pw")])
+    s = AsyncSteamCMD(str(tmp_path))
+    held = pool.acquire()
+
+    async def cancel_while_waiting():
+        task = asyncio.ensure_future(s.execute(SteamCMD_command(), credentials=pool))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The waiting thread gets the account once it is free, and has to give it back
+        pool.release(held)
+
+    run(cancel_while_waiting())
+    account = pool.acquire(timeout=1)
+    if account is None:
+        raise AssertionError
+    # Possibly taken ahead of the cancelled waiter, whose thread keeps waiting for it
+    pool.release(account)
@@ -0,0 +1,62 @@
+import os
+import shutil
+import hashlib
+from fake_steamcmd import ArchiveServer, make_archive
+from pysteamcmdwrapper import SteamCMD, BootstrapCache
+
+
+def install_roots(tmp_path, server, n):
+    roots = []
+    for i in range(n):
+        root = tmp_path / "root{}".format(i)
+        root.mkdir()
+        s = SteamCMD(str(root))
+        s.steamcmd_url = server.url
+        roots.append(s)
+    return roots
+
+
+def testCacheDownloadsOnce(tmp_path):
+    with ArchiveServer(make_archive()) as server:
+        cache = BootstrapCache(str(tmp_path / "cache"))
+        first, second = install_roots(tmp_path, server, 2)
+        first.install(cache=cache)
+        second.install(cache=cache)
+        if len(server.ranges) != 1:
+            raise AssertionError
+        # Rebuilt from the stored archive
+        second.install(force=True, cache=cache, refresh_cache=True)
+        if len(server.ranges) != 1:
+            raise AssertionError
+    if not (os.path.isfile(first.exe) and os.path.isfile(second.exe)):
+        raise AssertionError
+    if cache.prune() != 1:
+        raise AssertionError
+
+
+def testCacheReusesArchives(tmp_path):
+    archive = make_archive()
+    with ArchiveServer(archive) as server:
+        cache = BootstrapCache(str(tmp_path / "cache"))
+        first, second, third = install_roots(tmp_path, server, 3)
+        progress = []
+        first.install(cache=cache, progress_callback=lambda done, total: progress.append((done, total)))
+        if not progress or progress[-1] != (len(archive), len(archive)):
+            raise AssertionError(progress)
+        trees = os.path.join(str(tmp_path / "cache"), "trees")
+        for name in os.listdir(trees):
+            shutil.rmtree(os.path.join(trees, name))
+        second.install(cache=cache)
+        third.install(cache=cache, refresh_cache=True, checksum=hashlib.sha256(archive).hexdigest())
+        if len(server.ranges) != 1 or not os.path.isfile(third.exe):
+            raise AssertionError(server.ranges)
+
+
+def testCacheHardlinks(tmp_path):
+    with ArchiveServer(make_archive()) as server:
+        cache = BootstrapCache(str(tmp_path / "cache"), mode="hardlink")
+        first, second = install_roots(tmp_path, server, 2)
+        first.install(cache=cache)
+        second.install(cache=cache)
+    if not os.path.samefile(first.exe, second.exe):
+        raise AssertionError
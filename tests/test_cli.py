@@ -0,0 +1,87 @@
+import sys
+import json
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper.cli import main, load_manifest, build_jobs
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+
+def make_workers(tmp_path, n):
+    paths = []
+    for i in range(n):
+        root = tmp_path / "steamcmd{}".format(i)
+        root.mkdir()
+        install_fake(str(root))
+        paths.append(str(root))
+    return paths
+
+
+def testCliRunsManifest(tmp_path, capsys):
+    manifest = {
+        "steamcmd": make_workers(tmp_path, 2),
+        "tries": 2,
+        "installs": [
+            {"install_dir": str(tmp_path / "server"), "apps": [740, {"id": 90, "beta": "beta"}]},
+            {"install_dir": str(tmp_path / "mods"), "workshop": [{"app_id": 107410, "items": [1, 2, 3]}]},
+        ],
+    }
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+    if main([str(tmp_path / "manifest.json")]) != 0:
+        raise AssertionError
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    results = {line["install_dir"]: line for line in lines[:2]}
+    if results[str(tmp_path / "server")]["apps"] != [740, 90] or results[str(tmp_path / "mods")]["workshop_items"] != 3:
+        raise AssertionError
+    if not all(r["success"] and r["duration"] >= 0 for r in results.values()):
+        raise AssertionError
+    if lines[2]["summary"] is not True or lines[2]["jobs"] != 2 or lines[2]["failed"] != 0:
+        raise AssertionError
+    if not (tmp_path / "mods" / "steamapps" / "workshop" / "content" / "107410" / "3").is_dir():
+        raise AssertionError
+
+
+def testCliReportsFailures(tmp_path, capsys):
+    manifest = {"username": "badpass", "password_env": "UNSET_PASSWORD",
+                "installs": [{"install_dir": str(tmp_path / "server"), "apps": [740]}]}
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+    if main([str(tmp_path / "manifest.json"), "--steamcmd", make_workers(tmp_path, 1)[0]]) != 1:
+        raise AssertionError
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    if lines[0]["success"] or "invalid password" not in lines[0]["error"] or lines[1]["failed"] != 1:
+        raise AssertionError
+
+
+def testCliInstallKeepsExistingSteamcmd(tmp_path, capsys):
+    manifest = {"installs": [{"install_dir": str(tmp_path / "server"), "apps": [740]}]}
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+    steamcmd = make_workers(tmp_path, 1)[0]
+    # Already installed, as on every cron run after the first
+    if main([str(tmp_path / "manifest.json"), "--steamcmd", steamcmd, "--install"]) != 0:
+        raise AssertionError
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    if not lines[0]["success"] or lines[1]["failed"] != 0:
+        raise AssertionError
+
+
+def testCliTomlManifest(tmp_path):
+    pytest.importorskip("tomllib" if sys.version_info >= (3, 11) else "toml")
+    (tmp_path / "manifest.toml").write_text(
+        'steamcmd = "/opt/steamcmd"\n'
+        '[[installs]]\ninstall_dir = "/srv/arma"\napps = [233780]\n'
+        '[[installs.workshop]]\napp_id = 107410\nitems = [450814997]\n')
+    jobs = build_jobs(load_manifest(str(tmp_path / "manifest.toml")))
+    if [(d, sc.get_argv()) for d, sc in jobs] != [("/srv/arma", [
+            "+force_install_dir", "/srv/arma", "+app_update", "233780",
+            "+workshop_download_item", "107410", "450814997"])]:
+        raise AssertionError
+
+
+def testCliInvalidManifest(tmp_path, capsys):
+    (tmp_path / "manifest.json").write_text(json.dumps({"installs": [{"apps": [740]}]}))
+    with pytest.raises(SteamCMDException):
+        build_jobs(load_manifest(str(tmp_path / "manifest.json")))
+    if main([str(tmp_path / "manifest.json"), "--steamcmd", str(tmp_path)]) != 2:
+        raise AssertionError
+    (tmp_path / "manifest.ini").write_text("")
+    if main([str(tmp_path / "manifest.ini")]) != 2 or "Unknown manifest format" not in capsys.readouterr().err:
+        raise AssertionError
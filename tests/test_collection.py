@@ -0,0 +1,78 @@
+import shutil
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, CollectionSync, ManifestIndex, RetryPolicy, vdf
+
+APP_ID = 107410
+
+
+def fake_calls(tmp_path):
+    return (tmp_path / ".fake_calls").read_text().splitlines()
+
+
+def testSyncDownloadsOnlyChanges(tmp_path):
+    install_fake(str(tmp_path))
+    steam = SteamCMD(str(tmp_path))
+    content = tmp_path / "mods" / "steamapps" / "workshop" / "content" / str(APP_ID)
+    sync = CollectionSync(str(tmp_path / "mods"), max_items=2)
+
+    result = sync.sync(steam, {APP_ID: [1, 2, 3]})[APP_ID]
+    if result.downloaded != [1, 2, 3] or not result.success or result.unchanged != 0:
+        raise AssertionError
+    # Batched into sessions of at most max_items
+    if len(fake_calls(tmp_path)) != 2:
+        raise AssertionError
+
+    plan = sync.plan({APP_ID: [2, 3, 4]}, prune=True)[APP_ID]
+    if plan.download != [4] or plan.prune != [1] or plan.unchanged != 2:
+        raise AssertionError
+    result = sync.sync(steam, {APP_ID: [2, 3, 4]}, prune=True)[APP_ID]
+    if result.downloaded != [4] or result.pruned != [1] or (content / "1").exists():
+        raise AssertionError
+    if "107410 4" not in fake_calls(tmp_path)[-1] or "107410 2" in fake_calls(tmp_path)[-1]:
+        raise AssertionError
+
+    # Nothing changed, so steamcmd doesn't run
+    calls = len(fake_calls(tmp_path))
+    if sync.sync(steam, {APP_ID: [2, 3, 4]})[APP_ID].unchanged != 3 or len(fake_calls(tmp_path)) != calls:
+        raise AssertionError
+
+
+def testPruneRemovesManifestEntries(tmp_path):
+    install_fake(str(tmp_path))
+    steam = SteamCMD(str(tmp_path))
+    sync = CollectionSync(str(tmp_path / "mods"))
+    sync.sync(steam, {APP_ID: [1, 2, 3]})
+    calls = len(fake_calls(tmp_path))
+    result = sync.sync(steam, {APP_ID: [2, 3]}, prune=True)[APP_ID]
+    if result.pruned != [1] or len(fake_calls(tmp_path)) != calls:
+        raise AssertionError
+    acf = tmp_path / "mods" / "steamapps" / "workshop" / "appworkshop_{}.acf".format(APP_ID)
+    if list(vdf.load(str(acf))["AppWorkshop"]["WorkshopItemsInstalled"]) != ["2", "3"]:
+        raise AssertionError
+    # Not taken for installed anymore, so wanting it again downloads it
+    if sorted(ManifestIndex(str(tmp_path / "mods")).workshop_items(APP_ID)) != [(APP_ID, 2), (APP_ID, 3)]:
+        raise AssertionError
+    if sync.plan({APP_ID: [1, 2, 3]})[APP_ID].download != [1]:
+        raise AssertionError
+
+
+def testSyncUpdatesOlderAndMissingContent(tmp_path):
+    install_fake(str(tmp_path))
+    steam = SteamCMD(str(tmp_path))
+    sync = CollectionSync(str(tmp_path / "mods"))
+    sync.sync(steam, {APP_ID: [1, 2, 3]})
+    content = tmp_path / "mods" / "steamapps" / "workshop" / "content" / str(APP_ID)
+    shutil.rmtree(str(content / "3"))
+    # Item 1 was updated on the workshop after it was downloaded, at 1000
+    plan = sync.plan({APP_ID: {1: 2000, 2: 1000, 3: None}})[APP_ID]
+    if plan.download != [1, 3] or plan.unchanged != 1:
+        raise AssertionError
+
+
+def testSyncReportsFailedItems(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_FAIL_ITEMS", "2")
+    steam = SteamCMD(str(tmp_path), RetryPolicy(base_delay=0))
+    result = CollectionSync(str(tmp_path / "mods")).sync(steam, {APP_ID: [1, 2]}, n_tries=1)[APP_ID]
+    if result.success or result.failed != [2] or result.downloaded != [1]:
+        raise AssertionError
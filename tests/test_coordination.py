@@ -0,0 +1,162 @@
+import time
+import threading
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, RetryPolicy
+from pysteamcmdwrapper.coordination import (Coordinator, FileBackend, SQLiteBackend, WorkItem, lease_key,
+                                            DONE, FAILED)
+from pysteamcmdwrapper.progress import SUCCESS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_backend(kind, tmp_path, clock=time.time):
+    if kind == "file":
+        return FileBackend(str(tmp_path / "coordination"), clock=clock)
+    return SQLiteBackend(str(tmp_path / "coordination.db"), clock=clock)
+
+
+@pytest.mark.parametrize("kind", ["file", "sqlite"])
+def testLeasesExpire(tmp_path, kind):
+    clock = FakeClock()
+    # Two hosts, each with its own handle on the shared state
+    first, second = make_backend(kind, tmp_path, clock), make_backend(kind, tmp_path, clock)
+    key = lease_key("/srv/csgo", 740)
+    if not first.acquire(key, "a", 10) or second.acquire(key, "b", 10) or second.renew(key, "b", 10):
+        raise AssertionError
+    clock.now += 5
+    if not first.renew(key, "a", 10):
+        raise AssertionError
+    clock.now += 9
+    if second.acquire(key, "b", 10):
+        raise AssertionError
+    # Its host stopped renewing it
+    clock.now += 2
+    if not second.acquire(key, "b", 10) or first.renew(key, "a", 10):
+        raise AssertionError
+    first.release(key, "a")
+    if first.acquire(key, "a", 10):
+        raise AssertionError
+    second.release(key, "b")
+    if not first.acquire(key, "a", 10):
+        raise AssertionError
+
+
+@pytest.mark.parametrize("kind", ["file", "sqlite"])
+def testLeaseHeartbeat(tmp_path, kind):
+    holder = Coordinator(make_backend(kind, tmp_path), "a", ttl=0.3, poll_interval=0.01)
+    waiter = Coordinator(make_backend(kind, tmp_path), "b", ttl=0.3, poll_interval=0.01)
+    held = threading.Event()
+
+    def hold():
+        with holder.lease("/srv/csgo", 740):
+            held.set()
+            time.sleep(1)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    try:
+        # Renewed by the heartbeat, so it doesn't expire after ttl
+        time.sleep(0.6)
+        if waiter.backend.acquire(lease_key("/srv/csgo", 740), "b", 0.3):
+            raise AssertionError
+        with waiter.lease("/srv/csgo", 740, timeout=5):
+            if thread.is_alive():
+                raise AssertionError
+    finally:
+        thread.join()
+
+
+class StolenLeaseBackend(FileBackend):
+    """
+    Another host takes the lease before the first renewal, like after a network partition
+    """
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.stolen = False
+        self.finished_by = []
+
+    def renew(self, key, owner, ttl):
+        if not self.stolen:
+            self.stolen = True
+            self.release(key, owner)
+            self.acquire(key, "other", 0.5)
+        return super().renew(key, owner, ttl)
+
+    def finish(self, batch, items, state, error=None):
+        with self._state() as current:
+            self.finished_by.append(current["leases"][items[0].lease_key]["owner"])
+        super().finish(batch, items, state, error)
+
+
+def testLostLeaseKillsSteamcmd(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_ITEM_SIZE", "2000")
+    monkeypatch.setenv("FAKE_STEAMCMD_RATE", "1000")
+    backend = StolenLeaseBackend(str(tmp_path / "coordination"))
+    coordinator = Coordinator(backend, "host", ttl=0.6, poll_interval=0.05)
+    item = WorkItem(str(tmp_path / "shared"), 107410, 1)
+    succeeded = []
+    status = coordinator.run(SteamCMD(str(tmp_path)), "update", [item],
+                             progress_callback=lambda e: e.kind == SUCCESS and succeeded.append(e))
+    if status != {item: DONE} or backend.finished_by != ["host"]:
+        raise AssertionError((status, backend.finished_by))
+    # The first steamcmd was killed halfway, the item was downloaded again once the lease was free
+    if len((tmp_path / ".fake_calls").read_text().splitlines()) != 2 or len(succeeded) != 1:
+        raise AssertionError
+
+
+@pytest.mark.parametrize("kind", ["file", "sqlite"])
+def testClusterDownloadsEveryItemOnce(tmp_path, kind):
+    install_dir = str(tmp_path / "shared")
+    items = [WorkItem(install_dir, 740), WorkItem(install_dir, 90)] + \
+        [WorkItem(install_dir, 107410, workshop_id) for workshop_id in range(1, 7)]
+    hosts = []
+    for i in range(3):
+        root = tmp_path / f"host{i}"
+        root.mkdir()
+        install_fake(str(root))
+        hosts.append((SteamCMD(str(root)), Coordinator(make_backend(kind, tmp_path), f"host{i}", poll_interval=0.01,
+                                                       max_items=2)))
+    results = [None] * len(hosts)
+
+    def run(i):
+        steam, coordinator = hosts[i]
+        results[i] = coordinator.run(steam, "update", items)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(hosts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = {item: DONE for item in items}
+    if any(result != expected for result in results):
+        raise AssertionError(results)
+    calls = " ".join((tmp_path / f"host{i}" / ".fake_calls").read_text() for i in range(len(hosts)))
+    for command in ["+app_update 740 ", "+app_update 90 "] + [f"+workshop_download_item 107410 {i} "
+                                                            for i in range(1, 7)]:
+        if calls.count(command) != 1:
+            raise AssertionError(command)
+
+
+def testClusterKeepsFailedItems(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_FAIL_ITEMS", "2")
+    install_dir = str(tmp_path / "shared")
+    items = [WorkItem(install_dir, 107410, workshop_id) for workshop_id in (1, 2, 3)]
+    coordinator = Coordinator(make_backend("sqlite", tmp_path), poll_interval=0.01)
+    status = coordinator.run(SteamCMD(str(tmp_path), RetryPolicy(base_delay=0)), "update", items, n_tries=1)
+    if status != {items[0]: DONE, items[1]: FAILED, items[2]: FAILED}:
+        raise AssertionError(status)
+    # Failed items are not tried again in the same batch
+    if coordinator.run(SteamCMD(str(tmp_path)), "update", items) != status:
+        raise AssertionError
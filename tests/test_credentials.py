@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, AsyncSteamCMD, SteamCMD_command, CredentialPool, RetryPolicy, WorkshopScheduler
+from pysteamcmdwrapper.retry import RATE_LIMIT, INVALID_PASSWORD, TIMEOUT
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def testInstancesDoNotShareCredentials(tmp_path):
+    a, b = SteamCMD(str(tmp_path)), SteamCMD(str(tmp_path))
+    a._uname = "user"
+    if b._uname != "anonymous" or "_uname" in vars(SteamCMD):
+        raise AssertionError
+
+
+def testPoolSpreadsAccounts():
+    pool = CredentialPool([("a", "1"), ("b", "2")], max_sessions=1)
+    first, second = pool.acquire(timeout=0), pool.acquire(timeout=0)
+    if {first, second} != {("a", "1"), ("b", "2")}:
+        raise AssertionError
+    if pool.acquire(timeout=0) is not None:
+        raise AssertionError
+    pool.release(first)
+    if pool.acquire(timeout=0) != first:
+        raise AssertionError
+
+
+def testPoolTokenBucket():
+    clock = FakeClock()
+    pool = CredentialPool([("a", "1")], max_sessions=10, login_rate=0.1, burst=2, clock=clock)
+    pool.acquire(timeout=0)
+    pool.acquire(timeout=0)
+    if pool.acquire(timeout=0) is not None:
+        raise AssertionError
+    clock.now += 10
+    if pool.acquire(timeout=0) != ("a", "1"):
+        raise AssertionError
+
+
+def testPoolCooldowns():
+    clock = FakeClock()
+    pool = CredentialPool([("a", "1"), ("b", "2")], clock=clock)
+    pool.release(pool.acquire(timeout=0), RATE_LIMIT)
+    pool.release(pool.acquire(timeout=0), TIMEOUT)
+    if set(pool.cooling_down()) != {"a"}:
+        raise AssertionError
+    if pool.acquire(timeout=0) != ("b", "2"):
+        raise AssertionError
+    pool.release(("b", "2"), INVALID_PASSWORD)
+    clock.now += 600
+    if pool.acquire(timeout=0) != ("a", "1"):
+        raise AssertionError
+    pool.release(("a", "1"), INVALID_PASSWORD)
+    with pytest.raises(SteamCMDException):
+        pool.acquire(timeout=0)
+
+
+def testExecuteSwitchesAccounts(tmp_path):
+    install_fake(str(tmp_path))
+    pool = CredentialPool([("badpass", "secret"), ("user", "pass")])
+    sc = SteamCMD_command()
+    sc.workshop_download_item(107410, 1)
+    if SteamCMD(str(tmp_path), RetryPolicy(base_delay=0)).execute(sc, n_tries=2, credentials=pool) != 0:
+        raise AssertionError
+    calls = (tmp_path / ".fake_calls").read_text().splitlines()
+    if len(calls) != 2 or "+login badpass" not in calls[0] or "+login user" not in calls[1]:
+        raise AssertionError
+    if set(pool.cooling_down()) != {"badpass"}:
+        raise AssertionError
+
+
+def testAsyncExecuteWithPool(tmp_path):
+    install_fake(str(tmp_path))
+    pool = CredentialPool([("a", "1"), ("b", "2")])
+    s = AsyncSteamCMD(str(tmp_path))
+
+    async def update_all():
+        return await asyncio.gather(*(s.execute(SteamCMD_command(), credentials=pool) for _ in range(3)))
+
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(update_all())
+    finally:
+        loop.close()
+    if results != [0] * 3:
+        raise AssertionError
+    calls = (tmp_path / ".fake_calls").read_text()
+    if calls.count("+login a") + calls.count("+login b") != 3:
+        raise AssertionError
+
+
+def testSchedulerWithPool(tmp_path):
+    workers = []
+    for i in range(2):
+        root = tmp_path / "worker{}".format(i)
+        root.mkdir()
+        install_fake(str(root))
+        workers.append(SteamCMD(str(root)))
+    pool = CredentialPool([("a", "1"), ("b", "2")])
+    results = list(WorkshopScheduler(workers, chunk_size=1, credentials=pool).run([(107410, i) for i in range(4)]))
+    if not all(r.success for r in results):
+        raise AssertionError
+    calls = "".join((tmp_path / "worker{}".format(i) / ".fake_calls").read_text() for i in range(2))
+    if "+login a" not in calls or "+login b" not in calls:
+        raise AssertionError
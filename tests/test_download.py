@@ -0,0 +1,46 @@
+import os
+import hashlib
+import pytest
+from fake_steamcmd import ArchiveServer, make_archive
+from pysteamcmdwrapper import SteamCMD
+from pysteamcmdwrapper.exceptions import SteamCMDDownloadException
+
+
+def testInstallFromStream(tmp_path):
+    archive = make_archive()
+    progress = []
+    with ArchiveServer(archive) as server:
+        s = SteamCMD(str(tmp_path))
+        s.steamcmd_url = server.url
+        s.install(progress_callback=lambda done, total: progress.append((done, total)),
+                  checksum=hashlib.sha256(archive).hexdigest())
+    if not os.path.isfile(s.exe):
+        raise AssertionError
+    if progress[-1] != (len(archive), len(archive)):
+        raise AssertionError
+    # Nothing is left behind in the installation path or the working directory
+    if os.path.exists(s.zip) or os.path.exists(s.zip + ".part") or os.path.exists("steamcmd.tar.gz"):
+        raise AssertionError
+
+
+def testDownloadResumes(tmp_path):
+    archive = make_archive()
+    with ArchiveServer(archive, fail_after=len(archive) // 2) as server:
+        s = SteamCMD(str(tmp_path))
+        s.steamcmd_url = server.url
+        path = s._download()
+    with open(path, "rb") as f:
+        if f.read() != archive:
+            raise AssertionError
+    if server.ranges != [None, "bytes={}-".format(len(archive) // 2)]:
+        raise AssertionError
+
+
+def testDownloadChecksumMismatch(tmp_path):
+    with ArchiveServer(make_archive()) as server:
+        s = SteamCMD(str(tmp_path))
+        s.steamcmd_url = server.url
+        with pytest.raises(SteamCMDDownloadException):
+            s._download(checksum="0" * 64)
+    if os.listdir(str(tmp_path)):
+        raise AssertionError
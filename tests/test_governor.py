@@ -0,0 +1,140 @@
+import os
+import time
+import subprocess
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, ThroughputGovernor
+from pysteamcmdwrapper.governor import CAN_PAUSE
+from pysteamcmdwrapper.watchdog import Watchdog
+from pysteamcmdwrapper.retry import STALLED
+from pysteamcmdwrapper.progress import parse_progress
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+APP_OUTPUT = [
+    " Update state (0x61) downloading, progress: 25.00 (250 / 1000)",
+    " Update state (0x61) downloading, progress: 100.00 (1000 / 1000)",
+    "Success! App '740' fully installed.",
+    "Downloading item 1 ...",
+    'Success. Downloaded item 1 to "/content/1" (500 bytes)',
+]
+
+
+def testGovernorMeasuresRates():
+    clock = FakeClock()
+    governor = ThroughputGovernor(window=5, clock=clock)
+    worker = governor.register(os.getpid())
+    for event in parse_progress(APP_OUTPUT):
+        governor.observe(worker, event)
+    if governor.total_bytes() != 1500 or governor.rate() != 300:
+        raise AssertionError
+    clock.now += 10
+    if governor.rates() != {worker: 0}:
+        raise AssertionError
+    governor.unregister(worker)
+    if governor.rates() or governor.total_bytes() != 1500:
+        raise AssertionError
+
+
+def is_stopped(pid, expected=True):
+    """
+    :return: Whether the process reached the expected state, waiting a moment for signals to be delivered
+    """
+    deadline = time.monotonic() + 2
+    while True:
+        with open(f"/proc/{pid}/stat") as f:
+            stopped = f.read().rsplit(")", 1)[1].split()[0] == "T"
+        if stopped == expected or time.monotonic() > deadline:
+            return stopped
+        time.sleep(0.01)
+
+
+@pytest.mark.skipif(not CAN_PAUSE or not os.path.isdir("/proc"), reason="needs job control signals and /proc")
+def testGovernorPausesFastestWorker():
+    clock = FakeClock()
+    # Registered without a budget, so no governing thread runs and check() is called by hand
+    governor = ThroughputGovernor(window=10, max_pause=5, clock=clock)
+    processes = [subprocess.Popen(("sleep", "30"), start_new_session=True) for _ in range(2)]
+    slow, fast = (governor.register(p.pid) for p in processes)
+    governor.max_rate = 10
+    try:
+        for worker, size in ((slow, 60), (fast, 90)):
+            governor.observe(worker, next(parse_progress([
+                f" Update state (0x61) downloading, progress: 1.00 ({size} / 10000)"])))
+
+        governor.check()
+        if governor.paused() != [fast] or not is_stopped(processes[1].pid) or is_stopped(processes[0].pid, False):
+            raise AssertionError
+        clock.now += 1
+        governor.check()
+        if set(governor.paused()) != {fast, slow}:
+            raise AssertionError
+
+        # Paused for too long, so it is resumed even though the budget is still exceeded
+        clock.now += 4
+        governor.check()
+        if governor.paused() != [slow] or is_stopped(processes[1].pid, False):
+            raise AssertionError
+        clock.now += 20
+        governor.check()
+        if governor.paused() or is_stopped(processes[0].pid, False):
+            raise AssertionError
+    finally:
+        for worker, process in zip((slow, fast), processes):
+            governor.unregister(worker)
+            process.kill()
+            process.wait()
+
+
+@pytest.mark.skipif(not CAN_PAUSE, reason="needs job control signals")
+def testPausedWorkerDoesNotStall():
+    clock = FakeClock()
+    governor = ThroughputGovernor(window=10, max_pause=20, clock=clock)
+    process = subprocess.Popen(("sleep", "30"), start_new_session=True)
+    watchdog = Watchdog(stall_timeout=5, interval=3600, clock=clock)
+    watchdog.start(process.pid)
+    worker = governor.register(process.pid, watchdog)
+    governor.max_rate = 10
+    try:
+        governor.observe(worker, next(parse_progress([" Update state (0x61) downloading, progress: 9.00 (900 / 10000)"])))
+        governor.check()
+        if governor.paused() != [worker]:
+            raise AssertionError
+        # Paused on purpose, so no output is no stall
+        clock.now += 15
+        if watchdog.check() is not None:
+            raise AssertionError
+        clock.now += 10
+        governor.check()
+        if governor.paused() or watchdog.check() is not None:
+            raise AssertionError
+        clock.now += 5
+        if watchdog.check() != STALLED:
+            raise AssertionError
+    finally:
+        governor.unregister(worker)
+        watchdog.stop()
+        process.kill()
+        process.wait()
+
+
+def testExecuteReportsToGovernor(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_ITEM_SIZE", "4000")
+    governor = ThroughputGovernor(max_rate=10 ** 9, niceness=1)
+    sc = SteamCMD_command()
+    sc.force_install_dir(str(tmp_path / "content"))
+    sc.app_update(740)
+    sc.workshop_download_item(107410, 1)
+    sc.workshop_download_item(107410, 2)
+    if SteamCMD(str(tmp_path), governor=governor).execute(sc) != 0:
+        raise AssertionError
+    if governor.total_bytes() != 12000 or governor.rates():
+        raise AssertionError
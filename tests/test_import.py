@@ -0,0 +1,35 @@
+import sys
+import json
+import subprocess
+# Imported up front so a broken package fails collection, the tests below check fresh interpreters
+import pysteamcmdwrapper  # noqa: F401
+
+# Only needed by install(), AsyncSteamCMD, JobJournal or login()
+HEAVY_MODULES = ["urllib.request", "http.client", "zipfile", "tarfile", "getpass", "asyncio", "sqlite3"]
+
+
+def testImportIsLazy(tmp_path):
+    code = (
+        "import sys, json, pysteamcmdwrapper\n"
+        "pysteamcmdwrapper.SteamCMD(sys.argv[1])\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+    )
+    out = subprocess.check_output([sys.executable, "-c", code, str(tmp_path)], universal_newlines=True)
+    loaded = set(json.loads(out))
+    if "pysteamcmdwrapper.SteamCMD" not in loaded or loaded.intersection(HEAVY_MODULES):
+        raise AssertionError(sorted(loaded.intersection(HEAVY_MODULES)))
+
+
+def testLazyExports():
+    import pysteamcmdwrapper.SteamCMD_command
+    from pysteamcmdwrapper.AsyncSteamCMD import AsyncSteamCMD
+    # The submodules named after their class don't replace the class on the package
+    if pysteamcmdwrapper.AsyncSteamCMD is not AsyncSteamCMD or not isinstance(pysteamcmdwrapper.SteamCMD_command, type):
+        raise AssertionError
+    if not set(pysteamcmdwrapper.__all__) <= set(dir(pysteamcmdwrapper)):
+        raise AssertionError
+    try:
+        pysteamcmdwrapper.NotExported
+        raise AssertionError
+    except AttributeError:
+        pass
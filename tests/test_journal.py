@@ -0,0 +1,117 @@
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, JobJournal, WorkshopScheduler, RetryPolicy
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+
+def make_command(install_dir, *workshop_ids, apps=()):
+    sc = SteamCMD_command()
+    sc.force_install_dir(install_dir)
+    for app_id in apps:
+        sc.app_update(app_id)
+    for workshop_id in workshop_ids:
+        sc.workshop_download_item(107410, workshop_id)
+    return sc
+
+
+def testJournalRecordsItems(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_BUILDID", "42")
+    monkeypatch.setenv("FAKE_STEAMCMD_TIMEUPDATED", "1234")
+    with JobJournal(str(tmp_path / "journal.db")) as journal:
+        sc = make_command(str(tmp_path / "content"), 1, apps=[740])
+        if journal.execute(SteamCMD(str(tmp_path)), sc, "nightly") != 0:
+            raise AssertionError
+        states = [(e.kind, e.item_id, e.state) for e in journal.history(batch="nightly")]
+        if states != [("app", 740, "queued"), ("workshop", 1, "queued"),
+                      ("app", 740, "started"), ("app", 740, "completed"),
+                      ("workshop", 1, "started"), ("workshop", 1, "completed")]:
+            raise AssertionError
+        completed = {e.item_id: e for e in journal.history(batch="nightly") if e.state == "completed"}
+        if completed[740].buildid != 42 or completed[1].buildid != 1234:
+            raise AssertionError
+        if completed[1].duration is None or completed[1].duration < 0:
+            raise AssertionError
+        if journal.history(kind="workshop", limit=1)[0].state != "completed":
+            raise AssertionError
+
+
+def testJournalResumesBatch(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_FAIL_ITEMS", "2")
+    steam = SteamCMD(str(tmp_path), RetryPolicy(base_delay=0))
+    sc = make_command(str(tmp_path / "content"), 1, 2, 3)
+    with JobJournal(str(tmp_path / "journal.db")) as journal:
+        with pytest.raises(SteamCMDException):
+            journal.execute(steam, sc, "batch")
+        if journal.completed("batch") != {("workshop", 1, str(tmp_path / "content"))}:
+            raise AssertionError
+
+    # A new process picks up where the previous one stopped
+    with JobJournal(str(tmp_path / "journal.db")) as journal:
+        if journal.execute(steam, sc, "batch") != 0:
+            raise AssertionError
+        last_call = (tmp_path / ".fake_calls").read_text().splitlines()[-1]
+        if "107410 1 " in last_call or "107410 2" not in last_call:
+            raise AssertionError
+        if journal.execute(steam, sc, "batch") != 0 or len((tmp_path / ".fake_calls").read_text().splitlines()) != 2:
+            raise AssertionError
+        if len([e for e in journal.history(batch="batch") if e.state == "queued"]) != 3:
+            raise AssertionError
+        if [e.item_id for e in journal.history(batch="batch") if e.state == "failed"] != [2]:
+            raise AssertionError
+
+
+
+def testJournalResumesAppInSecondDir(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_FAIL_ITEMS", "2")
+    steam = SteamCMD(str(tmp_path), RetryPolicy(base_delay=0))
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    sc = make_command(first, apps=[740])
+    sc.force_install_dir(second)
+    sc.workshop_download_item(107410, 2)
+    sc.app_update(740)
+    with JobJournal(str(tmp_path / "journal.db")) as journal:
+        with pytest.raises(SteamCMDException):
+            journal.execute(steam, sc, "batch")
+        if journal.completed("batch") != {("app", 740, first)}:
+            raise AssertionError
+        if journal.execute(steam, sc, "batch") != 0:
+            raise AssertionError
+        last_call = (tmp_path / ".fake_calls").read_text().splitlines()[-1]
+        if last_call.count("app_update 740") != 1 or not last_call.endswith("app_update 740 +quit"):
+            raise AssertionError
+        if not (tmp_path / "second" / "steamapps" / "appmanifest_740.acf").is_file():
+            raise AssertionError
+        if journal.completed("batch") != {("app", 740, first), ("workshop", 2, second), ("app", 740, second)}:
+            raise AssertionError
+        if len([e for e in journal.history(batch="batch") if e.state == "queued"]) != 3:
+            raise AssertionError
+
+
+def testJournalDurations(tmp_path):
+    install_fake(str(tmp_path))
+    steam = SteamCMD(str(tmp_path))
+    with JobJournal(str(tmp_path / "journal.db")) as journal:
+        for batch in ("a", "b"):
+            journal.execute(steam, make_command(str(tmp_path / "content"), 1, 2), batch)
+        stats = journal.durations("workshop")
+        if set(stats) != {("workshop", 1), ("workshop", 2)} or stats[("workshop", 1)].count != 2:
+            raise AssertionError
+        if not stats[("workshop", 1)].min <= stats[("workshop", 1)].mean <= stats[("workshop", 1)].max:
+            raise AssertionError
+
+
+def testSchedulerResumesFromJournal(tmp_path):
+    root = tmp_path / "worker"
+    root.mkdir()
+    install_fake(str(root))
+    scheduler = WorkshopScheduler([SteamCMD(str(root))], chunk_size=2)
+    with JobJournal(str(tmp_path / "journal.db")) as journal:
+        list(scheduler.run([(107410, 1), (107410, 2)], journal, "sync"))
+        results = list(scheduler.run([(107410, i) for i in (1, 2, 3)], journal, "sync"))
+    if [(r.workshop_id, r.success, r.worker) for r in results[:2]] != [(1, True, None), (2, True, None)]:
+        raise AssertionError
+    if not results[2].success or "107410 1" in (root / ".fake_calls").read_text().splitlines()[-1]:
+        raise AssertionError
@@ -0,0 +1,71 @@
+import os
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, ManifestIndex, vdf
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+APP_MANIFEST = '''
+"AppState"
+{
+	"appid"		"740"
+	"name"		"Counter-Strike \\"Global\\" Offensive - Dedicated Server"
+	"StateFlags"		"4"
+	"buildid"		"6543210"
+	"SizeOnDisk"		"29000000000"
+	// comments are ignored
+	"UserConfig"
+	{
+		"language"		"english"
+	}
+}
+'''
+
+
+def testVdfParse():
+    data = vdf.loads(APP_MANIFEST)
+    if data["AppState"]["buildid"] != "6543210":
+        raise AssertionError
+    if data["AppState"]["name"] != 'Counter-Strike "Global" Offensive - Dedicated Server':
+        raise AssertionError
+    if data["AppState"]["UserConfig"] != {"language": "english"}:
+        raise AssertionError
+
+
+def testVdfInvalid():
+    with pytest.raises(SteamCMDException):
+        vdf.loads('"AppState" { "appid" "740"')
+
+
+def testManifestIndex(tmp_path):
+    steamapps = tmp_path / "steamapps"
+    steamapps.mkdir()
+    (steamapps / "appmanifest_740.acf").write_text(APP_MANIFEST)
+    index = ManifestIndex(str(tmp_path))
+    if index.refresh() != 1:
+        raise AssertionError
+    if index.apps()[740].buildid != 6543210:
+        raise AssertionError
+    if index.stale_apps({740: 6543210, 90: None}) != [90]:
+        raise AssertionError
+    # A new index object reuses the saved index instead of parsing again
+    index = ManifestIndex(str(tmp_path))
+    if index.refresh() != 0 or 740 not in index.apps():
+        raise AssertionError
+    os.remove(str(steamapps / "appmanifest_740.acf"))
+    index.refresh()
+    if index.apps():
+        raise AssertionError
+
+
+def testManifestIndexWorkshop(tmp_path):
+    install_fake(str(tmp_path))
+    sc = SteamCMD_command()
+    sc.workshop_download_item(107410, 1)
+    sc.workshop_download_item(107410, 2)
+    SteamCMD(str(tmp_path)).execute(sc)
+    index = ManifestIndex(str(tmp_path))
+    index.refresh()
+    if sorted(index.workshop_items(107410)) != [(107410, 1), (107410, 2)]:
+        raise AssertionError
+    if index.stale_workshop_items(107410, {1: 1000, 2: 2000, 3: None}) != [2, 3]:
+        raise AssertionError
@@ -0,0 +1,59 @@
+import logging
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, PrometheusTextExporter, RetryPolicy
+from pysteamcmdwrapper.metrics import RunStats, DOWNLOADED_BYTES, LOGIN_SECONDS, RUNS, RETRIES
+
+
+def testPasswordRedacted(tmp_path, caplog):
+    install_fake(str(tmp_path))
+    s = SteamCMD(str(tmp_path))
+    s._uname, s._passw = "user", "hunter2"
+    with caplog.at_level(logging.INFO):
+        s.execute(SteamCMD_command())
+    if "hunter2" in caplog.text or "+login user ********" not in caplog.text:
+        raise AssertionError
+    # steamcmd output goes through its own logger
+    if not any(r.name == "pysteamcmdwrapper.output" and "Waiting for user info" in r.getMessage()
+               for r in caplog.records):
+        raise AssertionError
+
+
+def testOutputPassthrough(tmp_path, capsys):
+    install_fake(str(tmp_path))
+    SteamCMD(str(tmp_path)).execute(SteamCMD_command())
+    if "Waiting for user info...OK" not in capsys.readouterr().out:
+        raise AssertionError
+    SteamCMD(str(tmp_path), passthrough=False).execute(SteamCMD_command())
+    if capsys.readouterr().out:
+        raise AssertionError
+
+
+def testExecuteReportsMetrics(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_FAIL_ITEMS", "2")
+    observed = []
+    s = SteamCMD(str(tmp_path), RetryPolicy(base_delay=0), metrics=lambda *m: observed.append(m))
+    s.workshop_update(107410, 2, str(tmp_path))
+    names = [name for name, _, _ in observed]
+    if names.count(RUNS) != 2 or names.count(RETRIES) != 1 or LOGIN_SECONDS not in names:
+        raise AssertionError
+    if sum(value for name, value, _ in observed if name == DOWNLOADED_BYTES) != 1000:
+        raise AssertionError
+    if [labels["exit_code"] for name, _, labels in observed if name == RUNS] != ["10", "0"]:
+        raise AssertionError
+
+
+def testPrometheusTextExporter(tmp_path):
+    exporter = PrometheusTextExporter()
+    stats = RunStats(clock=lambda: 0.0)
+    stats.spawned()
+    stats.report(exporter, 0, {"host": 'a"b'})
+    stats.report(exporter, 10, {"host": 'a"b'})
+    text = exporter.render()
+    if 'steamcmd_runs_total{exit_code="10",host="a\\"b"} 1' not in text:
+        raise AssertionError
+    if 'steamcmd_spawn_seconds_count{host="a\\"b"} 2' not in text:
+        raise AssertionError
+    exporter.write(str(tmp_path / "steamcmd.prom"))
+    if (tmp_path / "steamcmd.prom").read_text() != text:
+        raise AssertionError
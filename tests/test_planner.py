@@ -0,0 +1,86 @@
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, BatchPlanner, RetryPolicy
+
+
+def testPlannerGroupsByCredentials():
+    planner = BatchPlanner()
+    planner.add_workshop_item(107410, 1)
+    planner.add_workshop_item(107410, 2, credentials=("user", "pass"))
+    planner.add_app_update(740)
+    sessions = planner.plan()
+    if [s.credentials for s in sessions] != [None, ("user", "pass")]:
+        raise AssertionError
+    if len(sessions[0].operations) != 2 or len(planner) != 0:
+        raise AssertionError
+
+
+def testPlannerMergesDuplicates():
+    planner = BatchPlanner()
+    planner.add_workshop_item(107410, 1)
+    planner.add_workshop_item(107410, 1, validate=True)
+    planner.add_workshop_item(107410, 1)
+    sessions = planner.plan()
+    if sessions[0].command.get_commands() != ["+workshop_download_item 107410 1 validate"]:
+        raise AssertionError
+
+
+def testPlannerRejectsConflictingBetas():
+    planner = BatchPlanner()
+    planner.add_app_update(740, "/a", beta="public")
+    planner.add_app_update(740, "/b", beta="beta")
+    with pytest.raises(ValueError):
+        planner.add_app_update(740, "/a", beta="beta")
+    # The same beta again is merged, and planning clears the queue for other betas
+    planner.add_app_update(740, "/a", beta="public", validate=True)
+    if len(planner.plan()[0].operations) != 2:
+        raise AssertionError
+    planner.add_app_update(740, "/a", beta="beta")
+
+
+def testPlannerMinimisesInstallDirSwitches():
+    planner = BatchPlanner()
+    for workshop_id in (1, 2):
+        planner.add_workshop_item(107410, workshop_id, install_dir="/a")
+        planner.add_workshop_item(107410, workshop_id, install_dir="/b")
+    commands = planner.plan()[0].command.get_commands()
+    if [c for c in commands if c.startswith("+force_install_dir")] != [
+            '+force_install_dir "/a"', '+force_install_dir "/b"']:
+        raise AssertionError
+
+
+def testPlannerSplitsSessions():
+    planner = BatchPlanner(max_items=2)
+    for workshop_id in range(5):
+        planner.add_workshop_item(107410, workshop_id, install_dir="/a")
+    sessions = planner.plan()
+    if [len(s.operations) for s in sessions] != [2, 2, 1]:
+        raise AssertionError
+    if not all(s.command.get_commands()[0] == '+force_install_dir "/a"' for s in sessions):
+        raise AssertionError
+
+    # The login and quit count towards the length
+    planner = BatchPlanner(max_command_length=80)
+    for workshop_id in range(5):
+        planner.add_workshop_item(107410, workshop_id, credentials=("user", "pass"))
+    sessions = planner.plan()
+    if len(sessions) < 2 or not all(len(f"+login user pass {s.command.get_cmd()} +quit") <= 80 for s in sessions):
+        raise AssertionError
+
+    with pytest.raises(ValueError):
+        BatchPlanner(max_items=0)
+
+
+def testPlannerRunLogsInOncePerAccount(tmp_path):
+    install_fake(str(tmp_path))
+    planner = BatchPlanner()
+    for workshop_id in range(3):
+        planner.add_workshop_item(107410, workshop_id, install_dir=str(tmp_path / "content"))
+        planner.add_workshop_item(107410, workshop_id, install_dir=str(tmp_path / "content"),
+                                  credentials=("badpass", "secret"))
+    results = planner.run(SteamCMD(str(tmp_path), RetryPolicy(base_delay=0)))
+    if [r.success for r in results] != [True, False]:
+        raise AssertionError
+    calls = (tmp_path / ".fake_calls").read_text().splitlines()
+    if len(calls) != 2 or "+login anonymous" not in calls[0] or "+login badpass" not in calls[1]:
+        raise AssertionError
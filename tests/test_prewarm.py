@@ -0,0 +1,153 @@
+import os
+import time
+import threading
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, WarmStandby
+from pysteamcmdwrapper.metrics import BOOTSTRAP_SECONDS, WORK_SECONDS, SELF_UPDATES, PREWARM_SECONDS
+from pysteamcmdwrapper.retry import classify, SELF_UPDATED
+from pysteamcmdwrapper.lock import FileLock
+
+
+def testBootstrapMetrics(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "2")
+    monkeypatch.setenv("FAKE_STEAMCMD_UPDATE_DELAY", "0.3")
+    observed = []
+    s = SteamCMD(str(tmp_path), metrics=lambda *m: observed.append(m))
+    s.execute(SteamCMD_command())
+    values = {name: value for name, value, _ in observed}
+    if values.get(SELF_UPDATES) != 1 or values[BOOTSTRAP_SECONDS] < 0.3 or WORK_SECONDS not in values:
+        raise AssertionError
+    # Updated now, so the next process goes straight to work
+    observed.clear()
+    s.execute(SteamCMD_command())
+    values = {name: value for name, value, _ in observed}
+    if SELF_UPDATES in values or values[BOOTSTRAP_SECONDS] >= 0.3:
+        raise AssertionError
+
+
+def testSelfUpdateExitCode(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "2")
+    s = SteamCMD(str(tmp_path))
+    if s._self_update() is not True or s._self_update() is not False:
+        raise AssertionError
+    if classify(7) is not SELF_UPDATED or not SELF_UPDATED.retryable:
+        raise AssertionError
+
+
+def testWarmStandbyRefresh(tmp_path, monkeypatch):
+    seed = tmp_path / "seed"
+    seed.mkdir()
+    install_fake(str(seed))
+    observed = []
+    warm = WarmStandby(str(tmp_path / "warm"), seed=str(seed), metrics=lambda *m: observed.append(m))
+    monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "2")
+    first = warm.refresh()
+    if not first.updated or warm.current() != first.runtime:
+        raise AssertionError
+    if not os.path.isfile(os.path.join(warm.path, "steamcmd.sh")):
+        raise AssertionError
+    # The seed itself is left untouched
+    if (seed / ".fake_version").exists():
+        raise AssertionError
+
+    # Nothing to update, the current runtime stays
+    second = warm.refresh()
+    if second.updated or second.runtime != first.runtime:
+        raise AssertionError
+
+    job_metrics = []
+    steam = warm.steamcmd(metrics=lambda *m: job_metrics.append(m))
+    steam.execute(SteamCMD_command())
+    if any(name == SELF_UPDATES for name, _, _ in job_metrics):
+        raise AssertionError
+
+    monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "3")
+    third = warm.refresh()
+    if not third.updated or warm.current() != third.runtime:
+        raise AssertionError
+    # The instance created before the swap still runs its own runtime
+    if os.path.basename(steam._installation_path) != first.runtime:
+        raise AssertionError
+
+    monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "4")
+    fourth = warm.refresh()
+    if sorted(os.listdir(tmp_path / "warm" / "runtimes")) != [third.runtime, fourth.runtime]:
+        raise AssertionError
+    if [labels["updated"] for name, _, labels in observed if name == PREWARM_SECONDS] != [
+            "true", "false", "true", "true"]:
+        raise AssertionError
+
+
+def testWarmStandbyKeepsRuntimesInUse(tmp_path, monkeypatch):
+    seed = tmp_path / "seed"
+    seed.mkdir()
+    install_fake(str(seed))
+    warm = WarmStandby(str(tmp_path / "warm"), seed=str(seed))
+    first = warm.refresh().runtime
+    steam = warm.steamcmd()
+    monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "2")
+    second = warm.refresh().runtime
+    sc = SteamCMD_command()
+    sc.custom("+sleep 1")
+    job = threading.Thread(target=steam.execute, args=(sc,))
+    job.start()
+    while not (tmp_path / "warm" / "runtimes" / first / ".fake_calls").exists():
+        time.sleep(0.01)
+    monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "3")
+    warm.refresh()
+    monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "4")
+    fourth = warm.refresh().runtime
+    # Beyond keep, but the job still runs from it
+    runtimes = sorted(os.listdir(tmp_path / "warm" / "runtimes"))
+    if first not in runtimes or second in runtimes or len(runtimes) != 3:
+        raise AssertionError(runtimes)
+    job.join()
+    warm.refresh()
+    if first in os.listdir(tmp_path / "warm" / "runtimes"):
+        raise AssertionError
+
+    # Its runtime is gone, so the next job runs from the current one
+    if steam.execute(SteamCMD_command()) != 0 or os.path.basename(steam._installation_path) != fourth:
+        raise AssertionError
+
+
+def testWarmStandbyRefreshesDuringJobs(tmp_path, monkeypatch):
+    seed = tmp_path / "seed"
+    seed.mkdir()
+    install_fake(str(seed))
+    warm = WarmStandby(str(tmp_path / "warm"), seed=str(seed))
+    current = warm.refresh().runtime
+    monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "2")
+    # As held by a job running from the current runtime, which the copy does not wait for
+    with FileLock(os.path.join(str(tmp_path / "warm"), "locks", current), shared=True):
+        refresh = threading.Thread(target=warm.refresh)
+        refresh.start()
+        refresh.join(10)
+        if refresh.is_alive() or warm.current() == current:
+            raise AssertionError
+        if not (tmp_path / "warm" / "runtimes" / current).is_dir():
+            raise AssertionError
+
+
+def testWarmStandbyBackground(tmp_path, monkeypatch):
+    seed = tmp_path / "seed"
+    seed.mkdir()
+    install_fake(str(seed))
+    warm = WarmStandby(str(tmp_path / "warm"), interval=0.2, seed=str(seed))
+    warm.start()
+    try:
+        deadline = time.monotonic() + 10
+        while warm.current() is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        first = warm.current()
+        if first is None:
+            raise AssertionError
+        monkeypatch.setenv("FAKE_STEAMCMD_VERSION", "2")
+        while warm.current() == first and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if warm.current() == first or warm.last_error is not None:
+            raise AssertionError
+    finally:
+        warm.stop()
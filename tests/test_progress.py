@@ -0,0 +1,65 @@
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, ProgressParser, parse_progress
+from pysteamcmdwrapper.progress import PROGRESS, STARTED, SUCCESS, ERROR
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def testParseUpdateState():
+    event = ProgressParser().feed(" Update state (0x61) downloading, progress: 42.17 (1234 / 5678)")
+    if event.kind != PROGRESS or event.phase != "downloading":
+        raise AssertionError
+    if (event.bytes_done, event.bytes_total) != (1234, 5678):
+        raise AssertionError
+
+
+def testParseRates():
+    clock = FakeClock()
+    parser = ProgressParser(clock)
+    parser.feed("Update state (0x61) downloading, progress: 10.00 (100 / 1000)")
+    clock.now = 2.0
+    event = parser.feed("Update state (0x61) downloading, progress: 50.00 (500 / 1000)")
+    if event.rate != 200:
+        raise AssertionError
+    clock.now = 4.0
+    event = parser.feed("Success! App '740' fully installed.")
+    if (event.kind, event.item_id, event.rate) != (SUCCESS, 740, 100):
+        raise AssertionError
+
+
+def testParseWorkshopItem():
+    clock = FakeClock()
+    parser = ProgressParser(clock)
+    event = parser.feed("Downloading item 450814997 ...")
+    if (event.kind, event.item_id) != (STARTED, 450814997):
+        raise AssertionError
+    clock.now = 4.0
+    event = parser.feed('Success. Downloaded item 450814997 to "/tmp/x/450814997" (4000 bytes)')
+    if (event.kind, event.item_id, event.bytes_done, event.rate) != (SUCCESS, 450814997, 4000, 1000):
+        raise AssertionError
+
+
+def testParseErrors():
+    events = list(parse_progress([
+        "Loading Steam API...OK",
+        "ERROR! Download item 1 failed (Timeout).",
+        "Error! App '740' state is 0x202 after update job.",
+    ]))
+    if [(e.kind, e.item_id) for e in events] != [(ERROR, 1), (ERROR, 740)]:
+        raise AssertionError
+    if events[0].phase != "Timeout":
+        raise AssertionError
+
+
+def testExecuteProgressCallback(tmp_path):
+    install_fake(str(tmp_path))
+    events = []
+    SteamCMD(str(tmp_path)).workshop_update(107410, 7, str(tmp_path), progress_callback=events.append)
+    if [(e.kind, e.item_id) for e in events] != [(STARTED, 7)] + [(PROGRESS, 7)] * 4 + [(SUCCESS, 7)]:
+        raise AssertionError
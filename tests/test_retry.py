@@ -0,0 +1,98 @@
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, RetryPolicy, ProgressParser
+from pysteamcmdwrapper.retry import (AttemptOutcome, classify, match_line, RATE_LIMIT, TIMEOUT, ASSERT,
+                                     INVALID_PASSWORD, DISK_FULL)
+from pysteamcmdwrapper.exceptions import SteamCMDException, SteamCMDDownloadException
+
+
+def testClassifyExitCodes():
+    if classify(10) != TIMEOUT or classify(134) != ASSERT:
+        raise AssertionError
+    if classify(1).retryable:
+        raise AssertionError
+
+
+def testClassifyOutput():
+    failures = [match_line("ERROR! Download item 1 failed (Timeout)."),
+                match_line("Error! App '740' state is 0x202 after update job. Disk write failure")]
+    if classify(10, failures) != DISK_FULL:
+        raise AssertionError
+    if classify(10, [match_line("FAILED (Rate Limit Exceeded)")]) != RATE_LIMIT:
+        raise AssertionError
+    if match_line("Loading Steam API...OK") is not None:
+        raise AssertionError
+
+
+def testRetryPolicyDelay():
+    policy = RetryPolicy(base_delay=1, max_delay=5, multiplier=2, jitter=0, rate_limit_delay=30)
+    if [policy.delay(i) for i in range(4)] != [1, 2, 4, 5]:
+        raise AssertionError
+    if policy.delay(0, RATE_LIMIT) != 30:
+        raise AssertionError
+    jittered = RetryPolicy(base_delay=10, jitter=0.5).delay(0)
+    if not 5 <= jittered <= 10:
+        raise AssertionError
+
+
+def testWithoutCompleted():
+    sc = SteamCMD_command()
+    sc.force_install_dir("a")
+    sc.workshop_download_item(1, 2)
+    sc.app_update(3)
+    sc.workshop_download_item(1, 4)
+    if sc.without({("workshop", 2), ("app", 3)}).get_cmd() != '+force_install_dir "a" +workshop_download_item 1 4':
+        raise AssertionError
+
+
+def testWithoutCompletedPerInstallDir():
+    sc = SteamCMD_command()
+    for install_dir in ("/a", "/b"):
+        sc.force_install_dir(install_dir)
+        sc.app_update(740)
+    outcome = AttemptOutcome(sc)
+    parser = ProgressParser()
+    for line in ("Success! App '740' fully installed.", "Error! App '740' state is 0x602 after update job."):
+        outcome.observe(line, parser.feed(line))
+    if outcome.completed != {("app", 740, "/a")}:
+        raise AssertionError
+    # Only the update into /a completed, the one into /b is tried again
+    if sc.without(outcome.completed).get_cmd() != '+force_install_dir "/a" +force_install_dir "/b" +app_update 740':
+        raise AssertionError
+
+
+def testExecuteRetriesRemainingItems(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_FAIL_ITEMS", "2")
+    sc = SteamCMD_command()
+    for workshop_id in (1, 2, 3):
+        sc.workshop_download_item(107410, workshop_id)
+    if SteamCMD(str(tmp_path), RetryPolicy(base_delay=0)).execute(sc, n_tries=2) != 0:
+        raise AssertionError
+    calls = (tmp_path / ".fake_calls").read_text().splitlines()
+    if len(calls) != 2 or "107410 1" in calls[1] or "107410 2" not in calls[1]:
+        raise AssertionError
+
+
+def testExecuteFatalNotRetried(tmp_path):
+    install_fake(str(tmp_path))
+    s = SteamCMD(str(tmp_path), RetryPolicy(base_delay=0))
+    s._uname = "badpass"
+    with pytest.raises(SteamCMDException) as e:
+        s.execute(SteamCMD_command(), n_tries=3)
+    if isinstance(e.value, SteamCMDDownloadException) or INVALID_PASSWORD.reason not in e.value.message:
+        raise AssertionError
+    if len((tmp_path / ".fake_calls").read_text().splitlines()) != 1:
+        raise AssertionError
+
+
+def testExecuteInstallDirWithQuotes(tmp_path):
+    install_fake(str(tmp_path))
+    install_dir = tmp_path / 'content "quoted" $HOME'
+    sc = SteamCMD_command()
+    sc.force_install_dir(str(install_dir))
+    sc.workshop_download_item(107410, 1)
+    if SteamCMD(str(tmp_path)).execute(sc) != 0:
+        raise AssertionError
+    if not (install_dir / "steamapps" / "workshop" / "content" / "107410" / "1").is_dir():
+        raise AssertionError
@@ -0,0 +1,131 @@
+import os
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, WorkshopScheduler
+
+
+def make_workers(tmp_path, n):
+    workers = []
+    for i in range(n):
+        root = tmp_path / "worker{}".format(i)
+        root.mkdir()
+        install_fake(str(root))
+        workers.append(SteamCMD(str(root)))
+    return workers
+
+
+def testSchedulerChunks(tmp_path):
+    scheduler = WorkshopScheduler(make_workers(tmp_path, 1), chunk_size=2)
+    chunks = scheduler.chunks([(1, i) for i in range(5)])
+    if [len(c) for c in chunks] != [2, 2, 1]:
+        raise AssertionError
+
+
+def testSchedulerDownloadsAllItems(tmp_path):
+    workers = make_workers(tmp_path, 2)
+    install_dirs = [str(tmp_path / "content0"), str(tmp_path / "content1")]
+    scheduler = WorkshopScheduler(workers, install_dirs, chunk_size=2)
+    items = [(107410, i) for i in range(5)]
+    results = list(scheduler.run(items))
+    if sorted((r.app_id, r.workshop_id) for r in results) != items:
+        raise AssertionError
+    if not all(r.success for r in results):
+        raise AssertionError
+    for r in results:
+        install_dir = install_dirs[[w._installation_path for w in workers].index(r.worker)]
+        if not os.path.isdir(os.path.join(install_dir, "steamapps", "workshop", "content", "107410",
+                                          str(r.workshop_id))):
+            raise AssertionError
+
+
+def testSchedulerConcurrencyBound(tmp_path):
+    with pytest.raises(ValueError):
+        WorkshopScheduler(make_workers(tmp_path, 1), concurrency=2)
+
+
+def testSchedulerOrdersBySize(tmp_path):
+    sizes = {(1, 1): 300, (1, 2): 100, (1, 3): 200}
+    scheduler_workers = make_workers(tmp_path, 1)
+    scheduler = WorkshopScheduler(scheduler_workers, chunk_size=1, order="smallest", sizes=sizes,
+                                  default_size=150)
+    if [c[0][1] for c in scheduler.chunks(list(sizes) + [(1, 4)])] != [2, 4, 3, 1]:
+        raise AssertionError
+    scheduler.order = "largest"
+    if [c[0][1] for c in scheduler.chunks(sizes)] != [1, 3, 2]:
+        raise AssertionError
+    with pytest.raises(ValueError):
+        WorkshopScheduler(scheduler_workers, order="random")
+
+
+def testSchedulerRecordsSizes(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_STEAMCMD_ITEM_SIZE", "4096")
+    workers = make_workers(tmp_path, 1)
+    scheduler = WorkshopScheduler(workers, [str(tmp_path / "content")])
+    if not all(r.success for r in scheduler.run([(107410, 1)])):
+        raise AssertionError
+    if scheduler.size(107410, 1) != 4096:
+        raise AssertionError
+    # Read back from the manifests by a new scheduler
+    if WorkshopScheduler(workers, [str(tmp_path / "content")]).size(107410, 1) != 4096:
+        raise AssertionError
+
+
+def testSchedulerDefersItemsThatDoNotFit(tmp_path):
+    workers = make_workers(tmp_path, 2)
+    scheduler = WorkshopScheduler(workers, [str(tmp_path / "a"), str(tmp_path / "b")], chunk_size=1,
+                                  sizes={(107410, 1): 2 ** 62}, preflight=True)
+    results = {r.workshop_id: r for r in scheduler.run([(107410, 1), (107410, 2)])}
+    if not results[1].deferred or results[1].success or "Not enough free space" not in results[1].error:
+        raise AssertionError
+    if not results[2].success or results[2].deferred:
+        raise AssertionError
+    for worker in ("worker0", "worker1"):
+        calls = tmp_path / worker / ".fake_calls"
+        if calls.exists() and "107410 1\n" in calls.read_text():
+            raise AssertionError
+
+
+def testSchedulerReportsItemsSeparately(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_STEAMCMD_FAIL_ITEMS", "3")
+    monkeypatch.setenv("FAKE_STEAMCMD_RATE", "8000")
+    scheduler = WorkshopScheduler(make_workers(tmp_path, 1), [str(tmp_path / "content")], chunk_size=5, n_tries=1)
+    results = list(scheduler.run([(107410, i) for i in range(1, 5)]))
+    # Results come in as the items finish, the items after the failure never ran
+    if [(r.workshop_id, r.success) for r in results] != [(1, True), (2, True), (3, False), (4, False)]:
+        raise AssertionError
+    if results[2].error is None or results[0].error is not None:
+        raise AssertionError
+    # Every item has its own timing, 1000 bytes at 8000 bytes per second
+    if not all(0.1 <= r.duration < 0.5 for r in results[:2]):
+        raise AssertionError
+
+
+def testSchedulerUpdatesApps(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_STEAMCMD_ITEM_SIZE", "4096")
+    workers = make_workers(tmp_path, 1)
+    scheduler = WorkshopScheduler(workers, [str(tmp_path / "content")], preflight=True,
+                                  sizes={(90, None): 2 ** 62})
+    results = {(r.app_id, r.workshop_id): r for r in scheduler.run([(740, None), (107410, 1)])}
+    if not results[(740, None)].success or not results[(107410, 1)].success:
+        raise AssertionError
+    if not (tmp_path / "content" / "steamapps" / "common" / "app_740").is_dir() or scheduler.size(740) != 4096:
+        raise AssertionError
+    # Large app updates get the same preflight as workshop items
+    result, = scheduler.run([(90, None)])
+    if not result.deferred or "Not enough free space" not in result.error:
+        raise AssertionError
+
+
+def testSchedulerRetriesDeferredChunks(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+    from pysteamcmdwrapper import scheduler as scheduler_module
+    free = 10 ** 9
+    monkeypatch.setattr(scheduler_module.shutil, "disk_usage", lambda path: SimpleNamespace(free=free))
+    monkeypatch.setenv("FAKE_STEAMCMD_RATE", "4000")
+    workers = make_workers(tmp_path, 2)
+    # Either chunk fits on its own, but not both at once
+    scheduler = WorkshopScheduler(workers, [str(tmp_path / "a"), str(tmp_path / "b")], chunk_size=1,
+                                  sizes={(107410, 1): free * 2 // 3, (107410, 2): free * 2 // 3}, preflight=True)
+    results = list(scheduler.run([(107410, 1), (107410, 2)]))
+    if len(results) != 2 or not all(r.success and not r.deferred for r in results):
+        raise AssertionError
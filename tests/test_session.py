@@ -0,0 +1,48 @@
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, SteamCMDSession, SteamCMDSessionPool
+from pysteamcmdwrapper.exceptions import SteamCMDException
+
+
+def testSessionRunsBatch(tmp_path):
+    install_fake(str(tmp_path))
+    sc = SteamCMD_command()
+    sc.force_install_dir(str(tmp_path / "mods"))
+    sc.workshop_download_item(107410, 1)
+    sc.workshop_download_item(107410, 2)
+    with SteamCMDSession(SteamCMD(str(tmp_path))) as session:
+        outputs = session.run(sc)
+    if len(outputs) != 3 or "Success. Downloaded item 2" not in outputs[2]:
+        raise AssertionError
+    if not (tmp_path / "mods" / "steamapps" / "workshop" / "content" / "107410" / "2").is_dir():
+        raise AssertionError
+
+
+def testSessionLoginFailure(tmp_path):
+    install_fake(str(tmp_path))
+    with pytest.raises(SteamCMDException):
+        SteamCMDSession(SteamCMD(str(tmp_path)), credentials=("badpass", "")).start()
+
+
+def testSessionTimeout(tmp_path):
+    install_fake(str(tmp_path))
+    with SteamCMDSession(SteamCMD(str(tmp_path)), timeout=5) as session:
+        with pytest.raises(SteamCMDException):
+            session.send("sleep 30", timeout=0.5)
+        # The hung process was killed rather than left behind
+        if session.alive:
+            raise AssertionError
+
+
+def testSessionPoolRecyclesDeadProcess(tmp_path):
+    install_fake(str(tmp_path))
+    sc = SteamCMD_command()
+    sc.custom("+quit")
+    with SteamCMDSessionPool(SteamCMD(str(tmp_path))) as pool:
+        with pytest.raises(SteamCMDException):
+            pool.execute(sc)
+        # quit ended the process, the pool has to restart it
+        sc = SteamCMD_command()
+        sc.app_update(740)
+        if "fully installed" not in pool.execute(sc)[0]:
+            raise AssertionError
@@ -1,4 +1,7 @@
+import sys
+import pytest
 from pysteamcmdwrapper import SteamCMD_command
+from pysteamcmdwrapper.exceptions import SteamCMDException
 
 def testWorkshopDownloadCommand():
     sc = SteamCMD_command()
@@ -83,3 +86,38 @@ def testCommandRemove():
         raise AssertionError
     if sc.remove(3):
         raise AssertionError
+
+def testCommandArgv():
+    sc = SteamCMD_command()
+    sc.force_install_dir('my "quoted" dir')
+    sc.app_update(1, validate=True, beta="it's beta")
+    sc.custom('+login "user name"')
+    if sc.get_argv() != ["+force_install_dir", 'my "quoted" dir', "+app_update", "1", "validate",
+                         "-beta", "it's beta", "+login", "user name"]:
+        raise AssertionError
+    sc.remove(0)
+    if sc.get_argv()[0] != "+app_update":
+        raise AssertionError
+
+def testCustomWindowsPath(monkeypatch):
+    # The package exports the class under the module name
+    monkeypatch.setattr(sys.modules["pysteamcmdwrapper.SteamCMD_command"], "_POSIX", False)
+    sc = SteamCMD_command()
+    sc.custom(r'+force_install_dir C:\games\csgo +login "user name"')
+    if sc.get_argv() != ["+force_install_dir", r"C:\games\csgo", "+login", "user name"]:
+        raise AssertionError(sc.get_argv())
+
+def testCustomUnbalancedQuote():
+    sc = SteamCMD_command()
+    with pytest.raises(SteamCMDException):
+        sc.custom("+app_update 90 -beta it's")
+    if sc.get_argv():
+        raise AssertionError
+
+def testCommandValidatesIds():
+    sc = SteamCMD_command()
+    try:
+        sc.workshop_download_item(1, "not an id")
+    except ValueError:
+        return
+    raise AssertionError
@@ -0,0 +1,79 @@
+import os
+import time
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, InstallVerifier
+
+
+def install_apps(tmp_path, *app_ids):
+    install_fake(str(tmp_path))
+    install_dir = tmp_path / "server"
+    sc = SteamCMD_command()
+    sc.force_install_dir(str(install_dir))
+    for app_id in app_ids:
+        sc.app_update(app_id)
+    steam = SteamCMD(str(tmp_path))
+    steam.execute(sc)
+    return steam, install_dir
+
+
+def testVerifySkipsUnchangedFiles(tmp_path):
+    _, install_dir = install_apps(tmp_path, 740)
+    (install_dir / "steamapps" / "common" / "app_740" / "cfg").mkdir()
+    (install_dir / "steamapps" / "common" / "app_740" / "cfg" / "server.cfg").write_text("hostname test")
+    verifier = InstallVerifier(str(install_dir), processes=2)
+    if verifier.record([740]) != {740: 2}:
+        raise AssertionError
+
+    result = InstallVerifier(str(install_dir)).verify([740])[740]
+    if not result.ok or result.hashed != 0 or result.skipped != 2:
+        raise AssertionError
+
+
+def testVerifyFindsChangedAndMissingFiles(tmp_path):
+    _, install_dir = install_apps(tmp_path, 740, 90)
+    verifier = InstallVerifier(str(install_dir))
+    verifier.record([740, 90])
+    content = install_dir / "steamapps" / "common" / "app_740"
+    (content / "app.bin").write_bytes(b"corrupt")
+    os.remove(str(install_dir / "steamapps" / "common" / "app_90" / "app.bin"))
+    # Files added after recording are ignored
+    (content / "extra.bin").write_bytes(b"")
+
+    results = verifier.verify([740, 90, 10])
+    if results[740].changed != ["app.bin"] or results[740].ok:
+        raise AssertionError
+    if results[90].missing != ["app.bin"]:
+        raise AssertionError
+    if results[10].baseline or results[10].ok:
+        raise AssertionError
+
+
+def testVerifyTouchedFile(tmp_path):
+    _, install_dir = install_apps(tmp_path, 740)
+    verifier = InstallVerifier(str(install_dir))
+    verifier.record([740])
+    path = str(install_dir / "steamapps" / "common" / "app_740" / "app.bin")
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    if verifier.verify([740])[740].hashed != 1:
+        raise AssertionError
+    result = verifier.verify([740])[740]
+    if not result.ok or result.hashed != 0:
+        raise AssertionError
+
+
+def testRepairValidatesOnlyChangedApps(tmp_path):
+    steam, install_dir = install_apps(tmp_path, 740, 90)
+    verifier = InstallVerifier(str(install_dir))
+    verifier.record([740, 90])
+    (install_dir / "steamapps" / "common" / "app_740" / "app.bin").write_bytes(b"corrupt")
+
+    repaired = verifier.repair(steam, [740, 90])
+    if [result.app_id for result in repaired] != [740]:
+        raise AssertionError
+    last_call = (tmp_path / ".fake_calls").read_text().splitlines()[-1]
+    if "+app_update 740 validate" not in last_call or "app_update 90" in last_call:
+        raise AssertionError
+    if not all(result.ok for result in verifier.verify([740, 90]).values()):
+        raise AssertionError
+    if verifier.repair(steam, [740, 90]) != []:
+        raise AssertionError
@@ -0,0 +1,84 @@
+import os
+import time
+import pytest
+from fake_steamcmd import install_fake
+from pysteamcmdwrapper import SteamCMD, SteamCMD_command, RetryPolicy
+from pysteamcmdwrapper.retry import HUNG, STALLED
+from pysteamcmdwrapper.watchdog import Watchdog
+from pysteamcmdwrapper.metrics import RETRIES
+from pysteamcmdwrapper.exceptions import SteamCMDDownloadException
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def testWatchdogStallsWithoutActivity(tmp_path):
+    clock = FakeClock()
+    # Checked by hand, the watching thread waits for longer than the test runs
+    watchdog = Watchdog(timeout=100, stall_timeout=10, install_dirs=[str(tmp_path)], interval=3600, clock=clock)
+    watchdog.start(os.getpid())
+    try:
+        clock.now += 8
+        watchdog.activity()
+        clock.now += 8
+        if watchdog.check() is not None:
+            raise AssertionError
+        # Workshop downloads print nothing, growing files in the staging dir count as activity
+        downloads = tmp_path / "steamapps" / "workshop" / "downloads" / "107410" / "1"
+        downloads.mkdir(parents=True)
+        (downloads / "item.bin").write_bytes(b"0" * 100)
+        clock.now += 8
+        if watchdog.check() is not None:
+            raise AssertionError
+        clock.now += 9
+        if watchdog.check() is not None:
+            raise AssertionError
+        clock.now += 1
+        if watchdog.check() != STALLED:
+            raise AssertionError
+        clock.now = 1100
+        if watchdog.check() != HUNG:
+            raise AssertionError
+    finally:
+        watchdog.stop()
+    if watchdog.failure is not None:
+        raise AssertionError
+
+
+def testExecuteRetriesStalledTry(tmp_path, monkeypatch):
+    install_fake(str(tmp_path))
+    monkeypatch.setenv("FAKE_STEAMCMD_HANG_ITEMS", "2")
+    sc = SteamCMD_command()
+    sc.force_install_dir(str(tmp_path / "content"))
+    for item in (1, 2, 3):
+        sc.workshop_download_item(107410, item)
+    metrics = []
+    steam = SteamCMD(str(tmp_path), RetryPolicy(base_delay=0), metrics=lambda *args: metrics.append(args))
+    start = time.monotonic()
+    if steam.execute(sc, n_tries=2, stall_timeout=0.5) != 0:
+        raise AssertionError
+    if time.monotonic() - start > 30:
+        raise AssertionError
+    calls = (tmp_path / ".fake_calls").read_text().splitlines()
+    # The stalled try is retried with the items that did not complete yet
+    if len(calls) != 2 or "107410 1" in calls[1] or "107410 3" not in calls[1]:
+        raise AssertionError
+    if (RETRIES, 1, {"reason": STALLED.reason}) not in metrics:
+        raise AssertionError
+
+
+@pytest.mark.parametrize("timeouts", [{"timeout": 0.5}, {"stall_timeout": 0.5}])
+def testExecuteTimeoutsExhaustTries(tmp_path, timeouts):
+    install_fake(str(tmp_path))
+    sc = SteamCMD_command()
+    sc.custom("+sleep 60")
+    start = time.monotonic()
+    with pytest.raises(SteamCMDDownloadException):
+        SteamCMD(str(tmp_path), RetryPolicy(base_delay=0)).execute(sc, n_tries=2, **timeouts)
+    if time.monotonic() - start > 30:
+        raise AssertionError